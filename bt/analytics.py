@@ -0,0 +1,187 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+
+# 交易时段（UTC 小时，左闭右开）
+SESSIONS = [
+    ('asia', 0, 8),
+    ('europe', 8, 13),
+    ('us', 13, 21),
+    ('late_us', 21, 24),
+]
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# 分析用到的交易列，其余列不读取
+TRADE_FIELDS = ['Size', 'EntryPrice', 'ExitPrice', 'SL', 'TP', 'PnL', 'ReturnPct', 'EntryTime', 'ExitTime']
+
+# 默认输出的分组维度
+DEFAULT_GROUPS = ('hour', 'weekday', 'session', 'regime', 'direction')
+
+
+def _read_trade_file(path):
+    try:
+        header = pd.read_csv(path, nrows=0).columns
+        df = pd.read_csv(path, usecols=[col for col in TRADE_FIELDS if col in header], engine='pyarrow')
+        df['run'] = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        return df
+    except Exception as e:
+        print(f"读取交易文件出错 {path}：{e}")
+        return None
+
+
+# 一次读取多次回测保存的交易列表
+def load_trade_files(pattern='result/single_*/trades_*.csv', max_workers=8):
+    """
+    参数:
+    - pattern: 文件路径或通配符，也可以是路径列表
+    - max_workers: 并行读取的线程数
+
+    返回:
+    - trades: 合并后的 DataFrame，run 列为所在结果文件夹名；没有文件时返回None
+    """
+    patterns = [pattern] if isinstance(pattern, str) else list(pattern)
+    paths = sorted({path for item in patterns for path in glob.glob(item)})
+    if not paths:
+        print(f"没有找到交易文件: {pattern}")
+        return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = [df for df in executor.map(_read_trade_file, paths) if df is not None]
+    if not frames:
+        return None
+    trades = pd.concat(frames, ignore_index=True)
+    print(f"读取交易文件 {len(frames)} 个，共 {len(trades)} 笔交易。")
+    return trades
+
+
+# 为每笔交易添加分组用的标签列，全部向量化计算
+def prepare_trades(trades, regime_bins=3):
+    """
+    参数:
+    - trades: load_trade_files 的结果，或 run_vectorized / bt.run 返回的 _trades
+    - regime_bins: 波动率分档数，按入场时止损距离占入场价的比例（即 ATR%）等频分档
+
+    返回:
+    - trades: 新 DataFrame，增加 hour、weekday、session、direction、win、regime 列
+    """
+    trades = trades.copy()
+    entry_time = pd.to_datetime(trades['EntryTime'])
+    trades['hour'] = entry_time.dt.hour
+    trades['weekday'] = pd.Categorical.from_codes(entry_time.dt.weekday, categories=WEEKDAYS)
+
+    edges = [start for _, start, _ in SESSIONS[1:]]
+    codes = np.searchsorted(edges, trades['hour'].to_numpy(), side='right')
+    trades['session'] = pd.Categorical.from_codes(codes, categories=[name for name, _, _ in SESSIONS])
+
+    trades['direction'] = np.where(trades['Size'].to_numpy() > 0, 'long', 'short')
+    trades['win'] = trades['PnL'].to_numpy() > 0
+
+    # 止损距离即入场时的 ATR，按其占价格的比例划分波动率档位
+    atr_pct = (trades['EntryPrice'] - trades['SL']).abs() / trades['EntryPrice']
+    labels = ['low_vol', 'mid_vol', 'high_vol'] if regime_bins == 3 else [f'vol_{i}' for i in range(regime_bins)]
+    if len(trades) >= regime_bins:
+        trades['regime'] = pd.qcut(atr_pct.rank(method='first'), regime_bins, labels=labels)
+    else:
+        trades['regime'] = pd.Categorical([labels[0]] * len(trades), categories=labels)
+    return trades
+
+
+# 按一个或多个维度统计胜负、期望和盈亏
+def breakdown(trades, by='hour'):
+    """
+    参数:
+    - trades: prepare_trades 的结果
+    - by: 分组列名或列名列表，如 'hour'、['session', 'direction']
+
+    返回:
+    - stats: 每组一行，包含 trades、wins、losses、net_wins、win_rate（%）、
+      avg_win / avg_loss / expectancy（每笔平均收益率，%）、payoff（盈亏比）、profit_factor、total_pnl
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    returns = trades['ReturnPct'].to_numpy() * 100
+    win = trades['win'].to_numpy()
+    pnl = trades['PnL'].to_numpy()
+    columns = pd.DataFrame({
+        'trades': 1,
+        'wins': win.astype(np.int64),
+        'win_return': np.where(win, returns, 0.0),
+        'loss_return': np.where(win, 0.0, returns),
+        'return': returns,
+        'gross_profit': np.where(pnl > 0, pnl, 0.0),
+        'gross_loss': np.where(pnl > 0, 0.0, -pnl),
+        'total_pnl': pnl,
+    }, index=trades.index)
+    sums = columns.groupby([trades[col] for col in by], observed=True).sum()
+
+    stats = pd.DataFrame(index=sums.index)
+    stats['trades'] = sums['trades']
+    stats['wins'] = sums['wins']
+    stats['losses'] = sums['trades'] - sums['wins']
+    stats['net_wins'] = stats['wins'] - stats['losses']
+    stats['win_rate'] = sums['wins'] / sums['trades'] * 100
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats['avg_win'] = sums['win_return'] / sums['wins']
+        stats['avg_loss'] = sums['loss_return'] / stats['losses']
+        stats['expectancy'] = sums['return'] / sums['trades']
+        stats['payoff'] = stats['avg_win'] / -stats['avg_loss']
+        stats['profit_factor'] = sums['gross_profit'] / sums['gross_loss']
+    stats['total_pnl'] = sums['total_pnl']
+    return stats.reset_index()
+
+
+def analyze_trades(trades, by=DEFAULT_GROUPS, output_dir=None):
+    """
+    对交易列表按多个维度分别统计。
+
+    参数:
+    - trades: load_trade_files 的结果或引擎返回的 _trades（未经 prepare_trades 时自动处理）
+    - by: 分组维度列表，每项为列名或列名列表
+    - output_dir: 可选，每个维度保存为 {output_dir}/by_{维度}.csv
+
+    返回:
+    - results: {维度名: breakdown 结果}
+    """
+    if 'hour' not in trades.columns:
+        trades = prepare_trades(trades)
+    results = {}
+    for group in by:
+        name = group if isinstance(group, str) else '_'.join(group)
+        results[name] = breakdown(trades, group)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        for name, stats in results.items():
+            stats.to_csv(f'{output_dir}/by_{name}.csv', index=False)
+        print(f"分析完成，结果已保存到 {output_dir}")
+    return results
+
+
+# 根据顺势交易的分小时期望，给出 time_checker 的小时划分
+def suggest_hour_regimes(hourly, min_trades=30):
+    """
+    期望为负的小时反向开仓更有利，划为逆势；交易数不足 min_trades 的小时保持顺势。
+    只适用于全部按顺势开仓得到的交易列表。
+
+    参数:
+    - hourly: breakdown(trades, 'hour') 的结果
+    - min_trades: 参与判断的最少交易数
+
+    返回:
+    - regimes: {小时: 'trend_following' 或 'counter_trend'}，覆盖 0-23 点
+    """
+    regimes = {hour: 'trend_following' for hour in range(24)}
+    counter = hourly[(hourly['trades'] >= min_trades) & (hourly['expectancy'] < 0)]['hour']
+    regimes.update({int(hour): 'counter_trend' for hour in counter})
+    return regimes
+
+
+if __name__ == '__main__':
+    trades = load_trade_files()
+    if trades is not None:
+        results = analyze_trades(trades, output_dir='result/analytics')
+        print(results['hour'])
+        regimes = suggest_hour_regimes(results['hour'])
+        print(f"逆势小时: {[hour for hour, regime in regimes.items() if regime == 'counter_trend']}")
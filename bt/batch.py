@@ -0,0 +1,198 @@
+import os
+import math
+import itertools
+import numpy as np
+import pandas as pd
+
+from tqdm import tqdm
+
+from engine import AVAILABLE_METRICS
+from store import build_kline_store, load_klines, month_range
+from resample import build_resampled_store
+from utils import send_email_notification
+from sweep import PARAM_NAMES, build_param_grid, _build_tasks, _iter_tasks
+
+
+# 交易对 × 周期 × 时间段 的任务矩阵，所有任务使用同一个参数网格
+def build_jobs(symbols, intervals, periods, **param_ranges):
+    """
+    参数:
+    - symbols: 交易对列表，如 ['BTCUSDT', 'ETHUSDT']
+    - intervals: 周期列表，如 ['15m', '1h']
+    - periods: 时间段列表，每项为 (years, months)，如 ([2025], [7, 8, 9])
+    - param_ranges: 参数网格，同 run_sweep
+
+    返回:
+    - jobs: 任务字典列表，可直接修改单个任务的 params 使用不同网格
+    """
+    return [{'symbol': symbol, 'interval': interval, 'years': list(years), 'months': list(months),
+             'params': dict(param_ranges)}
+            for symbol, interval, (years, months) in itertools.product(symbols, intervals, periods)]
+
+
+# 任务的时间范围 [start, end) 和名称
+def _job_range(job):
+    if job.get('start') is not None and job.get('end') is not None:
+        start, end = pd.Timestamp(job['start']), pd.Timestamp(job['end'])
+    else:
+        selected = month_range(job['years'], job['months'])
+        if selected is None:
+            return None
+        start, end = selected
+    name = job.get('name') or f"{job['symbol']}-{job['interval']}-{start:%Y%m%d}-{end:%Y%m%d}"
+    return start, end, name
+
+
+# 任务涉及的全部年月，用于一次性准备和加载数据
+def _job_months(start, end):
+    months = pd.period_range(start, end - pd.Timedelta(1, 'ms'), freq='M')
+    return {(period.year, period.month) for period in months}
+
+
+# 从最早到最晚的连续月份，按年分组为 [(year, [months])]；
+# store 的函数按 years × months 取笛卡尔积，逐年调用才能避免跨年时多载或中间缺月
+def _contiguous_months(keys):
+    first, last = min(keys), max(keys)
+    span = pd.period_range(pd.Period(year=first[0], month=first[1], freq='M'),
+                           pd.Period(year=last[0], month=last[1], freq='M'), freq='M')
+    by_year = {}
+    for period in span:
+        by_year.setdefault(period.year, []).append(period.month)
+    return list(by_year.items())
+
+
+def run_batch(jobs, processes=None, cash=1_000_000_000_000, metrics=AVAILABLE_METRICS, base_interval='1m',
+              results_file=None, store_dir='data/store'):
+    """
+    批量回测：同一交易对和周期的数据只加载一次，其下所有时间段、所有参数组合作为任务放入同一个进程池。
+    非 base_interval 的周期由列存储聚合得到（build_resampled_store）；
+    每个时间段在整段数据上切片回测，指标用时间段之前的数据预热。
+
+    参数:
+    - jobs: build_jobs 返回的任务列表；也可手写，每项包含 symbol、interval、params，
+      以及 years/months（需连续）或 start/end，可选 name
+    - processes: 进程数，默认等于CPU核数
+    - cash: 初始资金
+    - metrics: 记录的统计指标
+    - base_interval: 列存储中的源数据周期
+    - results_file: 汇总结果 CSV；每个数据集完成后追加写入，重新运行时跳过已完成的任务
+    - store_dir: 列存储根目录
+
+    返回:
+    - results: DataFrame，每行一个 (任务, 参数组合)，包含 job、symbol、interval、start、end、参数和统计指标
+    """
+    processes = processes or os.cpu_count() or 1
+    columns = ['job', 'symbol', 'interval', 'start', 'end'] + PARAM_NAMES + list(metrics)
+    done = pd.DataFrame(columns=columns)
+    if results_file and os.path.exists(results_file) and os.path.getsize(results_file) > 0:
+        done = pd.read_csv(results_file, float_precision='round_trip')
+        if list(done.columns) != columns:
+            raise ValueError(f"结果文件 {results_file} 的列与当前统计指标不一致: {list(done.columns)}")
+        done['start'] = pd.to_datetime(done['start'])
+        done['end'] = pd.to_datetime(done['end'])
+        print(f"从结果文件恢复 {done['job'].nunique()} 个任务: {results_file}")
+    done_jobs = set(done['job'])
+
+    # 按 (交易对, 周期) 分组，同一组共用一份数据
+    datasets = {}
+    for job in jobs:
+        job_range = _job_range(job)
+        if job_range is None:
+            print(f"任务 {job['symbol']}-{job['interval']} 的月份不连续，已跳过: {job['years']} {job['months']}")
+            continue
+        start, end, name = job_range
+        if name in done_jobs:
+            continue
+        datasets.setdefault((job['symbol'], job['interval']), []).append(
+            {**job, 'start': start, 'end': end, 'name': name, 'combos': build_param_grid(**job['params'])})
+
+    total = sum(len(job['combos']) for group in datasets.values() for job in group)
+    print(f"批量回测任务数: {sum(len(group) for group in datasets.values())}，数据集数: {len(datasets)}，"
+          f"参数组合总数: {total}，进程数: {processes}")
+
+    frames = [done] if len(done) else []
+    with tqdm(total=total, desc='批量回测', ncols=100) as bar:
+        for (symbol, interval), group in datasets.items():
+            # 加载所有任务覆盖的连续区间，每个任务的指标预热都使用紧邻的真实数据
+            keys = set().union(*(_job_months(job['start'], job['end']) for job in group))
+            frames_by_year = []
+            for year, months in _contiguous_months(keys):
+                build_kline_store(symbol=symbol, interval=base_interval, years=[year], months=months,
+                                  store_dir=store_dir)
+                if interval != base_interval:
+                    build_resampled_store(symbol=symbol, interval=interval, base_interval=base_interval,
+                                          years=[year], months=months, store_dir=store_dir)
+                frame = load_klines(symbol=symbol, interval=interval, years=[year], months=months, store_dir=store_dir)
+                if frame is not None:
+                    frames_by_year.append(frame)
+            data = pd.concat(frames_by_year) if frames_by_year else None
+            if data is None:
+                bar.update(sum(len(job['combos']) for job in group))
+                continue
+
+            # 同一数据集下所有时间段的任务一起切块，进程池一次跑完
+            tasks = []
+            chunk_size = max(1, math.ceil(sum(len(job['combos']) for job in group) / (processes * 8)))
+            for i, job in enumerate(group):
+                begin, end = data.index.searchsorted([job['start'], job['end']])
+                if end - begin < 2:
+                    print(f"任务 {job['name']} 的时间段内没有数据，已跳过。")
+                    bar.update(len(job['combos']))
+                    continue
+                tasks.extend(_build_tasks(job['combos'], processes, (i, int(begin), int(end)), chunk_size))
+
+            rows = []
+            for result in _iter_tasks(data, tasks, processes, cash, metrics):
+                job = group[result.pop('fold')]
+                rows.append({'job': job['name'], 'symbol': symbol, 'interval': interval,
+                             'start': job['start'], 'end': job['end'], **result})
+                bar.update(1)
+            if not rows:
+                continue
+
+            frame = pd.DataFrame(rows, columns=columns).sort_values(['job'] + PARAM_NAMES, ignore_index=True)
+            if results_file:
+                os.makedirs(os.path.dirname(results_file) or '.', exist_ok=True)
+                is_new = not os.path.exists(results_file) or os.path.getsize(results_file) == 0
+                frame.to_csv(results_file, mode='a', header=is_new, index=False)
+            frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+# 每个任务按目标取最优参数，得到 交易对 × 周期 × 时间段 的对比表
+def best_per_job(results, objective='Win Rate [%]'):
+    scores = results[objective] if isinstance(objective, str) else results.apply(objective, axis=1)
+    best = scores.astype(float).fillna(-np.inf).groupby(results['job'], sort=False).idxmax()
+    return results.loc[best].reset_index(drop=True)
+
+
+# 设置开关
+symbols = ['BTCUSDT', 'ETHUSDT', 'BCHUSDT']
+intervals = ['15m']
+periods = [([2025], [7]), ([2025], [8]), ([2025], [9])]  # (years, months)，月份需连续
+is_send_batch_email = False  # 批量回测完成邮件开关
+batch_folder = 'result/matrix'  # 结果目录固定，重新运行时从 results.csv 跳过已完成的任务；换新目录即重新开始
+
+# 进程池使用 spawn 时子进程会重新导入本文件，运行逻辑需放在入口保护内
+if __name__ == '__main__':
+    jobs = build_jobs(
+        symbols, intervals, periods,
+        ema_period=range(2, 302, 30),
+        atr_period=range(3, 23, 2),
+        multiplier=range(3, 23, 2),
+        atr_threshold_pct=list(np.arange(0.00001, 0.00101, 0.0001)),
+        rr=[1],
+    )
+    results = run_batch(jobs, results_file=f'{batch_folder}/results.csv')
+    if len(results):
+        best = best_per_job(results)
+        print(best)
+        best.to_csv(f'{batch_folder}/best_per_job.csv', index=False)
+
+    if is_send_batch_email:
+        subject = "批量回测完成提醒"
+        body = f"批量回测已完成，共 {results['job'].nunique() if len(results) else 0} 个任务，结果保存在 {batch_folder}。"
+        send_email_notification(subject, body)
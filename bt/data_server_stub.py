@@ -0,0 +1,93 @@
+import os
+import re
+import threading
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        path = os.path.normpath(os.path.join(server.root, self.path.split('?')[0].lstrip('/')))
+        with server.lock:
+            server.requests += 1
+            count = server.file_requests[path] = server.file_requests.get(path, 0) + 1
+        if not path.startswith(server.root) or not os.path.isfile(path):
+            self._empty(404)
+            return
+        if count <= server.fail_first:
+            self._empty(503)
+            return
+
+        size = os.path.getsize(path)
+        start = 0
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{size - 1}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(size - start))
+        self.end_headers()
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read()
+        # 模拟传输中断：首次请求只发送前一部分字节后断开
+        if server.cut_after and count == server.fail_first + 1 and not path.endswith('.CHECKSUM'):
+            self.wfile.write(data[:server.cut_after])
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+    def _empty(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class DataServerStub(ThreadingHTTPServer):
+    """
+    本地替身服务，按 data.binance.vision 的目录结构提供 root 下的文件，支持 Range 请求。
+
+    参数:
+    - root: 文件根目录，如 root/data/futures/um/monthly/klines/BTCUSDT/1m/xxx.zip
+    - host / port: 监听地址，port 为0时自动分配
+    - fail_first: 每个文件的前几次请求直接返回 503
+    - cut_after: 大于0时，每个压缩包第一次正常请求只发送这么多字节后断开
+    """
+
+    daemon_threads = True
+
+    def __init__(self, root, host='127.0.0.1', port=0, fail_first=0, cut_after=0):
+        super().__init__((host, port), _RangeHandler)
+        self.root = os.path.abspath(root)
+        self.fail_first = fail_first
+        self.cut_after = cut_after
+        self.requests = 0
+        self.file_requests = {}
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
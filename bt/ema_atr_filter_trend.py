@@ -1,12 +1,17 @@
 import pandas as pd
-import talib
 import numpy as np
 import os
 
 from datetime import datetime
-from backtesting import Backtest, Strategy
-from backtesting.lib import crossover, plot_heatmaps
+from backtesting import Backtest
+from backtesting.lib import plot_heatmaps
 from utils import load_and_process_data, merge_csv_files, send_email_notification, download_binance_data, unzip_binance_data, create_3d_heatmap_cube, merge_csv_files_by_years_months
+from store import build_kline_store, load_klines, build_ohlcv_memmap, load_ohlcv_memmap, month_range
+from resample import build_resampled_store
+from strategy import EmaAtrStrategy
+from engine import AVAILABLE_METRICS, compare_with_backtesting, run_vectorized
+from indicators import precompute_shared_indicators, release_shared_indicators
+from sweep import run_sweep, iter_sweep, walk_forward, halving_search, PARAM_NAMES
 
 def custom_maximize(stats):
     # 检查交易数量和胜率有效性
@@ -21,167 +26,274 @@ is_download_data = False  # 是否下载数据
 is_batch_test = False  # 是否进行批量回测
 is_send_batch_email = False  # 批量回测邮件开关
 is_send_single_email = False  # 单次回测邮件开关
+is_use_store = True  # 是否使用 Parquet 列存储（否则合并为 CSV 再加载）
+backtest_interval = '1m'  # 回测周期：'5m'、'15m'、'1h'、'4h' 等由 1m 列存储聚合得到，无需单独下载
+is_intrabar_fills = False  # backtest_interval 非 1m 时，同一根K线内止盈止损的先后由其中的 1m K线判断（向量化扫描和单次回测对照）
+is_use_memmap = True  # 列存储额外生成只读内存映射数组，所选月份连续时零拷贝加载，扫描子进程直接映射同一文件
+is_check_parity = False  # 单次回测前检查向量化引擎与 backtesting.py 结果是否一致
+is_vector_sweep = True  # 批量回测使用向量化引擎网格扫描（否则使用 bt.optimize）
+sweep_metrics = AVAILABLE_METRICS  # 每组参数记录的统计指标：胜率、交易数、收益、最大回撤、持仓时间
+is_resume_sweep = True  # 扫描结果逐组写入检查点，中断后重新运行从断点继续
+sweep_max_tries = None  # 最多计算的组合数（None 为全部网格）；调大后续跑只计算新增组合
+is_halving_search = False  # 向量化扫描改为逐级减半：先在数据前 1/9 上淘汰无效组合，晋级的组合再逐级加长回测
+halving_min_trades = 10  # 全部数据上要求的最少交易数，每一级按数据比例折算
+is_walk_forward = False  # 前推分析：滚动训练/测试窗口，输出每个窗口的样本外统计（优先于批量回测）
+walk_forward_train = '30D'  # 训练窗口长度（时间长度如 '30D'，或K线根数）
+walk_forward_test = '7D'  # 测试窗口长度，窗口每次前移同样长度
+walk_forward_anchored = False  # 为True时训练窗口起点固定在数据开头
 
 # 新增：选择具体年份和月份进行合并回测（空列表则使用默认单个文件）
 selected_years = [2025]  # 示例：选择2025年；可修改为所需年份列表，如 [2024, 2025]
 selected_months = [7, 8, 9]  # 示例：选择1月、2月、3月；可修改为所需月份列表，如 [1] 或 [1, 4, 7]
 
-if is_download_data:
-    download_binance_data(symbol='BTCUSDT', interval='1m', years=[2025], months=range(1, 10), save_dir='./data')
-    unzip_binance_data(symbol='BTCUSDT', interval='1m', save_dir='./data')  # 添加解压调用
-    merged_data = merge_csv_files(symbol='BTCUSDT', interval='1m')
-
-# 修改：根据 selected_years 和 selected_months 决定加载数据
-if selected_years and selected_months:
-    # 如果指定了年月，则合并并加载合并文件
-    merged_data = merge_csv_files_by_years_months(symbol='BTCUSDT', interval='1m', years=selected_years, months=selected_months)
-    data = load_and_process_data(f'data/merged_BTCUSDT-1m.csv')  # 假设输出文件为默认路径
-else:
-    # 否则，使用默认单个文件
-    data = load_and_process_data('data/BCHUSDT-15m/BCHUSDT-15m-2025-01.csv')
-# data/BCHUSDT-15m/BCHUSDT-15m-2025-01.csv
-# data/ETHUSDT-15m/ETHUSDT-15m-2025-09.csv
-# data/merged_ETHUSDT-15m.csv
-# 测试用
-
-print(data.head())
-
-class EmaAtrStrategy(Strategy):
-    ema_period = 21
-    atr_period = 10
-    multiplier = 4
-    atr_threshold_pct = 0  # ATR波动率过滤器阈值（百分比，基于当前价格）
-    rr = 1  # 风险回报比：止盈距离 = 止损距离 * rr
-
-    def init(self):
-        price = self.data.Close
-        self.ema = self.I(talib.EMA, price, timeperiod=self.ema_period)
-        self.atr = self.I(talib.ATR, self.data.High, self.data.Low, self.data.Close, timeperiod=self.atr_period)
-
-    def next(self):
-        # 检查ATR波动率过滤器（基于当前价格的百分比）
-        if self.atr[-1] / self.data.Close[-1] < self.atr_threshold_pct:
-            return  # 如果ATR低于阈值百分比，不执行交易
-        
-        upper = self.ema + self.atr * self.multiplier
-        lower = self.ema - self.atr * self.multiplier
-        
-        # 计算止损和止盈距离
-        sl_distance = self.atr
-        tp_distance = sl_distance * self.rr  # 止盈距离 = 止损距离 * rr
-        
-        # 只有在空仓时才能开仓
-        if self.position.size == 0:
-            if crossover(self.data.Close, upper):
-                self.buy(tp=self.data.Close + tp_distance, sl=self.data.Close - sl_distance)
-            elif crossover(lower, self.data.Close):
-                self.sell(tp=self.data.Close - tp_distance, sl=self.data.Close + sl_distance)
-
-bt = Backtest(data, EmaAtrStrategy, cash=1_000_000_000_000)  
-# , commission=0.0005
-
-if is_batch_test:
-    # 定义优化参数
+# 进程池使用 spawn 时（Windows/macOS）子进程会重新导入本文件，运行逻辑需放在入口保护内
+if __name__ == '__main__':
+    if is_download_data:
+        download_binance_data(symbol='BTCUSDT', interval='1m', years=[2025], months=range(1, 10), save_dir='./data')
+        if is_use_store:
+            # 直接从压缩包流式写入列存储，不解压 CSV
+            build_kline_store(symbol='BTCUSDT', interval='1m', years=[2025], months=range(1, 10))
+        else:
+            unzip_binance_data(symbol='BTCUSDT', interval='1m', save_dir='./data')  # 添加解压调用
+            merged_data = merge_csv_files(symbol='BTCUSDT', interval='1m')
+
+    sub_data = None  # 1m 数据，仅 is_intrabar_fills 时加载
+    # 修改：根据 selected_years 和 selected_months 决定加载数据
+    if selected_years and selected_months:
+        if is_use_store:
+            # 只转换新增或更新的月份，然后按需读取所选月份
+            build_kline_store(symbol='BTCUSDT', interval='1m', years=selected_years, months=selected_months)
+            if backtest_interval != '1m':
+                # 只聚合新增或更新的月份
+                build_resampled_store(symbol='BTCUSDT', interval=backtest_interval, years=selected_years, months=selected_months)
+            selected_range = month_range(selected_years, selected_months) if is_use_memmap else None
+            if selected_range:
+                build_ohlcv_memmap(symbol='BTCUSDT', interval=backtest_interval)
+                data = load_ohlcv_memmap(symbol='BTCUSDT', interval=backtest_interval, start=selected_range[0], end=selected_range[1])
+            else:
+                data = load_klines(symbol='BTCUSDT', interval=backtest_interval, years=selected_years, months=selected_months)
+            if is_intrabar_fills and backtest_interval != '1m':
+                # 1m 数据只用于判断出场K线内部的先后顺序
+                if selected_range:
+                    build_ohlcv_memmap(symbol='BTCUSDT', interval='1m')
+                    sub_data = load_ohlcv_memmap(symbol='BTCUSDT', interval='1m', start=selected_range[0], end=selected_range[1])
+                else:
+                    sub_data = load_klines(symbol='BTCUSDT', interval='1m', years=selected_years, months=selected_months)
+        else:
+            # 如果指定了年月，则合并并加载合并文件
+            # 只合并新增或变化的月份，无变化时跳过写入
+            merge_csv_files_by_years_months(symbol='BTCUSDT', interval='1m', years=selected_years, months=selected_months, return_data=False)
+            data = load_and_process_data(f'data/merged_BTCUSDT-1m.csv')  # 假设输出文件为默认路径
+    else:
+        # 否则，使用默认单个文件
+        data = load_and_process_data('data/BCHUSDT-15m/BCHUSDT-15m-2025-01.csv')
+    # data/BCHUSDT-15m/BCHUSDT-15m-2025-01.csv
+    # data/ETHUSDT-15m/ETHUSDT-15m-2025-09.csv
+    # data/merged_ETHUSDT-15m.csv
+    # 测试用
+
+    print(data.head())
+
+    bt = Backtest(data, EmaAtrStrategy, cash=1_000_000_000_000)  
+    # , commission=0.0005
+
+    # 定义优化参数（批量回测和前推分析共用）
     ema_period_range = range(2, 302, 30)
     atr_period_range = range(3, 23, 2)  # 转换为list
     multiplier_range = range(3, 23, 2)
     # list(np.arange(1, 21, 10))
     atr_threshold_pct_range = list(np.arange(0.00001, 0.00101, 0.0001))
     rr_range = [1]
+    # 逆势时段起止小时（UTC，含两端），-1 为不启用；实盘 time_checker 为 [4] / [11]，如 range(0, 24, 2) 可一起优化时段
+    counter_start_range = [-1]
+    counter_end_range = [-1]
+
+    if is_walk_forward:
+        # 滚动窗口：每个训练窗口选出最优参数，在紧随其后的测试窗口上统计样本外表现
+        folds, train_results = walk_forward(
+            data,
+            sub_data=sub_data,
+            train=walk_forward_train,
+            test=walk_forward_test,
+            anchored=walk_forward_anchored,
+            objective=custom_maximize,
+            metrics=sweep_metrics,
+            ema_period=ema_period_range,
+            atr_period=atr_period_range,
+            multiplier=multiplier_range,
+            atr_threshold_pct=atr_threshold_pct_range,
+            rr=rr_range,
+            counter_start=counter_start_range,
+            counter_end=counter_end_range,
+        )
+        print(folds)
+
+        oos_trades = folds['OOS # Trades'].sum()
+        oos_win_rate = ((folds['OOS Win Rate [%]'] * folds['OOS # Trades']).sum() / oos_trades) if oos_trades else float('nan')
+        print(f"样本外合计交易数量: {oos_trades}，样本外胜率: {oos_win_rate:.2f}%")
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        walk_forward_folder = f"result/walkforward_{timestamp}"
+        os.makedirs(walk_forward_folder, exist_ok=True)
+        folds.to_csv(f'{walk_forward_folder}/folds_oos_win{oos_win_rate:.2f}_trades{oos_trades}.csv', index=False)
+        train_results.to_csv(f'{walk_forward_folder}/train_results.csv', index=False)
+
+        if is_send_batch_email:
+            subject = "前推分析完成提醒"
+            body = f"前推分析已完成，共 {len(folds)} 个窗口。样本外胜率: {oos_win_rate:.2f}%，交易数量: {oos_trades}。"
+            send_email_notification(subject, body)
+
+    elif is_batch_test:
+        # 自动计算组合总数
+        total_combinations = (len(ema_period_range) * len(atr_period_range) * 
+                              len(multiplier_range) * len(atr_threshold_pct_range) * len(rr_range) *
+                              len(counter_start_range) * len(counter_end_range))
+        print(f"优化参数组合总数: {total_combinations}")
+
+        if is_vector_sweep:
+            # 检查点按数据范围命名，同一数据范围重复运行时自动续跑
+            checkpoint_file = None
+            if is_resume_sweep:
+                checkpoint_file = (f"result/checkpoint_BTCUSDT-{backtest_interval}_{'-'.join(map(str, selected_years))}"
+                                   f"_{'-'.join(map(str, selected_months))}.csv")
+
+            if is_halving_search:
+                # 只有进入最后一级的组合在全部数据上回测，结果列与 run_sweep 相同
+                results, halving_history = halving_search(
+                    data,
+                    sub_data=sub_data,
+                    min_trades=halving_min_trades,
+                    objective=custom_maximize,
+                    ema_period=ema_period_range,
+                    atr_period=atr_period_range,
+                    multiplier=multiplier_range,
+                    atr_threshold_pct=atr_threshold_pct_range,
+                    rr=rr_range,
+                    counter_start=counter_start_range,
+                    counter_end=counter_end_range,
+                    metrics=sweep_metrics,
+                )
+            else:
+                # 向量化引擎 + 进程池网格扫描，所有统计指标一次模拟得到，无需再逐点 bt.run
+                results = run_sweep(
+                    data,
+                    sub_data=sub_data,
+                    ema_period=ema_period_range,
+                    atr_period=atr_period_range,
+                    multiplier=multiplier_range,
+                    atr_threshold_pct=atr_threshold_pct_range,
+                    rr=rr_range,
+                    counter_start=counter_start_range,
+                    counter_end=counter_end_range,
+                    metrics=sweep_metrics,
+                    results_file=checkpoint_file,
+                    max_tries=sweep_max_tries,
+                )
+            results['score'] = results.apply(custom_maximize, axis=1)
+            stats = results.astype(object).loc[results['score'].idxmax()]  # 保持 # Trades 为整数
+            heatmap = results.set_index(PARAM_NAMES)['Win Rate [%]']
+            print(heatmap)
+            heatmap_df = results[PARAM_NAMES + list(sweep_metrics)].rename(columns={'Win Rate [%]': 'win_rate'})
+        else:
+            # 每个周期的 EMA/ATR 只算一次，放入共享内存供所有优化进程读取
+            precompute_shared_indicators(data, ema_period_range, atr_period_range)
+            try:
+                stats, heatmap= bt.optimize(
+                    ema_period=ema_period_range,
+                    atr_period=atr_period_range,
+                    multiplier=multiplier_range,
+                    atr_threshold_pct=atr_threshold_pct_range,  # 调整ATR阈值百分比范围
+                    rr=rr_range,  # 新增rr优化参数
+                    counter_start=counter_start_range,
+                    counter_end=counter_end_range,
+
+                    max_tries=6000,
+                    method='sambo', 
+                    # method='grid',
+
+                    # return_optimization=True,
+                    return_heatmap=True,
+
+                    # maximize='Win Rate [%]'
+                    maximize=custom_maximize
+                )
+            finally:
+                release_shared_indicators()
+            print(heatmap)
     
-    # 自动计算组合总数
-    total_combinations = (len(ema_period_range) * len(atr_period_range) * 
-                          len(multiplier_range) * len(atr_threshold_pct_range) * len(rr_range))
-    print(f"优化参数组合总数: {total_combinations}")
-
-    stats, heatmap= bt.optimize(
-        ema_period=ema_period_range,
-        atr_period=atr_period_range,
-        multiplier=multiplier_range,
-        atr_threshold_pct=atr_threshold_pct_range,  # 调整ATR阈值百分比范围
-        rr=rr_range,  # 新增rr优化参数
-
-        max_tries=6000,
-        method='sambo', 
-        # method='grid',
-
-        # return_optimization=True,
-        return_heatmap=True,
-
-        # maximize='Win Rate [%]'
-        maximize=custom_maximize
-    )
-    print(heatmap)
-    
-    # 新增：为 heatmap 添加交易数量列
-    trades_list = []
-    for params in heatmap.index:
-        param_dict = dict(zip(heatmap.index.names, params))
-        temp_stats = bt.run(**param_dict)
-        trades_list.append(temp_stats['# Trades'])
-    
-    # 将 heatmap 转换为 DataFrame 并添加交易数量
-    heatmap_df = heatmap.reset_index()
-    heatmap_df.columns = ['ema_period', 'atr_period', 'multiplier', 'atr_threshold_pct', 'rr', 'win_rate']
-    heatmap_df['# Trades'] = trades_list
+            # heatmap 只有优化目标值，其余统计指标用向量化引擎补齐（与 bt.run 结果一致，不再逐点回测）
+            combos = [dict(zip(heatmap.index.names, params)) for params in heatmap.index]
+            metrics_df = pd.DataFrame(list(iter_sweep(data, combos, metrics=sweep_metrics)))
+            heatmap_df = heatmap.reset_index()
+            heatmap_df.columns = list(heatmap.index.names) + ['win_rate']
+            heatmap_df = heatmap_df.merge(metrics_df.drop(columns=['Win Rate [%]'], errors='ignore'), on=PARAM_NAMES, how='left')
     
-    # 生成时间戳并创建新文件夹（移到此处，确保在 3D 热力图前定义）
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    batch_folder = f"result/batch_{timestamp}"
-    os.makedirs(batch_folder, exist_ok=True)
+        # 生成时间戳并创建新文件夹（移到此处，确保在 3D 热力图前定义）
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        batch_folder = f"result/batch_{timestamp}"
+        os.makedirs(batch_folder, exist_ok=True)
     
-    # 新增：创建三维热力图魔方（基于 ema_period, atr_period, multiplier）
-    # 假设其他参数固定或聚合（例如，取 atr_threshold_pct 和 rr 的最佳或平均）
-    # 这里我们聚合 heatmap 到这三个参数的平均胜率
+        # 新增：创建三维热力图魔方（基于 ema_period, atr_period, multiplier）
+        # 假设其他参数固定或聚合（例如，取 atr_threshold_pct 和 rr 的最佳或平均）
+        # 这里我们聚合 heatmap 到这三个参数的平均胜率
     
-    # 聚合：对 ema_period, atr_period, multiplier 分组，取 win_rate 的最大值（或平均）
-    aggregated = heatmap_df.groupby(['ema_period', 'atr_period', 'multiplier'])['win_rate'].max().reset_index()
+        # 聚合：对 ema_period, atr_period, multiplier 分组，取 win_rate 的最大值（或平均）
+        aggregated = heatmap_df.groupby(['ema_period', 'atr_period', 'multiplier'])['win_rate'].max().reset_index()
     
-    # 调试：打印 aggregated 以确认数据
-    print("Aggregated DataFrame:")
-    print(aggregated.head())
+        # 调试：打印 aggregated 以确认数据
+        print("Aggregated DataFrame:")
+        print(aggregated.head())
     
-    # 调用函数创建 3D 热力图
-    try:
-        create_3d_heatmap_cube(aggregated, batch_folder)
-    except Exception as e:
-        print(f"3D 热力图生成失败: {e}")
+        # 调用函数创建 3D 热力图
+        try:
+            create_3d_heatmap_cube(aggregated, batch_folder)
+        except Exception as e:
+            print(f"3D 热力图生成失败: {e}")
     
-    # 修改文件名以包含最佳胜率和交易数量
-    win_rate = stats['Win Rate [%]']
-    num_trades = stats['# Trades']
-    heatmap_filename = f'{batch_folder}/heatmap_win{win_rate}_trades{num_trades}.csv'
-    plot_filename = f'{batch_folder}/heatmap_win{win_rate}_trades{num_trades}.html'
-    plot_heatmaps(heatmap, filename=plot_filename, open_browser=True)
-    heatmap_df.to_csv(heatmap_filename, index=False)  # 使用 heatmap_df 保存，包含 # Trades 列
+        # 修改文件名以包含最佳胜率和交易数量
+        win_rate = stats['Win Rate [%]']
+        num_trades = stats['# Trades']
+        heatmap_filename = f'{batch_folder}/heatmap_win{win_rate}_trades{num_trades}.csv'
+        plot_filename = f'{batch_folder}/heatmap_win{win_rate}_trades{num_trades}.html'
+        plot_heatmaps(heatmap, filename=plot_filename, open_browser=True)
+        heatmap_df.to_csv(heatmap_filename, index=False)  # 使用 heatmap_df 保存，包含 # Trades 列
     
-    if is_send_batch_email:
-        # 发送邮件提醒
-        subject = "批量回测完成提醒"
-        body = f"批量回测已完成。最佳胜率: {win_rate}%，交易数量: {num_trades}。"
-        send_email_notification(subject, body)
-
-else:
-
-    stats = bt.run()
-    print(stats)
-    print(stats._trades)
-    # 生成时间戳并创建新文件夹
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    single_folder = f"result/single_{timestamp}"
-    os.makedirs(single_folder, exist_ok=True)
+        if is_send_batch_email:
+            # 发送邮件提醒
+            subject = "批量回测完成提醒"
+            body = f"批量回测已完成。最佳胜率: {win_rate}%，交易数量: {num_trades}。"
+            send_email_notification(subject, body)
+
+    else:
+
+        if is_check_parity:
+            compare_with_backtesting(data, cash=1_000_000_000_000)
+
+        stats = bt.run()
+        print(stats)
+        if sub_data is not None:
+            # backtesting.py 只能按本周期K线撮合，这里对照 1m 判断出场先后后的结果
+            params = {name: getattr(EmaAtrStrategy, name) for name in PARAM_NAMES}
+            intrabar_stats = run_vectorized(data, cash=1_000_000_000_000, sub_data=sub_data, **params)
+            print(f"K线内 1m 撮合：胜率 {intrabar_stats['Win Rate [%]']:.4f}%（本周期撮合 {stats['Win Rate [%]']:.4f}%），"
+                  f"交易数量 {intrabar_stats['# Trades']}")
+        print(stats._trades)
+        # 生成时间戳并创建新文件夹
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        single_folder = f"result/single_{timestamp}"
+        os.makedirs(single_folder, exist_ok=True)
     
-    # 修改文件名以包含胜率和交易数量
-    win_rate = stats['Win Rate [%]']
-    num_trades = stats['# Trades']
-    trades_filename = f'{single_folder}/trades_win{win_rate}_trades{num_trades}.csv'
-    plot_filename = f'{single_folder}/ema_atr_win{win_rate}_trades{num_trades}.html'
-    stats._trades.to_csv(trades_filename, index=True)
-    bt.plot(filename=plot_filename, plot_trades=True, open_browser=True)
+        # 修改文件名以包含胜率和交易数量
+        win_rate = stats['Win Rate [%]']
+        num_trades = stats['# Trades']
+        trades_filename = f'{single_folder}/trades_win{win_rate}_trades{num_trades}.csv'
+        plot_filename = f'{single_folder}/ema_atr_win{win_rate}_trades{num_trades}.html'
+        stats._trades.to_csv(trades_filename, index=True)
+        bt.plot(filename=plot_filename, plot_trades=True, open_browser=True)
     
-    if is_send_single_email:
-        # 发送邮件提醒
-        subject = "单次回测完成提醒"
-        body = f"单次回测已完成。胜率: {win_rate}%，交易数量: {num_trades}。"
-        send_email_notification(subject, body)
+        if is_send_single_email:
+            # 发送邮件提醒
+            subject = "单次回测完成提醒"
+            body = f"单次回测已完成。胜率: {win_rate}%，交易数量: {num_trades}。"
+            send_email_notification(subject, body)
 
@@ -0,0 +1,564 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from backtesting import Backtest
+from strategy import EmaAtrStrategy
+from indicators import cached_ema, cached_atr
+
+# 仓库根目录，bt 和 rt 共用的模块放在 common/ 下
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.signal_core import breakouts, counter_hour_table, entry_direction, is_low_volatility, protective_prices
+
+# 与 backtesting.py buy()/sell() 的默认下单比例一致（Strategy._FULL_EQUITY）
+ORDER_SIZE = 1 - sys.float_info.epsilon
+
+TRADE_COLUMNS = ['Size', 'EntryBar', 'ExitBar', 'EntryPrice', 'ExitPrice', 'SL', 'TP',
+                 'PnL', 'ReturnPct', 'EntryTime', 'ExitTime', 'Duration']
+
+
+# 指标第一个非 NaN 的位置，与 backtesting.py 的预热长度计算方式一致
+def first_valid_index(values):
+    return int(np.isnan(values).argmin())
+
+
+# 第一根调用 next 的K线：backtesting.py 取 1 + 最长的指标预热长度
+def warmup_start(ema, atr):
+    return 1 + max(first_valid_index(ema), first_valid_index(atr))
+
+
+# 每根K线开盘时间的小时（数据为 UTC 时间），时段参数扫描时只算一次
+def bar_hours(index):
+    return np.asarray(index.hour, dtype=np.int8)
+
+
+# 计算信号：1 为做多，-1 为做空，0 为无信号；顺势时上轨突破做多、下轨突破做空，逆势时段相反
+def compute_signals(close, ema, atr, multiplier, atr_threshold_pct, start=1, counter=None):
+    """
+    向量化复现 EmaAtrStrategy.next 的开仓条件（不含持仓判断），判断逻辑来自 common/signal_core.py。
+
+    参数:
+    - close, ema, atr: 等长 float64 数组
+    - multiplier: ATR 乘数
+    - atr_threshold_pct: ATR 波动率过滤阈值（相对收盘价）
+    - start: 第一个会调用 next 的 K 线位置，之前的信号全部置零
+    - counter: 可选，等长 bool 数组，为True的K线处于逆势时段，突破方向取反
+
+    返回:
+    - signal: int8 数组
+    """
+    signal = np.zeros(len(close), dtype=np.int8)
+    with np.errstate(invalid='ignore'):
+        upper_breakout, lower_breakout = breakouts(close[:-1], close[1:], ema[:-1], atr[:-1], ema[1:], atr[1:],
+                                                   multiplier)
+    signal[1:] = entry_direction(upper_breakout, lower_breakout, False if counter is None else counter[1:])
+    signal[is_low_volatility(atr, close, atr_threshold_pct)] = 0
+    signal[:start] = 0
+    return signal
+
+
+# 在 [begin, n) 范围内找第一根触及止损或止盈的 K 线，窗口逐步加倍以避免整段扫描
+def _find_exit_bar(high, low, begin, is_long, sl, tp):
+    n = len(high)
+    step = 64
+    i = begin
+    while i < n:
+        end = min(n, i + step)
+        if is_long:
+            sl_hit = low[i:end] <= sl
+            tp_hit = high[i:end] >= tp
+        else:
+            sl_hit = high[i:end] >= sl
+            tp_hit = low[i:end] <= tp
+        hit = sl_hit | tp_hit
+        if hit.any():
+            k = int(hit.argmax())
+            return i + k, bool(sl_hit[k])
+        i = end
+        step *= 2
+    return -1, False
+
+
+def simulate_trades(open_, high, low, close, atr, signal, rr, cash=1_000_000_000_000, intrabar=None):
+    """
+    按 backtesting.py 的撮合规则模拟单仓位交易。
+
+    规则:
+    - 信号K线收盘下单，下一根K线开盘价成交
+    - 止损 = 信号收盘价 -/+ ATR，止盈 = 信号收盘价 +/- ATR * rr
+    - 同一根K线同时触及止损和止盈时按止损处理（backtesting.py 先处理止损单）
+    - 跳空穿过止损/止盈时按开盘价成交
+    - 有持仓时忽略新信号，平仓K线上的信号仍可开仓
+    - 回测结束时未平仓的交易不计入结果（但计入权益）
+    - 传入 intrabar 时，出场K线内先触及止损还是止盈由其中的 1m K线判断，成交价取对应 1m K线
+
+    参数:
+    - intrabar: 可选，build_intrabar_index 的返回值
+
+    返回:
+    - trades: dict，键为 TRADE_COLUMNS 中的数组列（不含时间列），
+      另有 'OpenTrade' 为结束时未平仓交易的 (Size, EntryBar, EntryPrice)，没有则为None
+    """
+    n = len(close)
+    entries = np.flatnonzero(signal)
+    entries = entries[entries < n - 1]  # 最后一根K线的信号没有机会成交
+
+    records = []
+    open_trade = None
+    k = 0
+    while k < len(entries):
+        s = entries[k]
+        direction = int(signal[s])
+        sl, tp = protective_prices(close[s], direction, atr[s], rr)
+
+        # backtesting.py 下单时要求 SL < 价格 < TP（空单相反），不满足时不开仓
+        if not (sl < close[s] < tp if direction > 0 else tp < close[s] < sl):
+            k += 1
+            continue
+
+        fill_bar = s + 1
+        entry_price = open_[fill_bar]
+        size = direction * int((cash * 1.0 * ORDER_SIZE) // entry_price)
+        if size == 0:
+            k += 1
+            continue
+
+        exit_bar, is_sl = _find_exit_bar(high, low, fill_bar, direction > 0, sl, tp)
+        if exit_bar < 0:
+            open_trade = (size, fill_bar, entry_price)
+            break
+
+        if direction > 0:
+            exit_price = min(open_[exit_bar], sl) if is_sl else max(open_[exit_bar], tp)
+        else:
+            exit_price = max(open_[exit_bar], sl) if is_sl else min(open_[exit_bar], tp)
+        if intrabar is not None:
+            found, _, sub_price = _resolve_intrabar(intrabar, np.array([exit_bar]), direction > 0,
+                                                   np.array([sl]), np.array([tp]))
+            if found[0]:
+                exit_price = sub_price[0]
+
+        pnl = size * (exit_price - entry_price)
+        cash += pnl
+        records.append((size, fill_bar, exit_bar, entry_price, exit_price, sl, tp, pnl,
+                        direction * (exit_price / entry_price - 1)))
+
+        # 平仓后当根K线的信号即可再次开仓
+        k = int(np.searchsorted(entries, exit_bar))
+
+    return _trades_dict(records, open_trade)
+
+
+# 高周期每根K线对应的低周期K线区间，用于判断同一根K线内止损和止盈的先后
+def build_intrabar_index(data, sub_data, bar_length=None):
+    """
+    参数:
+    - data: 高周期 DataFrame（如 15m），以开盘时间为索引
+    - sub_data: 同一时间段的低周期 DataFrame（如 1m）
+    - bar_length: 高周期K线长度（如 '15min'），默认取相邻K线时间差的中位数
+
+    返回:
+    - intrabar: dict，'open'/'high'/'low' 为低周期价格数组，
+      'start'/'end' 为每根高周期K线在低周期数据中的行号区间 [start, end)
+    """
+    times = data.index
+    if bar_length is None:
+        bar_length = pd.Series(times).diff().median() if len(times) > 1 else pd.Timedelta(0)
+    sub_times = sub_data.index
+    return {
+        'open': sub_data['Open'].to_numpy(dtype=np.float64),
+        'high': sub_data['High'].to_numpy(dtype=np.float64),
+        'low': sub_data['Low'].to_numpy(dtype=np.float64),
+        'start': sub_times.searchsorted(times).astype(np.int64),
+        'end': sub_times.searchsorted(times + pd.Timedelta(bar_length)).astype(np.int64),
+    }
+
+
+# 只截取窗口 [begin, end) 内的高周期K线，低周期数组不变
+def slice_intrabar(intrabar, begin, end):
+    return {**intrabar, 'start': intrabar['start'][begin:end], 'end': intrabar['end'][begin:end]}
+
+
+# 在出场K线对应的低周期K线中找第一根触及止损或止盈的K线
+def _resolve_intrabar(intrabar, exit_bars, is_long, sl, tp):
+    """
+    同一根低周期K线同时触及两者时仍按止损处理；跳空穿过时按该低周期K线的开盘价成交。
+
+    返回:
+    - found: 低周期数据中找到触及K线的出场
+    - is_sl: 是否为止损
+    - price: 出场价
+    """
+    count = len(exit_bars)
+    found = np.zeros(count, dtype=bool)
+    is_sl = np.zeros(count, dtype=bool)
+    price = np.full(count, np.nan)
+    rows = np.flatnonzero(exit_bars >= 0)
+    if not len(rows) or not len(intrabar['open']):
+        return found, is_sl, price
+
+    bars = exit_bars[rows]
+    begin = intrabar['start'][bars]
+    width = intrabar['end'][bars] - begin
+    offsets = np.arange(max(int(width.max()), 1))
+    idx = np.minimum(begin[:, None] + offsets, len(intrabar['open']) - 1)
+    inside = offsets < width[:, None]
+    sl_, tp_ = sl[rows, None], tp[rows, None]
+    high, low = intrabar['high'][idx], intrabar['low'][idx]
+    if is_long:
+        sl_hit, tp_hit = (low <= sl_) & inside, (high >= tp_) & inside
+    else:
+        sl_hit, tp_hit = (high >= sl_) & inside, (low <= tp_) & inside
+    hit = sl_hit | tp_hit
+    k = hit.argmax(axis=1)
+    hit_rows = np.arange(len(rows))
+    gap = intrabar['open'][idx[hit_rows, k]]
+    stop = sl_hit[hit_rows, k]
+    if is_long:
+        sub_price = np.where(stop, np.minimum(gap, sl[rows]), np.maximum(gap, tp[rows]))
+    else:
+        sub_price = np.where(stop, np.maximum(gap, sl[rows]), np.minimum(gap, tp[rows]))
+
+    found[rows] = hit.any(axis=1)
+    is_sl[rows] = stop & found[rows]
+    price[rows] = np.where(found[rows], sub_price, np.nan)
+    return found, is_sl, price
+
+
+# 成交记录转为按列存放的 dict
+def _trades_dict(records, open_trade):
+    columns = ['Size', 'EntryBar', 'ExitBar', 'EntryPrice', 'ExitPrice', 'SL', 'TP', 'PnL', 'ReturnPct']
+    if records:
+        arrays = [np.asarray(col) for col in zip(*records)]
+    else:
+        arrays = [np.array([], dtype=dtype) for dtype in
+                  (np.int64, np.int64, np.int64, float, float, float, float, float, float)]
+    trades = dict(zip(columns, arrays))
+    trades['OpenTrade'] = open_trade
+    return trades
+
+
+# 批量求多笔入场的出场K线：所有待定入场一起按窗口扫描，窗口逐轮加倍
+def _find_exit_bars(high, low, fill_bars, is_long, sl, tp, max_cells=1 << 22):
+    n = len(high)
+    exit_bars = np.full(len(fill_bars), -1, dtype=np.int64)
+    is_sl = np.zeros(len(fill_bars), dtype=bool)
+    begin = fill_bars.astype(np.int64)
+    pending = np.flatnonzero(begin < n)
+    step = 64
+    while pending.size:
+        idx = begin[pending, None] + np.arange(step)
+        inside = idx < n
+        idx = np.minimum(idx, n - 1)
+        h, l = high[idx], low[idx]
+        long_ = is_long[pending, None]
+        sl_, tp_ = sl[pending, None], tp[pending, None]
+        sl_hit = np.where(long_, l <= sl_, h >= sl_) & inside
+        tp_hit = np.where(long_, h >= tp_, l <= tp_) & inside
+        hit = sl_hit | tp_hit
+        found = hit.any(axis=1)
+        k = hit.argmax(axis=1)
+        rows = pending[found]
+        exit_bars[rows] = idx[found, k[found]]
+        is_sl[rows] = sl_hit[found, k[found]]
+
+        begin[pending] += step
+        pending = pending[~found & (begin[pending] < n)]
+        step = min(step * 2, max(64, max_cells // max(pending.size, 1)))
+    return exit_bars, is_sl
+
+
+def simulate_batch(open_, high, low, close, ema, atr, combos, start=1, cash=1_000_000_000_000, intrabar=None,
+                   hours=None):
+    """
+    固定 (ema_period, atr_period) 时一次模拟多组 (multiplier, atr_threshold_pct, rr, counter_start, counter_end)，
+    结果与逐组调用 compute_signals + simulate_trades 完全相同。
+
+    止损止盈只取决于入场K线、方向和 rr，与 multiplier、atr_threshold_pct 无关：所有组合可能用到的入场
+    在每个 rr 下只求一次出场（批量窗口扫描），之后每组参数只需沿自己的入场序列跳转，
+    不再逐组重复扫描价格数组。逆势时段只改变入场方向：每个入场K线的小时预先取出，
+    每组时段只需查 24 小时表决定是否取反，扫描时段参数几乎没有额外开销。
+
+    参数:
+    - open_, high, low, close, ema, atr: 等长 float64 数组
+    - combos: [(multiplier, atr_threshold_pct, rr), ...]，可附带逆势时段 (..., counter_start, counter_end)
+    - start: 同 compute_signals
+    - cash: 初始资金
+    - intrabar: 可选，同 simulate_trades
+    - hours: 等长的小时数组（bar_hours），combos 中启用逆势时段时需要
+
+    返回:
+    - trades_list: 与 combos 顺序一致的 simulate_trades 结果列表
+    """
+    n = len(close)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = atr / close
+
+    # 每组时段的查找表；counter_any / trend_any 为任一组合中处于逆势 / 顺势的小时
+    windows = {tuple(combo[3:5]) for combo in combos if len(combo) > 3}
+    tables = {window: counter_hour_table(*window) for window in windows}
+    tables = {window: table for window, table in tables.items() if table.any()}
+    counter_any = np.logical_or.reduce(list(tables.values()) + [np.zeros(24, dtype=bool)])
+    trend_any = np.logical_or.reduce([~table for table in tables.values()]
+                                     + [np.full(24, any(tuple(combo[3:5]) not in tables for combo in combos))])
+    if tables and hours is None:
+        raise ValueError("启用逆势时段时需要传入 hours")
+
+    # 每个 multiplier 的突破信号（未做 ATR 过滤、按顺势方向）和入场K线的小时只算一次
+    raw_entries = {}
+    for multiplier in {combo[0] for combo in combos}:
+        signal = compute_signals(close, ema, atr, multiplier, -np.inf, start)
+        entries = np.flatnonzero(signal)
+        entries = entries[entries < n - 1]
+        entry_hours = hours[entries] if tables else None
+        raw_entries[multiplier] = (entries, signal[entries].astype(np.int64), entry_hours)
+
+    # 每个 rr 下，所有 multiplier 的候选入场合并后一次求出场和出场价；
+    # 同一根K线可能在不同 multiplier 下方向相反，按方向分开存放
+    exits = {}
+    for rr in {combo[2] for combo in combos}:
+        exit_bar = np.full((2, n), -1, dtype=np.int64)
+        exit_price = np.full((2, n), np.nan)
+        valid = np.zeros((2, n), dtype=bool)
+        sl_price = np.full((2, n), np.nan)
+        tp_price = np.full((2, n), np.nan)
+        for direction in (1, -1):
+            side = int(direction > 0)
+            if tables:
+                # 顺势时段按原方向入场，逆势时段按相反方向入场
+                picked = [entries[((signs == direction) & trend_any[entry_hours])
+                                  | ((signs == -direction) & counter_any[entry_hours])]
+                          for entries, signs, entry_hours in raw_entries.values()]
+            else:
+                picked = [entries[signs == direction] for entries, signs, _ in raw_entries.values()]
+            s = np.unique(np.concatenate(picked + [np.array([], dtype=np.int64)]))
+            if not len(s):
+                continue
+            sl, tp = protective_prices(close[s], direction, atr[s], rr)
+            sl_price[side, s], tp_price[side, s] = sl, tp
+            # backtesting.py 下单时要求 SL < 价格 < TP（空单相反），不满足时不开仓
+            ok = (sl < close[s]) & (close[s] < tp) if direction > 0 else (tp < close[s]) & (close[s] < sl)
+            s, sl, tp = s[ok], sl[ok], tp[ok]
+            bars, is_sl = _find_exit_bars(high, low, s + 1, np.full(len(s), direction > 0), sl, tp)
+            valid[side, s] = True
+            exit_bar[side, s] = bars
+            gap = open_[np.maximum(bars, 0)]
+            if direction > 0:
+                price = np.where(is_sl, np.minimum(gap, sl), np.maximum(gap, tp))
+            else:
+                price = np.where(is_sl, np.maximum(gap, sl), np.minimum(gap, tp))
+            if intrabar is not None:
+                found, _, sub_price = _resolve_intrabar(intrabar, bars, direction > 0, sl, tp)
+                price = np.where(found, sub_price, price)
+            exit_price[side, s] = np.where(bars >= 0, price, np.nan)
+        exits[rr] = (exit_bar, exit_price, valid, sl_price, tp_price)
+
+    trades_list = []
+    for combo in combos:
+        multiplier, atr_threshold_pct, rr = combo[:3]
+        exit_bar, exit_price, valid, sl_price, tp_price = exits[rr]
+        entries, signs, entry_hours = raw_entries[multiplier]
+        table = tables.get(tuple(combo[3:5]))
+        if table is not None:
+            signs = np.where(table[entry_hours], -signs, signs)
+        sides = (signs > 0).astype(np.int64)
+        # 被 ATR 过滤或不满足下单条件的入场直接跳过，等同于从序列中删除
+        keep = ~(ratio[entries] < atr_threshold_pct) & valid[sides, entries]
+        entries, signs, sides = entries[keep], signs[keep], sides[keep]
+        exit_bars = exit_bar[sides, entries]
+        # 每笔入场平仓后的下一个候选入场：平仓K线上的信号即可再次开仓
+        following = np.searchsorted(entries, exit_bars).tolist()
+
+        entry_prices = open_[entries + 1].tolist()
+        exit_prices = exit_price[sides, entries].tolist()
+        directions = signs.tolist()
+        exit_list = exit_bars.tolist()
+        chain, sizes = [], []
+        open_trade = None
+        balance = cash
+        k = 0
+        while k < len(directions):
+            entry_price = entry_prices[k]
+            size = directions[k] * int((balance * 1.0 * ORDER_SIZE) // entry_price)
+            if size == 0:
+                k += 1
+                continue
+            if exit_list[k] < 0:
+                open_trade = (size, int(entries[k]) + 1, open_[entries[k] + 1])
+                break
+            balance += size * (exit_prices[k] - entry_price)
+            chain.append(k)
+            sizes.append(size)
+            k = following[k]
+
+        if not chain:
+            trades_list.append(_trades_dict([], open_trade))
+            continue
+        chain = np.asarray(chain)
+        bars = entries[chain]
+        size = np.asarray(sizes, dtype=np.int64)
+        entry_price = open_[bars + 1]
+        price = exit_price[sides[chain], bars]
+        trades_list.append({
+            'Size': size,
+            'EntryBar': bars + 1,
+            'ExitBar': exit_bars[chain],
+            'EntryPrice': entry_price,
+            'ExitPrice': price,
+            'SL': sl_price[sides[chain], bars],
+            'TP': tp_price[sides[chain], bars],
+            'PnL': size * (price - entry_price),
+            'ReturnPct': signs[chain] * (price / entry_price - 1),
+            'OpenTrade': open_trade,
+        })
+    return trades_list
+
+
+# 逐K线权益：已实现盈亏在平仓K线计入，持仓期间按收盘价计浮动盈亏
+def equity_curve(trades, close, cash=1_000_000_000_000):
+    n = len(close)
+    sizes = trades['Size'].astype(float)
+    entry_bars = trades['EntryBar']
+    exit_bars = trades['ExitBar']
+    entry_prices = trades['EntryPrice']
+
+    realized = np.zeros(n)
+    np.add.at(realized, exit_bars, trades['PnL'])
+
+    # 持仓数量和成本用差分数组构造，区间为 [EntryBar, ExitBar)
+    position = np.zeros(n + 1)
+    cost = np.zeros(n + 1)
+    np.add.at(position, entry_bars, sizes)
+    np.add.at(position, exit_bars, -sizes)
+    np.add.at(cost, entry_bars, sizes * entry_prices)
+    np.add.at(cost, exit_bars, -sizes * entry_prices)
+
+    if trades['OpenTrade'] is not None:
+        size, entry_bar, entry_price = trades['OpenTrade']
+        position[entry_bar] += size
+        cost[entry_bar] += size * entry_price
+
+    position = np.cumsum(position[:n])
+    cost = np.cumsum(cost[:n])
+    return cash + np.cumsum(realized) + position * close - cost
+
+
+# 可选的统计指标，键名与 bt.run() 的结果一致
+AVAILABLE_METRICS = ['# Trades', 'Win Rate [%]', 'Return [%]', 'Max. Drawdown [%]', 'Exposure Time [%]']
+
+
+def summarize_trades(trades, close=None, cash=1_000_000_000_000, metrics=('# Trades', 'Win Rate [%]')):
+    """
+    由 simulate_trades 的结果计算统计指标，只计算 metrics 中列出的项。
+
+    参数:
+    - trades: simulate_trades 返回的 dict
+    - close: 收盘价数组，计算收益、回撤和持仓时间时需要
+    - cash: 初始资金
+    - metrics: AVAILABLE_METRICS 的子集
+
+    返回:
+    - stats: dict
+    """
+    unknown = set(metrics) - set(AVAILABLE_METRICS)
+    if unknown:
+        raise ValueError(f"未知统计指标: {sorted(unknown)}")
+
+    stats = {}
+    n_trades = len(trades['PnL'])
+    if '# Trades' in metrics:
+        stats['# Trades'] = n_trades
+    if 'Win Rate [%]' in metrics:
+        win_rate = np.nan if not n_trades else (trades['PnL'] > 0).mean()
+        stats['Win Rate [%]'] = win_rate * 100
+
+    if 'Return [%]' in metrics or 'Max. Drawdown [%]' in metrics:
+        equity = equity_curve(trades, close, cash)
+        if 'Return [%]' in metrics:
+            stats['Return [%]'] = (equity[-1] - equity[0]) / equity[0] * 100
+        if 'Max. Drawdown [%]' in metrics:
+            drawdown = 1 - equity / np.maximum.accumulate(equity)
+            stats['Max. Drawdown [%]'] = -np.nan_to_num(drawdown.max()) * 100
+
+    if 'Exposure Time [%]' in metrics:
+        # 与 backtesting.py 一致，只统计已平仓交易，含入场和出场两根K线
+        have_position = np.zeros(len(close) + 1, dtype=np.int64)
+        np.add.at(have_position, trades['EntryBar'], 1)
+        np.add.at(have_position, trades['ExitBar'] + 1, -1)
+        stats['Exposure Time [%]'] = (np.cumsum(have_position[:-1]) > 0).mean() * 100
+
+    return stats
+
+
+# 向量化回测，参数与 EmaAtrStrategy 一致
+def run_vectorized(data, ema_period=21, atr_period=10, multiplier=4, atr_threshold_pct=0, rr=1,
+                   counter_start=-1, counter_end=-1, cash=1_000_000_000_000, sub_data=None):
+    """
+    不经过 backtesting.py 事件循环的 EmaAtrStrategy 回测。
+
+    参数:
+    - data: load_and_process_data/load_klines 返回的 DataFrame
+    - 其他参数同 EmaAtrStrategy
+    - cash: 初始资金，与 Backtest(cash=...) 一致
+    - sub_data: 可选，同一时间段的 1m 数据；传入时K线内止损止盈的先后由 1m K线判断
+
+    返回:
+    - stats: pd.Series，包含 AVAILABLE_METRICS 中的统计指标和 '_trades'
+    """
+    open_ = data['Open'].to_numpy(dtype=float)
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+    close = data['Close'].to_numpy(dtype=float)
+
+    ema = cached_ema(close, ema_period, shared=True)
+    atr = cached_atr(high, low, close, atr_period, shared=True)
+    start = warmup_start(ema, atr)
+
+    counter = counter_hour_table(counter_start, counter_end)[bar_hours(data.index)]
+    signal = compute_signals(close, ema, atr, multiplier, atr_threshold_pct, start, counter)
+    intrabar = None if sub_data is None else build_intrabar_index(data, sub_data)
+    trades = simulate_trades(open_, high, low, close, atr, signal, rr, cash, intrabar)
+
+    trades_df = pd.DataFrame({col: trades[col] for col in TRADE_COLUMNS[:9]})
+    trades_df['EntryTime'] = data.index[trades_df['EntryBar'].to_numpy()]
+    trades_df['ExitTime'] = data.index[trades_df['ExitBar'].to_numpy()]
+    trades_df['Duration'] = trades_df['ExitTime'] - trades_df['EntryTime']
+    trades_df = trades_df[TRADE_COLUMNS]
+
+    return pd.Series({
+        'Start': data.index[0],
+        'End': data.index[-1],
+        **summarize_trades(trades, close, cash, AVAILABLE_METRICS),
+        '_trades': trades_df,
+    })
+
+
+# 与 backtesting.py 对比交易列表和统计结果
+def compare_with_backtesting(data, cash=1_000_000_000_000, **params):
+    """
+    在同一份数据上分别运行 bt.run() 和 run_vectorized，检查两者是否一致。
+
+    返回:
+    - is_equal: bool，交易列表和 AVAILABLE_METRICS 中的统计指标全部一致时为True
+    """
+    bt = Backtest(data, EmaAtrStrategy, cash=cash)
+    expected = bt.run(**params)
+    actual = run_vectorized(data, cash=cash, **params)
+
+    columns = ['Size', 'EntryBar', 'ExitBar', 'EntryPrice', 'ExitPrice', 'SL', 'TP', 'PnL']
+    expected_trades = expected['_trades'][columns].reset_index(drop=True)
+    actual_trades = actual['_trades'][columns].reset_index(drop=True)
+
+    same_trades = (len(expected_trades) == len(actual_trades)
+                   and np.allclose(expected_trades.to_numpy(dtype=float),
+                                   actual_trades.to_numpy(dtype=float), rtol=1e-12, atol=0))
+    # 权益按数组累加计算，与逐笔累加只有浮点舍入差异
+    same_stats = all(np.isclose(expected[key], actual[key], rtol=1e-9, atol=1e-9, equal_nan=True)
+                     for key in AVAILABLE_METRICS)
+
+    if same_trades and same_stats:
+        print(f"一致性检查通过：{actual['# Trades']} 笔交易，胜率 {actual['Win Rate [%]']:.4f}%")
+    else:
+        print(f"一致性检查失败：backtesting.py {expected['# Trades']} 笔 / 胜率 {expected['Win Rate [%]']}，"
+              f"向量化 {actual['# Trades']} 笔 / 胜率 {actual['Win Rate [%]']}")
+    return same_trades and same_stats
@@ -0,0 +1,166 @@
+import hashlib
+import numpy as np
+import talib
+
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+# 每个进程指标缓存的总字节数上限；多年 1m 数据单个数组就有几十 MB，按个数限制会占满内存
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# 共享内存段头部：[就绪标志, 数组长度]，之后是 float64 数据
+_HEADER_SIZE = 16
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_owned_segments = {}
+
+
+# 数据指纹：同一份数据在任何进程中得到相同结果
+def data_fingerprint(*arrays):
+    """
+    每次都对输入数组的全部内容做哈希，不按内存地址记忆：
+    地址会被新数组复用，数组也可能被原地修改，按地址记忆会取到其他数据的指标。
+    blake2b 约 1 GB/s，多年 1m 数据也只需几十毫秒，相对一次回测可以忽略。
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        h.update(np.ascontiguousarray(a, dtype=np.float64))
+    return h.hexdigest()
+
+
+# 共享内存段名称（macOS 限制 31 个字符）
+def _segment_name(fingerprint, indicator, period):
+    return f'qe{fingerprint[:12]}{indicator}{period}'
+
+
+# 附加到已存在的共享内存段
+def attach_segment(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 之前没有 track 参数；子进程与主进程共用 resource_tracker，登记不会导致提前释放
+        return shared_memory.SharedMemory(name=name)
+
+
+# 从其他进程写入的共享内存读取指标，不存在或未写完时返回None
+def _read_shared(fingerprint, indicator, period, length):
+    try:
+        segment = attach_segment(_segment_name(fingerprint, indicator, period))
+    except FileNotFoundError:
+        return None
+    try:
+        ready, size = np.ndarray((2,), dtype=np.int64, buffer=segment.buf[:_HEADER_SIZE])
+        if not ready or size != length:
+            return None
+        return np.ndarray((length,), dtype=np.float64, buffer=segment.buf[_HEADER_SIZE:]).copy()
+    finally:
+        segment.close()
+
+
+# 写入共享内存供其他进程复用
+def _write_shared(fingerprint, indicator, period, values):
+    name = _segment_name(fingerprint, indicator, period)
+    if name in _owned_segments:
+        return
+    try:
+        segment = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + values.nbytes)
+    except FileExistsError:
+        return
+    np.ndarray(values.shape, dtype=np.float64, buffer=segment.buf[_HEADER_SIZE:])[:] = values
+    header = np.ndarray((2,), dtype=np.int64, buffer=segment.buf[:_HEADER_SIZE])
+    header[1] = len(values)
+    header[0] = 1  # 数据写完后再置就绪标志
+    del header
+    _owned_segments[name] = segment
+
+
+def get_indicator(indicator, arrays, period, compute, shared=False):
+    """
+    按 (数据指纹, 指标名, 周期) 取指标，未命中时计算并放入 LRU 缓存。
+
+    参数:
+    - indicator: 指标名，如 'ema'
+    - arrays: 参与计算的输入数组，用于生成指纹
+    - period: 指标周期
+    - compute: 无参函数，未命中时调用并返回指标数组
+    - shared: 未命中本地缓存时，是否先查找主进程预计算的共享内存
+
+    返回:
+    - values: 只读 float64 数组
+    """
+    global _cache_bytes
+    fingerprint = data_fingerprint(*arrays)
+    key = (fingerprint, indicator, period)
+    values = _cache.get(key)
+    if values is not None:
+        _cache.move_to_end(key)
+        return values
+
+    if shared:
+        values = _read_shared(fingerprint, indicator, period, len(arrays[0]))
+    if values is None:
+        values = np.asarray(compute(), dtype=np.float64)
+
+    values.flags.writeable = False
+    _cache[key] = values
+    _cache_bytes += values.nbytes
+    # 按总字节数淘汰最久未用的数组，至少保留刚放入的一个
+    while _cache_bytes > MAX_CACHE_BYTES and len(_cache) > 1:
+        _, evicted = _cache.popitem(last=False)
+        _cache_bytes -= evicted.nbytes
+    return values
+
+
+def cached_ema(close, timeperiod, shared=False):
+    close = np.asarray(close, dtype=np.float64)
+    return get_indicator('ema', (close,), timeperiod,
+                         lambda: talib.EMA(close, timeperiod=timeperiod), shared)
+
+
+def cached_atr(high, low, close, timeperiod, shared=False):
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    return get_indicator('atr', (high, low, close), timeperiod,
+                         lambda: talib.ATR(high, low, close, timeperiod=timeperiod), shared)
+
+
+# 优化前在主进程一次性算好所有周期，写入共享内存
+def precompute_shared_indicators(data, ema_periods, atr_periods):
+    """
+    共享内存段由主进程创建和释放，子进程只读取；用完后调用 release_shared_indicators。
+
+    参数:
+    - data: 含 High/Low/Close 列的 DataFrame
+    - ema_periods: 需要的 EMA 周期列表
+    - atr_periods: 需要的 ATR 周期列表
+    """
+    high = data['High'].to_numpy(dtype=np.float64)
+    low = data['Low'].to_numpy(dtype=np.float64)
+    close = data['Close'].to_numpy(dtype=np.float64)
+    fingerprint = data_fingerprint(close)
+    for period in sorted(set(ema_periods)):
+        _write_shared(fingerprint, 'ema', period, cached_ema(close, period))
+
+    fingerprint = data_fingerprint(high, low, close)
+    for period in sorted(set(atr_periods)):
+        _write_shared(fingerprint, 'atr', period, cached_atr(high, low, close, period))
+    print(f"指标预计算完成：EMA {len(set(ema_periods))} 个周期，ATR {len(set(atr_periods))} 个周期。")
+
+
+# 释放本进程创建的共享内存段
+def release_shared_indicators():
+    for segment in _owned_segments.values():
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+    _owned_segments.clear()
+
+
+def clear_indicator_cache():
+    global _cache_bytes
+    _cache.clear()
+    _cache_bytes = 0
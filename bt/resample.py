@@ -0,0 +1,147 @@
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from store import DEFAULT_STORE_DIR, get_store_path, _source_month
+
+# 周期对应的毫秒数；都能整除一天，按月分区时聚合后的K线不会跨分区
+INTERVAL_MS = {
+    '1m': 60_000,
+    '3m': 180_000,
+    '5m': 300_000,
+    '15m': 900_000,
+    '30m': 1_800_000,
+    '1h': 3_600_000,
+    '2h': 7_200_000,
+    '4h': 14_400_000,
+    '6h': 21_600_000,
+    '8h': 28_800_000,
+    '12h': 43_200_000,
+    '1d': 86_400_000,
+}
+
+# 聚合时求和的列
+SUM_COLUMNS = ['volume', 'quote_volume', 'count', 'taker_buy_volume', 'taker_buy_quote_volume']
+
+
+# 将列存储格式的K线聚合为更大周期
+def resample_klines(df, interval, base_interval='1m'):
+    """
+    开盘取第一根、最高/最低取极值、收盘取最后一根，成交量等求和；K线按 UTC 整点对齐，与 Binance 一致。
+    源数据尚未覆盖到周期结束的最后一根不完整，直接丢弃。
+
+    参数:
+    - df: 列存储格式的 DataFrame（小写列名，open_time 为时间列），按时间排序
+    - interval: 目标周期，如 '15m'
+    - base_interval: 源数据周期
+
+    返回:
+    - resampled: 与输入同样列的 DataFrame
+    """
+    step = INTERVAL_MS[interval]
+    base_step = INTERVAL_MS[base_interval]
+    if step % base_step:
+        raise ValueError(f"{interval} 不是 {base_interval} 的整数倍")
+    if len(df) == 0:
+        return df.iloc[:0].copy()
+
+    times = df['open_time'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    keys = times // step * step
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    if times[-1] + base_step < keys[-1] + step:
+        starts, ends = starts[:-1], ends[:-1]
+    if len(starts) == 0:
+        return df.iloc[:0].copy()
+
+    # 丢弃不完整的最后一组后，只对剩余源数据做 reduceat
+    head = df.iloc[:ends[-1]]
+    columns = {
+        'open_time': keys[starts].astype('datetime64[ms]'),
+        'open': head['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(head['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(head['low'].to_numpy(), starts),
+        'close': head['close'].to_numpy()[ends - 1],
+        'close_time': keys[starts] + step - 1,
+    }
+    for col in SUM_COLUMNS:
+        if col in head.columns:
+            columns[col] = np.add.reduceat(head[col].to_numpy(), starts)
+    return pd.DataFrame({col: columns[col] for col in df.columns if col in columns})
+
+
+def _manifest_path(symbol, interval, store_dir):
+    return f'{store_dir}/{symbol}-{interval}/resample.json'
+
+
+# 由 1m 列存储聚合出其他周期的分区，结果缓存为同样格式的 Parquet 分区
+def build_resampled_store(symbol='BTCUSDT', interval='15m', base_interval='1m', years=None, months=None,
+                          store_dir=DEFAULT_STORE_DIR, overwrite=False):
+    """
+    每个月份的源分区只在新增或更新后重新聚合，未变化的月份直接使用缓存；
+    聚合结果写入 '{store_dir}/{symbol}-{interval}/'，之后可用 load_klines / load_ohlcv_memmap 按周期读取。
+    该目录下单独下载转换的分区（不在聚合记录中）不会被覆盖。
+
+    参数:
+    - symbol: 交易对符号，如 'BTCUSDT'
+    - interval: 目标周期，如 '15m'、'1h'、'4h'
+    - base_interval: 源数据周期，默认 '1m'
+    - years: 年份列表，为None时聚合全部源分区
+    - months: 月份列表，为None时聚合全部源分区
+    - store_dir: 列存储根目录
+    - overwrite: 是否强制重新聚合
+
+    返回:
+    - written: 本次写入的分区文件路径列表
+    """
+    if interval not in INTERVAL_MS or base_interval not in INTERVAL_MS:
+        print(f"不支持的周期: {interval}（可选 {', '.join(INTERVAL_MS)}）")
+        return []
+
+    paths = sorted(glob.glob(f'{store_dir}/{symbol}-{base_interval}/{symbol}-{base_interval}-*.parquet'))
+    if years is not None and months is not None:
+        wanted = {(year, month) for year in years for month in months}
+        paths = [path for path in paths if _source_month(path) in wanted]
+    if not paths:
+        print(f"列存储中没有 {symbol}-{base_interval} 的数据。")
+        return []
+
+    manifest_path = _manifest_path(symbol, interval, store_dir)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f).get('partitions', {})
+
+    written = []
+    for path in paths:
+        year, month = _source_month(path)
+        store_path = get_store_path(symbol, interval, year, month, store_dir)
+        name = os.path.basename(store_path)
+        source_state = [os.path.getmtime(path), pq.ParquetFile(path).metadata.num_rows]
+        if os.path.exists(store_path):
+            if name not in manifest:
+                print(f"已存在下载转换的分区，跳过聚合: {store_path}")
+                continue
+            if not overwrite and manifest[name] == source_state:
+                continue
+
+        try:
+            resampled = resample_klines(pq.read_table(path).to_pandas(), interval, base_interval)
+            os.makedirs(os.path.dirname(store_path), exist_ok=True)
+            pq.write_table(pa.Table.from_pandas(resampled, preserve_index=False), store_path + '.tmp')
+            os.replace(store_path + '.tmp', store_path)
+        except Exception as e:
+            print(f"聚合失败 {path}: {e}")
+            continue
+        manifest[name] = source_state
+        written.append(store_path)
+
+    if written:
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({'base_interval': base_interval, 'partitions': manifest}, f, indent=2)
+        print(f"{symbol}-{interval} 聚合完成，写入 {len(written)} 个分区。")
+    return written
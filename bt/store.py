@@ -0,0 +1,364 @@
+import os
+import glob
+import json
+import zipfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.format import open_memmap
+
+# Binance K线 CSV 的标准列（早期文件没有表头）
+KLINE_COLUMNS = [
+    'open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time',
+    'quote_volume', 'count', 'taker_buy_volume', 'taker_buy_quote_volume', 'ignore'
+]
+
+# 列存储中的类型：价格和成交量统一 float64，时间戳和笔数 int64
+KLINE_DTYPES = {
+    'open_time': 'int64',
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'volume': 'float64',
+    'close_time': 'int64',
+    'quote_volume': 'float64',
+    'count': 'int64',
+    'taker_buy_volume': 'float64',
+    'taker_buy_quote_volume': 'float64',
+}
+
+# 与 load_and_process_data 输出保持一致的列名
+OHLCV_RENAME = {
+    'open': 'Open',
+    'high': 'High',
+    'low': 'Low',
+    'close': 'Close',
+    'volume': 'Volume'
+}
+
+DEFAULT_STORE_DIR = 'data/store'
+
+# 内存映射文件中的列顺序，按 (列, 行) 存放，每列在文件中连续
+MEMMAP_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def get_store_path(symbol, interval, year, month, store_dir=DEFAULT_STORE_DIR):
+    return f'{store_dir}/{symbol}-{interval}/{symbol}-{interval}-{year}-{month:02d}.parquet'
+
+
+# 每次解析的行数，单个月度文件不必整体读入内存
+CHUNK_ROWS = 200_000
+
+
+# 打开K线数据源：CSV 文件直接打开，zip 压缩包打开其中的 CSV 成员（不解压到磁盘）
+def _open_kline_source(source_path):
+    if not source_path.endswith('.zip'):
+        return open(source_path, 'rb'), None
+    archive = zipfile.ZipFile(source_path)
+    member = next(name for name in archive.namelist() if name.endswith('.csv'))
+    return archive.open(member), archive
+
+
+# 按块读取K线 CSV 流，产出带类型的 DataFrame
+def iter_kline_chunks(f, chunksize=CHUNK_ROWS):
+    first_line = f.readline()
+    f.seek(0)
+    has_header = not first_line[:1].isdigit()
+
+    if has_header:
+        reader = pd.read_csv(f, header=0, dtype=KLINE_DTYPES, chunksize=chunksize,
+                             usecols=lambda col: col in KLINE_DTYPES)
+    else:
+        reader = pd.read_csv(f, header=None, names=KLINE_COLUMNS, dtype=KLINE_DTYPES, chunksize=chunksize,
+                             usecols=list(KLINE_DTYPES))
+    for chunk in reader:
+        chunk = chunk[[col for col in KLINE_COLUMNS if col in chunk.columns]]
+        # 时间戳在写入时一次性转换，加载时无需再解析
+        chunk['open_time'] = pd.to_datetime(chunk['open_time'], unit='ms')
+        yield chunk.reset_index(drop=True)
+
+
+# 读取单个月度 CSV（或 zip）并转换为带类型的 DataFrame
+def read_kline_csv(file_path):
+    f, archive = _open_kline_source(file_path)
+    try:
+        df = pd.concat(list(iter_kline_chunks(f)), ignore_index=True)
+    finally:
+        f.close()
+        if archive is not None:
+            archive.close()
+    df.sort_values('open_time', inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+# 把一个月度数据源逐块写成 Parquet 分区（在子进程中运行）
+def convert_to_partition(source_path, store_path):
+    """
+    参数:
+    - source_path: 月度 CSV 或 Binance 下载的 zip 压缩包
+    - store_path: 输出的 Parquet 分区路径
+
+    返回:
+    - (store_path, error): 成功时 error 为None
+    """
+    tmp_path = store_path + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        f, archive = _open_kline_source(source_path)
+        writer = None
+        last_time = None
+        is_sorted = True
+        try:
+            for chunk in iter_kline_chunks(f):
+                if len(chunk) == 0:
+                    continue
+                is_sorted = (is_sorted and chunk['open_time'].is_monotonic_increasing
+                             and (last_time is None or chunk['open_time'].iloc[0] >= last_time))
+                last_time = chunk['open_time'].iloc[-1]
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+            f.close()
+            if archive is not None:
+                archive.close()
+        if writer is None:
+            return store_path, '没有数据'
+
+        if not is_sorted:
+            # 少见情况：源文件未按时间排序，整体排序后重写
+            df = pq.read_table(tmp_path).to_pandas().sort_values('open_time', ignore_index=True)
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+        os.replace(tmp_path, store_path)
+        return store_path, None
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return store_path, str(e)
+
+
+# 数据源文件名末尾为 YYYY-MM
+def _source_month(path):
+    year, month = os.path.splitext(os.path.basename(path))[0].split('-')[-2:]
+    return int(year), int(month)
+
+
+# 月度 CSV 或 zip 转为按 交易对/周期/月份 分区的 Parquet 列存储
+def build_kline_store(symbol='BTCUSDT', interval='15m', years=None, months=None,
+                      csv_dir=None, zip_dir=None, store_dir=DEFAULT_STORE_DIR, overwrite=False, processes=None):
+    """
+    将月度 CSV 或 Binance zip 压缩包转换为 Parquet 分区文件，已是最新的分区直接跳过。
+    zip 直接按流读取其中的 CSV，不解压到磁盘；多个月份在进程池中并行转换。
+
+    参数:
+    - symbol: 交易对符号，如 'BTCUSDT'
+    - interval: 时间间隔，如 '1m'
+    - years: 年份列表，为None时转换目录下全部文件
+    - months: 月份列表，为None时转换目录下全部文件
+    - csv_dir: 月度 CSV 目录，默认 'data/{symbol}-{interval}/'
+    - zip_dir: 压缩包目录，默认 'data/{symbol}_{interval}/'（download_binance_data 的保存位置）
+    - store_dir: 列存储根目录，默认 'data/store'
+    - overwrite: 是否强制重新转换
+    - processes: 并行进程数，默认等于CPU核数
+
+    返回:
+    - written: 本次写入的分区文件路径列表
+    """
+    if csv_dir is None:
+        csv_dir = f'data/{symbol}-{interval}/'
+    if zip_dir is None:
+        zip_dir = f'data/{symbol}_{interval}/'
+
+    # 同一月份同时有 CSV 和 zip 时取较新的一个
+    sources = {}
+    for pattern in (f'{csv_dir}/{symbol}-{interval}-*.csv', f'{zip_dir}/{symbol}-{interval}-*.zip'):
+        for path in glob.glob(pattern):
+            try:
+                key = _source_month(path)
+            except ValueError:
+                continue
+            if key not in sources or os.path.getmtime(path) > os.path.getmtime(sources[key]):
+                sources[key] = path
+
+    if years is not None and months is not None:
+        wanted = [(year, month) for year in years for month in months]
+        for year, month in wanted:
+            if (year, month) not in sources:
+                print(f"文件不存在: {symbol}-{interval}-{year}-{month:02d}（{csv_dir} 或 {zip_dir}）")
+        sources = {key: sources[key] for key in wanted if key in sources}
+
+    jobs = []
+    for (year, month), source_path in sorted(sources.items()):
+        store_path = get_store_path(symbol, interval, year, month, store_dir)
+        if (not overwrite and os.path.exists(store_path)
+                and os.path.getmtime(store_path) >= os.path.getmtime(source_path)):
+            continue
+        jobs.append((source_path, store_path))
+
+    written = []
+    if len(jobs) > 1 and processes != 1:
+        with ProcessPoolExecutor(max_workers=min(processes or os.cpu_count() or 1, len(jobs))) as executor:
+            results = list(executor.map(convert_to_partition, *zip(*jobs)))
+    else:
+        results = [convert_to_partition(source_path, store_path) for source_path, store_path in jobs]
+    for (source_path, _), (store_path, error) in zip(jobs, results):
+        if error is None:
+            written.append(store_path)
+        else:
+            print(f"转换失败 {source_path}: {error}")
+
+    if written:
+        print(f"列存储更新完成，写入 {len(written)} 个分区。")
+    return written
+
+
+# 从列存储加载指定年月和列
+def load_klines(symbol='BTCUSDT', interval='15m', years=None, months=None,
+                columns=('open', 'high', 'low', 'close', 'volume'), store_dir=DEFAULT_STORE_DIR):
+    """
+    只读取所需月份和列，返回与 load_and_process_data 相同格式的 DataFrame。
+
+    参数:
+    - symbol: 交易对符号，如 'BTCUSDT'
+    - interval: 时间间隔，如 '1m'
+    - years: 年份列表，为None时加载全部分区
+    - months: 月份列表，为None时加载全部分区
+    - columns: 需要读取的列（open_time 总会读取并作为索引）
+    - store_dir: 列存储根目录
+
+    返回:
+    - data: 以 open_time 为索引的 DataFrame，OHLCV 列名首字母大写；无数据时返回None
+    """
+    if years is None or months is None:
+        paths = sorted(glob.glob(f'{store_dir}/{symbol}-{interval}/{symbol}-{interval}-*.parquet'))
+    else:
+        paths = [get_store_path(symbol, interval, year, month, store_dir)
+                 for year in sorted(years) for month in sorted(months)]
+        missing = [path for path in paths if not os.path.exists(path)]
+        for path in missing:
+            print(f"分区不存在: {path}")
+        paths = [path for path in paths if path not in missing]
+
+    if not paths:
+        print(f"列存储中没有 {symbol}-{interval} 的数据。")
+        return None
+
+    try:
+        read_columns = ['open_time'] + [col for col in columns if col != 'open_time']
+        table = pa.concat_tables([pq.read_table(path, columns=read_columns) for path in paths])
+        data = table.to_pandas()
+        data.set_index('open_time', inplace=True)
+        if not data.index.is_monotonic_increasing:
+            data.sort_index(inplace=True)
+        data.rename(columns=OHLCV_RENAME, inplace=True)
+        print(f"数据加载和处理完成，共 {len(data)} 行。")
+        return data
+    except Exception as e:
+        print(f"数据加载和处理出错：{e}")
+        return None
+
+
+def get_memmap_paths(symbol, interval, store_dir=DEFAULT_STORE_DIR):
+    base = f'{store_dir}/{symbol}-{interval}/{symbol}-{interval}'
+    return f'{base}.ohlcv.npy', f'{base}.time.npy', f'{base}.memmap.json'
+
+
+# 所选年月对应的连续时间范围 [start, end)；月份不连续时返回None
+def month_range(years, months):
+    keys = sorted((year, month) for year in years for month in months)
+    first, last = keys[0], keys[-1]
+    if (last[0] - first[0]) * 12 + last[1] - first[1] + 1 != len(keys):
+        return None
+    end = pd.Timestamp(year=last[0], month=last[1], day=1) + pd.offsets.MonthBegin(1)
+    return pd.Timestamp(year=first[0], month=first[1], day=1), end
+
+
+# 将全部分区的 OHLCV 写成一个二进制文件，供多个进程以内存映射方式共享
+def build_ohlcv_memmap(symbol='BTCUSDT', interval='15m', store_dir=DEFAULT_STORE_DIR, overwrite=False):
+    """
+    分区没有变化时直接跳过。
+
+    参数:
+    - symbol: 交易对符号，如 'BTCUSDT'
+    - interval: 时间间隔，如 '1m'
+    - store_dir: 列存储根目录
+    - overwrite: 是否强制重写
+
+    返回:
+    - rows: 文件中的总行数；没有分区时返回0
+    """
+    ohlcv_path, time_path, meta_path = get_memmap_paths(symbol, interval, store_dir)
+    paths = sorted(glob.glob(f'{store_dir}/{symbol}-{interval}/{symbol}-{interval}-*.parquet'))
+    if not paths:
+        print(f"列存储中没有 {symbol}-{interval} 的数据。")
+        return 0
+
+    partitions = {os.path.basename(path): [os.path.getmtime(path), pq.ParquetFile(path).metadata.num_rows]
+                  for path in paths}
+    if not overwrite and os.path.exists(meta_path) and os.path.exists(ohlcv_path) and os.path.exists(time_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('partitions') == partitions:
+                return sum(rows for _, rows in partitions.values())
+
+    rows = sum(rows for _, rows in partitions.values())
+    ohlcv = open_memmap(ohlcv_path + '.tmp', mode='w+', dtype=np.float64, shape=(len(MEMMAP_COLUMNS), rows))
+    times = open_memmap(time_path + '.tmp', mode='w+', dtype='datetime64[ms]', shape=(rows,))
+    offset = 0
+    # 分区文件名按年月排序，即按时间顺序写入
+    for path in paths:
+        table = pq.read_table(path, columns=['open_time'] + [col.lower() for col in MEMMAP_COLUMNS])
+        n = table.num_rows
+        times[offset:offset + n] = table.column('open_time').to_numpy().astype('datetime64[ms]')
+        for i, col in enumerate(MEMMAP_COLUMNS):
+            ohlcv[i, offset:offset + n] = table.column(col.lower()).to_numpy()
+        offset += n
+    ohlcv.flush()
+    times.flush()
+    del ohlcv, times
+    os.replace(ohlcv_path + '.tmp', ohlcv_path)
+    os.replace(time_path + '.tmp', time_path)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'partitions': partitions}, f, indent=2)
+    print(f"内存映射文件更新完成，共 {rows} 行: {ohlcv_path}")
+    return rows
+
+
+# 以只读内存映射方式加载 OHLCV，不复制数据
+def load_ohlcv_memmap(symbol='BTCUSDT', interval='15m', start=None, end=None, store_dir=DEFAULT_STORE_DIR):
+    """
+    返回的 DataFrame 直接引用内存映射数组，加载耗时与数据量无关；
+    多个进程映射同一文件时共享操作系统页缓存中的同一份数据。
+
+    参数:
+    - symbol: 交易对符号，如 'BTCUSDT'
+    - interval: 时间间隔，如 '1m'
+    - start / end: 时间范围 [start, end)，为None时不限制
+    - store_dir: 列存储根目录
+
+    返回:
+    - data: 以 open_time 为索引、列为 Open/High/Low/Close/Volume 的只读 DataFrame；
+      data.attrs['ohlcv_memmap'] 记录文件路径，参数扫描的子进程据此直接映射文件
+    """
+    ohlcv_path, time_path, _ = get_memmap_paths(symbol, interval, store_dir)
+    if not os.path.exists(ohlcv_path):
+        print(f"内存映射文件不存在，请先运行 build_ohlcv_memmap: {ohlcv_path}")
+        return None
+
+    ohlcv = np.load(ohlcv_path, mmap_mode='r')
+    times = np.load(time_path, mmap_mode='r').view(np.ndarray)
+    begin = 0 if start is None else int(np.searchsorted(times, np.datetime64(pd.Timestamp(start), 'ms')))
+    stop = len(times) if end is None else int(np.searchsorted(times, np.datetime64(pd.Timestamp(end), 'ms')))
+
+    index = pd.DatetimeIndex(times[begin:stop], copy=False, name='open_time')
+    data = pd.DataFrame(ohlcv[:, begin:stop].T, index=index, columns=MEMMAP_COLUMNS, copy=False)
+    data.attrs['ohlcv_memmap'] = ohlcv_path
+    print(f"数据加载和处理完成，共 {len(data)} 行（内存映射）。")
+    return data
@@ -0,0 +1,39 @@
+import os
+import sys
+from backtesting import Strategy
+from indicators import cached_ema, cached_atr
+
+# 仓库根目录，bt 和 rt 共用的模块放在 common/ 下
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.signal_core import evaluate_bar, protective_prices
+
+class EmaAtrStrategy(Strategy):
+    ema_period = 21
+    atr_period = 10
+    multiplier = 4
+    atr_threshold_pct = 0  # ATR波动率过滤器阈值（百分比，基于当前价格）
+    rr = 1  # 风险回报比：止盈距离 = 止损距离 * rr
+    counter_start = -1  # 逆势时段起始小时（UTC，含），-1 为不启用；实盘 time_checker 为 4
+    counter_end = -1  # 逆势时段结束小时（UTC，含），小于起始小时时跨零点；实盘 time_checker 为 11
+
+    def init(self):
+        price = self.data.Close
+        # 同一周期的指标在各次优化 trial 之间复用，并优先读取主进程预计算的共享内存
+        self.ema = self.I(cached_ema, price, self.ema_period, shared=True,
+                          name=f'EMA({self.ema_period})')
+        self.atr = self.I(cached_atr, self.data.High, self.data.Low, self.data.Close, self.atr_period, shared=True,
+                          name=f'ATR({self.atr_period})')
+
+    def next(self):
+        # 突破、ATR 波动率过滤（基于当前价格的百分比）和顺势/逆势时段与实盘共用 common/signal_core.py
+        close, ema, atr = self.data.Close, self.ema, self.atr
+        direction = evaluate_bar(close[-2], close[-1], ema[-2], atr[-2], ema[-1], atr[-1], self.data.index[-1].hour,
+                                 self.multiplier, self.atr_threshold_pct, self.counter_start, self.counter_end)
+
+        # 只有在空仓时才能开仓；止损距离 = ATR，止盈距离 = 止损距离 * rr
+        if direction and self.position.size == 0:
+            sl, tp = protective_prices(close[-1], direction, atr[-1], self.rr)
+            if direction > 0:
+                self.buy(tp=tp, sl=sl)
+            else:
+                self.sell(tp=tp, sl=sl)
@@ -0,0 +1,502 @@
+import os
+import csv
+import json
+import math
+import time
+import itertools
+import numpy as np
+import pandas as pd
+
+from multiprocessing import Pool, shared_memory
+from tqdm import tqdm
+
+from engine import AVAILABLE_METRICS, bar_hours, build_intrabar_index, simulate_batch, slice_intrabar, summarize_trades, warmup_start
+from indicators import attach_segment, data_fingerprint, cached_ema, cached_atr, precompute_shared_indicators, release_shared_indicators
+from strategy import EmaAtrStrategy
+
+PARAM_NAMES = ['ema_period', 'atr_period', 'multiplier', 'atr_threshold_pct', 'rr', 'counter_start', 'counter_end']
+# 同一组 (ema_period, atr_period) 下由 simulate_batch 一次模拟的参数
+INNER_PARAM_NAMES = PARAM_NAMES[2:]
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# 子进程中的共享数据
+_worker_segments = []
+_worker_arrays = None
+_worker_intrabar = None
+_worker_hours = None
+_worker_cash = None
+_worker_metrics = None
+
+
+# 数据来自 load_ohlcv_memmap 时，返回其在映射文件中的起始行，否则返回None
+def _memmap_start(data):
+    path = data.attrs.get('ohlcv_memmap')
+    if not path or not os.path.exists(path) or len(data) == 0:
+        return None
+    values = data[OHLCV_COLUMNS].to_numpy().T
+    # 沿 base 找到整个文件的映射数组，数据被复制过则找不到
+    mapped, base = None, values
+    while base is not None and isinstance(base, np.ndarray):
+        if isinstance(base, np.memmap):
+            mapped = base
+        base = base.base
+    if mapped is None or mapped.filename != os.path.abspath(path) or values.strides != mapped.strides:
+        return None
+    offset = values.__array_interface__['data'][0] - mapped.__array_interface__['data'][0]
+    return offset // mapped.itemsize
+
+
+# 将 OHLCV 放入共享内存，子进程按名称附加，不再逐个任务序列化数据；
+# 内存映射数据不再复制，子进程直接映射同一文件
+def share_ohlcv(data):
+    start = _memmap_start(data)
+    if start is not None:
+        return None, {'path': data.attrs['ohlcv_memmap'], 'start': start, 'shape': (len(OHLCV_COLUMNS), len(data))}
+
+    values = np.ascontiguousarray(data[OHLCV_COLUMNS].to_numpy(dtype=np.float64).T)
+    segment = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=np.float64, buffer=segment.buf)[:] = values
+    return segment, {'name': segment.name, 'shape': values.shape}
+
+
+# 按 share_ohlcv 返回的描述附加数据，返回 {列名: 只读数组}
+def _attach_ohlcv(meta):
+    if 'path' in meta:
+        arrays = np.load(meta['path'], mmap_mode='r')[:, meta['start']:meta['start'] + meta['shape'][1]]
+    else:
+        segment = attach_segment(meta['name'])
+        _worker_segments.append(segment)
+        arrays = np.ndarray(meta['shape'], dtype=np.float64, buffer=segment.buf)
+        arrays.flags.writeable = False
+    return dict(zip(OHLCV_COLUMNS, arrays))
+
+
+def _init_worker(meta, cash, metrics, intrabar_meta=None, hours=None):
+    global _worker_arrays, _worker_intrabar, _worker_hours, _worker_cash, _worker_metrics
+    _worker_arrays = _attach_ohlcv(meta)
+    _worker_hours = hours
+    _worker_intrabar = None
+    if intrabar_meta is not None:
+        sub_arrays = _attach_ohlcv(intrabar_meta['data'])
+        _worker_intrabar = {'open': sub_arrays['Open'], 'high': sub_arrays['High'], 'low': sub_arrays['Low'],
+                            'start': intrabar_meta['start'], 'end': intrabar_meta['end']}
+    _worker_cash = cash
+    _worker_metrics = metrics
+
+
+def _close_worker():
+    global _worker_arrays, _worker_intrabar, _worker_hours
+    _worker_arrays = None
+    _worker_intrabar = None
+    _worker_hours = None
+    for segment in _worker_segments:
+        segment.close()
+    _worker_segments.clear()
+
+
+# 一个任务 = 一组 (ema_period, atr_period) 下的多组内层参数，指标只取一次，内层参数用 simulate_batch 一次模拟；
+# window 为 (fold, begin, end) 时只在 [begin, end) 区间内回测，指标仍取全量数据上的结果
+def _run_task(task):
+    ema_period, atr_period, combos, window = task
+    open_, high, low, close = (_worker_arrays[col] for col in ('Open', 'High', 'Low', 'Close'))
+    ema = cached_ema(close, ema_period, shared=True)
+    atr = cached_atr(high, low, close, atr_period, shared=True)
+    start = warmup_start(ema, atr)
+    intrabar = _worker_intrabar
+    hours = _worker_hours
+    extra = {}
+    if window is not None:
+        fold, begin, end = window
+        open_, high, low, close, ema, atr = (a[begin:end] for a in (open_, high, low, close, ema, atr))
+        start = max(start - begin, 1)
+        if intrabar is not None:
+            intrabar = slice_intrabar(intrabar, begin, end)
+        if hours is not None:
+            hours = hours[begin:end]
+        extra = {'fold': fold}
+
+    results = []
+    all_trades = simulate_batch(open_, high, low, close, ema, atr, combos, start, _worker_cash, intrabar, hours)
+    for inner, trades in zip(combos, all_trades):
+        results.append({
+            **extra,
+            'ema_period': ema_period,
+            'atr_period': atr_period,
+            **dict(zip(INNER_PARAM_NAMES, inner)),
+            **summarize_trades(trades, close, _worker_cash, _worker_metrics),
+        })
+    return results
+
+
+# 生成参数组合，未指定的参数使用 EmaAtrStrategy 的默认值
+def build_param_grid(constraint=None, **param_ranges):
+    unknown = set(param_ranges) - set(PARAM_NAMES)
+    if unknown:
+        raise ValueError(f"未知参数: {sorted(unknown)}")
+    ranges = [list(param_ranges.get(name, [getattr(EmaAtrStrategy, name)])) for name in PARAM_NAMES]
+    combos = [dict(zip(PARAM_NAMES, values)) for values in itertools.product(*ranges)]
+    if constraint is not None:
+        combos = [params for params in combos if constraint(params)]
+    return combos
+
+
+# 按 (ema_period, atr_period) 分组并切块，保证任务数足够分给所有进程；缺少的参数使用 EmaAtrStrategy 的默认值
+def _build_tasks(combos, processes, window=None, chunk_size=None):
+    groups = {}
+    for params in combos:
+        key = (params['ema_period'], params['atr_period'])
+        groups.setdefault(key, []).append(tuple(params.get(name, getattr(EmaAtrStrategy, name))
+                                                for name in INNER_PARAM_NAMES))
+
+    chunk_size = chunk_size or max(1, math.ceil(len(combos) / (processes * 8)))
+    tasks = []
+    for (ema_period, atr_period), inner in groups.items():
+        for i in range(0, len(inner), chunk_size):
+            tasks.append((ema_period, atr_period, inner[i:i + chunk_size], window))
+    return tasks
+
+
+# 在进程池中运行已切好的任务，逐条产出结果；传入 sub_data 时止损止盈在K线内部按 1m 数据判断先后
+def _iter_tasks(data, tasks, processes, cash, metrics, sub_data=None):
+    # 所有周期的指标在主进程算一次，子进程直接读取
+    precompute_shared_indicators(data, {task[0] for task in tasks}, {task[1] for task in tasks})
+    segments = []
+    try:
+        segment, meta = share_ohlcv(data)
+        segments.append(segment)
+        intrabar_meta = None
+        if sub_data is not None:
+            # 1m 数据同样共享给子进程，只传高周期K线到 1m 行号的索引
+            index = build_intrabar_index(data, sub_data)
+            segment, sub_meta = share_ohlcv(sub_data)
+            segments.append(segment)
+            intrabar_meta = {'data': sub_meta, 'start': index['start'], 'end': index['end']}
+        # 启用逆势时段的任务才需要每根K线的小时，只算一次传给子进程
+        hours = None
+        if any(min(inner[3:5]) >= 0 for task in tasks for inner in task[2]):
+            hours = bar_hours(data.index)
+
+        if processes == 1:
+            _init_worker(meta, cash, metrics, intrabar_meta, hours)
+            try:
+                for task in tasks:
+                    yield from _run_task(task)
+            finally:
+                _close_worker()
+        else:
+            with Pool(processes, initializer=_init_worker, initargs=(meta, cash, metrics, intrabar_meta, hours)) as pool:
+                for results in pool.imap_unordered(_run_task, tasks):
+                    yield from results
+    finally:
+        for segment in segments:
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+        release_shared_indicators()
+
+
+def iter_sweep(data, combos, processes=None, cash=1_000_000_000_000, metrics=AVAILABLE_METRICS, sub_data=None):
+    """
+    在进程池中运行参数组合，每完成一个任务就逐条产出结果。
+
+    参数:
+    - data: 含 OHLCV 列的 DataFrame
+    - combos: build_param_grid 返回的参数字典列表
+    - processes: 进程数，默认等于CPU核数；为1时在当前进程运行
+    - cash: 初始资金，与 Backtest(cash=...) 一致
+    - metrics: 每组参数记录的统计指标，AVAILABLE_METRICS 的子集
+    - sub_data: 可选，同一时间段的 1m 数据，用于K线内判断止损止盈先后（见 build_intrabar_index）
+
+    产出:
+    - result: dict，包含参数和 metrics 中的统计指标
+    """
+    processes = processes or os.cpu_count() or 1
+    yield from _iter_tasks(data, _build_tasks(combos, processes), processes, cash, metrics, sub_data)
+
+
+# 参数组合的唯一键，用于判断检查点中是否已计算过
+def _param_key(params):
+    return tuple(float(params[name]) for name in PARAM_NAMES)
+
+
+# 从检查点文件读取已完成的结果；最后一行若在写入时被中断，截掉后再续写
+def load_checkpoint(results_file, columns):
+    if not os.path.exists(results_file):
+        return pd.DataFrame(columns=columns)
+
+    with open(results_file, 'rb+') as f:
+        content = f.read()
+        if content and not content.endswith(b'\n'):
+            f.truncate(content.rfind(b'\n') + 1)
+    if os.path.getsize(results_file) == 0:
+        return pd.DataFrame(columns=columns)
+
+    done = pd.read_csv(results_file, float_precision='round_trip')
+    if list(done.columns) != list(columns):
+        raise ValueError(f"检查点 {results_file} 的列与当前统计指标不一致: {list(done.columns)}")
+    return done
+
+
+# 检查点对应的数据和资金，数据变化后旧结果不可复用
+def _check_checkpoint_meta(results_file, data, cash, intrabar=False):
+    meta_file = f'{os.path.splitext(results_file)[0]}.meta.json'
+    meta = {
+        'data_fingerprint': data_fingerprint(*(data[col].to_numpy(dtype=np.float64)
+                                               for col in ('Open', 'High', 'Low', 'Close'))),
+        'rows': len(data),
+        'cash': cash,
+    }
+    if intrabar:
+        meta['intrabar'] = True
+    if os.path.exists(meta_file):
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved != meta:
+            raise ValueError(f"检查点 {results_file} 是在其他数据上生成的，请更换文件名或删除旧检查点。")
+    else:
+        os.makedirs(os.path.dirname(results_file) or '.', exist_ok=True)
+        with open(meta_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+
+def run_sweep(data, processes=None, cash=1_000_000_000_000, constraint=None, metrics=AVAILABLE_METRICS,
+              results_file=None, max_tries=None, random_state=0, flush_interval=5, sub_data=None, **param_ranges):
+    """
+    参数扫描，替代 bt.optimize(method='grid')。
+
+    参数:
+    - data: 含 OHLCV 列的 DataFrame
+    - processes: 进程数，默认等于CPU核数
+    - cash: 初始资金
+    - constraint: 可选，接收参数字典并返回 bool，与 bt.optimize 的 constraint 相同
+    - metrics: 每组参数记录的统计指标，一次模拟全部得到，无需再 bt.run
+    - results_file: 检查点 CSV 路径；每完成一组参数追加一行，重启后跳过已计算的组合
+    - max_tries: 最多计算的组合数，从固定随机顺序中取前 max_tries 个；
+      之后调大 max_tries 再运行，只会计算新增的组合
+    - random_state: 抽样顺序的随机种子，续跑时需保持不变
+    - flush_interval: 检查点写盘间隔（秒）
+    - sub_data: 可选，同一时间段的 1m 数据，K线内止损止盈的先后由 1m K线判断
+    - param_ranges: ema_period、atr_period、multiplier、atr_threshold_pct、rr、counter_start、counter_end 的取值列表；
+      counter_start / counter_end 为逆势时段的起止小时（UTC，含两端），-1 为不启用
+
+    返回:
+    - results: DataFrame，每行一组参数及其各项统计指标
+    """
+    combos = build_param_grid(constraint=constraint, **param_ranges)
+    if max_tries is not None and max_tries < len(combos):
+        order = np.random.default_rng(random_state).permutation(len(combos))
+        combos = [combos[i] for i in order[:int(max_tries)]]
+
+    columns = PARAM_NAMES + list(metrics)
+    done = pd.DataFrame(columns=columns)
+    if results_file:
+        _check_checkpoint_meta(results_file, data, cash, sub_data is not None)
+        done = load_checkpoint(results_file, columns)
+        done_keys = {_param_key(row) for row in done[PARAM_NAMES].to_dict('records')}
+        combos = [params for params in combos if _param_key(params) not in done_keys]
+        if len(done):
+            print(f"从检查点恢复 {len(done)} 组结果: {results_file}")
+    print(f"参数扫描组合数: {len(combos)}，进程数: {processes or os.cpu_count()}")
+
+    rows = []
+    if combos:
+        checkpoint = None
+        if results_file:
+            is_new = not os.path.exists(results_file) or os.path.getsize(results_file) == 0
+            checkpoint = open(results_file, 'a', newline='')
+            writer = csv.DictWriter(checkpoint, fieldnames=columns)
+            if is_new:
+                writer.writeheader()
+        last_flush = time.monotonic()
+        try:
+            with tqdm(total=len(combos), desc='参数扫描', ncols=100) as bar:
+                for result in iter_sweep(data, combos, processes=processes, cash=cash, metrics=metrics,
+                                         sub_data=sub_data):
+                    rows.append(result)
+                    bar.update(1)
+                    if checkpoint:
+                        writer.writerow(result)
+                        if time.monotonic() - last_flush >= flush_interval:
+                            checkpoint.flush()
+                            os.fsync(checkpoint.fileno())
+                            last_flush = time.monotonic()
+        finally:
+            if checkpoint:
+                checkpoint.close()
+
+    new = pd.DataFrame(rows, columns=columns)
+    if not len(done):
+        return new
+    if not len(new):
+        return done
+    return pd.concat([done, new], ignore_index=True)
+
+
+# 前推分析的窗口下标；长度为整数时按K线根数，为字符串（如 '30D'）时按时间
+def walk_forward_windows(index, train, test, step=None, anchored=False):
+    """
+    参数:
+    - index: 数据的 DatetimeIndex
+    - train / test: 训练窗口和测试窗口长度
+    - step: 窗口每次前移的长度，默认等于 test，测试窗口首尾相接
+    - anchored: 为True时训练窗口起点固定在数据开头（扩展窗口）
+
+    返回:
+    - windows: [(train_begin, train_end, test_begin, test_end), ...]，均为左闭右开的行号
+    """
+    step = step or test
+    lengths = (train, test, step)
+    n = len(index)
+    windows = []
+    if all(isinstance(length, (int, np.integer)) for length in lengths):
+        k = 0
+        while k * step + train + test <= n:
+            train_end = k * step + train
+            windows.append((0 if anchored else k * step, train_end, train_end, train_end + test))
+            k += 1
+        return windows
+    if any(isinstance(length, (int, np.integer)) for length in lengths):
+        raise ValueError("train、test、step 需同为K线根数或同为时间长度")
+
+    train, test, step = (pd.Timedelta(length) for length in lengths)
+    end_time = index[-1] + (index[-1] - index[-2] if n > 1 else pd.Timedelta(0))
+    k = 0
+    while index[0] + k * step + train + test <= end_time:
+        start_time = index[0] + k * step
+        train_begin, train_end, test_end = (int(index.searchsorted(t)) for t in
+                                            (index[0] if anchored else start_time,
+                                             start_time + train, start_time + train + test))
+        windows.append((train_begin, train_end, train_end, test_end))
+        k += 1
+    return windows
+
+
+def walk_forward(data, train, test, step=None, anchored=False, objective='Win Rate [%]', processes=None,
+                 cash=1_000_000_000_000, constraint=None, metrics=AVAILABLE_METRICS, sub_data=None, **param_ranges):
+    """
+    前推分析：在每个训练窗口上扫描参数网格选出最优参数，再到紧随其后的测试窗口上做样本外回测。
+    所有窗口的训练任务放入同一个进程池并行运行；指标在全量数据上只算一次，各窗口直接切片使用，
+    窗口开头也不需要重新预热。
+
+    参数:
+    - data: 含 OHLCV 列、以时间为索引的 DataFrame
+    - train / test / step / anchored: 窗口划分，见 walk_forward_windows
+    - objective: 选参目标，统计指标名或接收一行结果返回分数的函数（如 custom_maximize）
+    - processes: 进程数，默认等于CPU核数
+    - cash: 初始资金
+    - constraint: 可选，参数约束，同 run_sweep
+    - metrics: 记录的统计指标
+    - sub_data: 可选，同 run_sweep
+    - param_ranges: 参数取值列表，同 run_sweep
+
+    返回:
+    - folds: DataFrame，每行一个窗口：时间范围、最优参数、训练集指标（IS 前缀）和测试集指标（OOS 前缀）
+    - train_results: DataFrame，所有窗口所有参数组合的训练集结果，fold 列为窗口序号
+    """
+    windows = walk_forward_windows(data.index, train, test, step, anchored)
+    if not windows:
+        raise ValueError("数据长度不足一个训练窗口加一个测试窗口")
+    combos = build_param_grid(constraint=constraint, **param_ranges)
+    processes = processes or os.cpu_count() or 1
+    if objective not in metrics and not callable(objective):
+        raise ValueError(f"选参目标 {objective} 不在记录的统计指标中")
+
+    chunk_size = max(1, math.ceil(len(combos) * len(windows) / (processes * 8)))
+    tasks = []
+    for fold, (train_begin, train_end, _, _) in enumerate(windows):
+        tasks.extend(_build_tasks(combos, processes, (fold, train_begin, train_end), chunk_size))
+    print(f"前推分析窗口数: {len(windows)}，每个窗口参数组合数: {len(combos)}，进程数: {processes}")
+
+    rows = []
+    with tqdm(total=len(combos) * len(windows), desc='前推分析', ncols=100) as bar:
+        for result in _iter_tasks(data, tasks, processes, cash, metrics, sub_data):
+            rows.append(result)
+            bar.update(1)
+    train_results = pd.DataFrame(rows).sort_values(['fold'] + PARAM_NAMES, ignore_index=True)
+
+    scores = train_results[objective] if isinstance(objective, str) else train_results.apply(objective, axis=1)
+    best = train_results.loc[scores.astype(float).fillna(-np.inf).groupby(train_results['fold']).idxmax()]
+
+    # 每个窗口只有一组最优参数，样本外回测在当前进程完成
+    test_tasks = []
+    for params in best.to_dict('records'):
+        _, _, test_begin, test_end = windows[params['fold']]
+        test_tasks.extend(_build_tasks([params], 1, (params['fold'], test_begin, test_end)))
+    tests = pd.DataFrame(list(_iter_tasks(data, test_tasks, 1, cash, metrics, sub_data)))
+
+    index = data.index
+    folds = pd.DataFrame([{
+        'fold': fold,
+        'train_start': index[train_begin],
+        'train_end': index[train_end - 1],
+        'test_start': index[test_begin],
+        'test_end': index[test_end - 1],
+    } for fold, (train_begin, train_end, test_begin, test_end) in enumerate(windows)])
+    folds = folds.merge(best[['fold'] + PARAM_NAMES + list(metrics)].rename(
+        columns={m: f'IS {m}' for m in metrics}), on='fold')
+    folds = folds.merge(tests[['fold'] + list(metrics)].rename(
+        columns={m: f'OOS {m}' for m in metrics}), on='fold')
+    return folds, train_results
+
+
+def halving_search(data, eta=3, min_fraction=1 / 9, min_trades=10, min_win_rate=None, objective='Win Rate [%]',
+                   processes=None, cash=1_000_000_000_000, constraint=None, metrics=AVAILABLE_METRICS,
+                   sub_data=None, **param_ranges):
+    """
+    逐级减半搜索：所有组合先在数据开头的一小段上回测，淘汰交易过少、胜率过低的组合，
+    其余按目标排序只保留前 1/eta 进入下一级，回测长度扩大 eta 倍，最后一级为全部数据。
+    指标在全量数据上只算一次，前缀回测与只用前缀数据回测的结果相同。
+
+    参数:
+    - data: 含 OHLCV 列的 DataFrame
+    - eta: 每级保留比例的倒数，也是回测长度的增长倍数
+    - min_fraction: 第一级回测使用的数据比例，如 1/9 时依次为 1/9、1/3、全部
+    - min_trades: 全部数据上要求的最少交易数，每一级按数据比例折算
+    - min_win_rate: 可选，胜率低于该值（%）的组合直接淘汰
+    - objective: 排序目标，统计指标名或接收一行结果返回分数的函数（如 custom_maximize）
+    - processes / cash / constraint / metrics / sub_data / param_ranges: 同 run_sweep
+
+    返回:
+    - results: DataFrame，进入最后一级的组合在全部数据上的结果，列与 run_sweep 相同
+    - history: DataFrame，每一级所有组合的结果，rung 列为级数，fraction 列为数据比例
+    """
+    if objective not in metrics and not callable(objective):
+        raise ValueError(f"排序目标 {objective} 不在记录的统计指标中")
+    if '# Trades' not in metrics or (min_win_rate is not None and 'Win Rate [%]' not in metrics):
+        raise ValueError("逐级减半搜索需要记录 # Trades（设置 min_win_rate 时还需要 Win Rate [%]）")
+    processes = processes or os.cpu_count() or 1
+    combos = build_param_grid(constraint=constraint, **param_ranges)
+    rungs = max(0, math.ceil(math.log(1 / min_fraction) / math.log(eta) - 1e-9))
+    fractions = [eta ** -(rungs - k) for k in range(rungs)] + [1.0]
+    print(f"逐级减半搜索组合数: {len(combos)}，数据比例: {[round(f, 4) for f in fractions]}，进程数: {processes}")
+
+    history = []
+    evaluated = 0
+    for rung, fraction in enumerate(fractions):
+        end = len(data) if fraction >= 1 else max(2, int(len(data) * fraction))
+        tasks = _build_tasks(combos, processes, (rung, 0, end))
+        rows = []
+        with tqdm(total=len(combos), desc=f'第 {rung + 1} 级', ncols=100) as bar:
+            for result in _iter_tasks(data, tasks, processes, cash, metrics, sub_data):
+                rows.append(result)
+                bar.update(1)
+        evaluated += len(combos) * end / len(data)
+        results = pd.DataFrame(rows).drop(columns='fold').sort_values(PARAM_NAMES, ignore_index=True)
+        history.append(results.assign(rung=rung, fraction=fraction))
+        if fraction >= 1:
+            break
+
+        hopeless = results['# Trades'] < min_trades * fraction
+        if min_win_rate is not None:
+            hopeless |= ~(results['Win Rate [%]'] >= min_win_rate)
+        scores = results[objective] if isinstance(objective, str) else results.apply(objective, axis=1)
+        scores = scores.astype(float).fillna(-np.inf)
+        # 全部被淘汰时仍保留得分最高的一组，保证有结果
+        survivors = scores[~hopeless] if (~hopeless).any() else scores
+        keep = survivors.nlargest(max(1, math.ceil(len(survivors) / eta))).index
+        print(f"第 {rung + 1} 级：{len(results)} 组中淘汰 {int(hopeless.sum())} 组无效组合，晋级 {len(keep)} 组")
+        combos = results.loc[keep, PARAM_NAMES].to_dict('records')
+
+    print(f"逐级减半搜索完成，计算量约为完整网格的 {evaluated / len(history[0]):.1%}")
+    results = results[PARAM_NAMES + list(metrics)]
+    return results, pd.concat(history, ignore_index=True)
@@ -1,16 +1,24 @@
 import pandas as pd
 import glob
-import smtplib
 import os
+import sys
+import time
+import random
+import threading
 import requests
 import zipfile
+import hashlib
+import json
 import plotly.graph_objects as go
 
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from dotenv import load_dotenv  # 添加此导入
 
+# 仓库根目录，bt 和 rt 共用的模块放在 common/ 下
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.notifier import get_notifier
+
 # 在文件顶部加载 .env 文件
 load_dotenv()
 
@@ -40,10 +48,41 @@ def merge_csv_files(symbol='BTCUSDT', interval='15m', directory=None, output_fil
         print(f"合并出错：{e}")
         return None
 
+# 计算文件校验和
+def file_checksum(file_path, chunk_size=1024 * 1024):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+# 读取合并清单，不存在或损坏时返回空清单
+def load_merge_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {'output_size': None, 'output_mtime': None, 'files': {}}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"清单读取失败，将重新合并：{e}")
+        return {'output_size': None, 'output_mtime': None, 'files': {}}
+
+def save_merge_manifest(manifest_path, manifest):
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
 # 按年份和月份合并数据
-def merge_csv_files_by_years_months(symbol, interval, years, months, output_file=None):
+def merge_csv_files_by_years_months(symbol, interval, years, months, output_file=None, return_data=True):
     """
     合并指定年月的数据文件为一个新的CSV文件。
+
+    合并结果旁边保存一份清单（文件名、大小、修改时间、行数、open_time 范围、校验和），
+    再次运行时只读取新增或变化的月份：
+    - 没有任何变化时跳过写入
+    - 只有新增月份且都晚于已合并数据时，按时间顺序追加到合并文件末尾
+    - 其他情况（已有月份被修改或移除）重新合并
     
     参数:
     - symbol: 交易对符号，如 'BTCUSDT'
@@ -51,6 +90,7 @@ def merge_csv_files_by_years_months(symbol, interval, years, months, output_file
     - years: 年份列表，如 [2024, 2025]
     - months: 月份列表，如 [1, 2, 3]
     - output_file: 输出文件路径，如果为None，则使用默认路径 'data/merged_{symbol}-{interval}.csv'
+    - return_data: 是否返回合并后的DataFrame；为False时不再读取合并文件，返回None
     
     返回:
     - merged_data: 合并后的DataFrame
@@ -58,29 +98,91 @@ def merge_csv_files_by_years_months(symbol, interval, years, months, output_file
     
     if output_file is None:
         output_file = f'data/merged_{symbol}-{interval}.csv'
-    
-    data_frames = []
-    
+    manifest_path = f'{os.path.splitext(output_file)[0]}.manifest.json'
+    manifest = load_merge_manifest(manifest_path)
+    old_files = manifest['files']
+
+    # 合并文件被外部改动时，清单不再可信
+    output_valid = (os.path.exists(output_file)
+                    and manifest['output_size'] == os.path.getsize(output_file)
+                    and manifest['output_mtime'] == os.path.getmtime(output_file))
+
+    files = {}
+    changed = {}  # 新增或变化的月份 -> DataFrame
     for year in years:
         for month in months:
             file_path = f'data/{symbol}-{interval}/{symbol}-{interval}-{year}-{month:02d}.csv'
-            if os.path.exists(file_path):
-                df = pd.read_csv(file_path)
-                data_frames.append(df)
-            else:
+            if not os.path.exists(file_path):
                 print(f"文件不存在: {file_path}")
-    
-    if data_frames:
+                continue
+
+            name = os.path.basename(file_path)
+            stat = os.stat(file_path)
+            entry = old_files.get(name)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                files[name] = entry
+                continue
+
+            checksum = file_checksum(file_path)
+            df = pd.read_csv(file_path)
+            files[name] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'rows': len(df),
+                'min_open_time': int(df['open_time'].min()) if len(df) else None,
+                'max_open_time': int(df['open_time'].max()) if len(df) else None,
+                'checksum': checksum,
+            }
+            # 只是修改时间变了，内容相同
+            if entry and entry['checksum'] == checksum:
+                continue
+            changed[name] = df
+
+    if not files:
+        print("没有找到任何文件进行合并")
+        return pd.DataFrame()
+
+    removed = set(old_files) - set(files)
+    if output_valid and not changed and not removed:
+        print(f"数据无变化，跳过合并: {output_file}")
+        if files != old_files:
+            save_merge_manifest(manifest_path, {**manifest, 'files': files})
+        return pd.read_csv(output_file, parse_dates=['open_time']) if return_data else None
+
+    old_max = max((entry['max_open_time'] for entry in old_files.values()
+                   if entry['max_open_time'] is not None), default=None)
+    can_append = (output_valid and not removed and old_max is not None
+                  and all(name not in old_files for name in changed)
+                  and all(files[name]['min_open_time'] is None or files[name]['min_open_time'] > old_max
+                          for name in changed))
+
+    if can_append:
+        new_data = pd.concat([changed[name] for name in sorted(changed)], ignore_index=True)
+        new_data['open_time'] = pd.to_datetime(new_data['open_time'], unit='ms')
+        new_data.sort_values('open_time', inplace=True)
+        new_data.to_csv(output_file, mode='a', header=False, index=False)
+        print(f"追加 {len(changed)} 个月份（{len(new_data)} 行）到 {output_file}")
+        merged_data = pd.read_csv(output_file, parse_dates=['open_time']) if return_data else None
+    else:
+        # 未变化的月份仍需重新读取
+        data_frames = [changed[name] if name in changed
+                       else pd.read_csv(f'data/{symbol}-{interval}/{name}')
+                       for name in files]
         merged_data = pd.concat(data_frames, ignore_index=True)
         # 转换 open_time 为可读格式并排序
         merged_data['open_time'] = pd.to_datetime(merged_data['open_time'], unit='ms')
         merged_data.sort_values('open_time', inplace=True)
         merged_data.to_csv(output_file, index=False)
         print(f"合并完成，输出文件: {output_file}")
-        return merged_data
-    else:
-        print("没有找到任何文件进行合并")
-        return pd.DataFrame()
+        if not return_data:
+            merged_data = None
+
+    save_merge_manifest(manifest_path, {
+        'output_size': os.path.getsize(output_file),
+        'output_mtime': os.path.getmtime(output_file),
+        'files': files,
+    })
+    return merged_data
 
 # 加载和处理数据
 def load_and_process_data(file_path='data/merged_BTCUSDT-15m.csv'):
@@ -135,40 +237,138 @@ def load_and_process_data(file_path='data/merged_BTCUSDT-15m.csv'):
         print(f"数据加载和处理出错：{e}")
         return None
 
+BINANCE_DATA_URL = 'https://data.binance.vision'
+
+# 每个下载线程一个 Session，复用 TCP/TLS 连接
+_download_local = threading.local()
+
+
+def _download_session():
+    session = getattr(_download_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        _download_local.session = session
+    return session
+
+
+# 第 attempt 次重试前按指数退避等待，带少量随机抖动
+def _retry_sleep(backoff, attempt):
+    if attempt:
+        time.sleep(backoff * 2 ** (attempt - 1) * (1 + random.random() * 0.1))
+
+
+# 读取 .CHECKSUM 文件中的 sha256，文件不存在时返回None
+def _fetch_checksum(session, url, timeout):
+    response = session.get(url + '.CHECKSUM', timeout=timeout)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.text.split()[0].lower()
+
+
+# 下载单个文件：先写入 .part，中断后用 Range 续传，校验通过后再改名
+def _download_file(url, save_path, retries, backoff, chunk_size, timeout, verify_checksum):
+    file_name = os.path.basename(save_path)
+    part_path = save_path + '.part'
+    session = _download_session()
+
+    # 校验和每个文件只取一次，下载重试时复用
+    checksum = None
+    if verify_checksum:
+        for attempt in range(retries + 1):
+            _retry_sleep(backoff, attempt)
+            try:
+                checksum = _fetch_checksum(session, url, timeout)
+                break
+            except Exception as e:
+                print(f"获取校验和失败 {file_name}（第 {attempt + 1} 次）: {e}")
+        else:
+            return 'failed'
+
+    for attempt in range(retries + 1):
+        _retry_sleep(backoff, attempt)
+        try:
+            if os.path.exists(save_path):
+                if checksum is None or file_checksum(save_path) == checksum:
+                    return 'exists'
+                print(f"校验失败，重新下载：{file_name}")
+                os.remove(save_path)
+
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 404:
+                    print(f"❌ 无法访问 {file_name} (状态码: 404)")
+                    return 'missing'
+                if response.status_code == 416:
+                    pass  # .part 已经完整
+                elif response.status_code in (200, 206):
+                    # 服务器不支持 Range 时返回 200，从头写
+                    mode = 'ab' if response.status_code == 206 else 'wb'
+                    with open(part_path, mode) as file:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            file.write(chunk)
+                else:
+                    response.raise_for_status()
+                    raise requests.HTTPError(f"状态码: {response.status_code}")
+
+            if checksum is not None and file_checksum(part_path) != checksum:
+                os.remove(part_path)
+                raise ValueError("sha256 与 .CHECKSUM 不一致")
+            os.replace(part_path, save_path)
+            return 'downloaded'
+        except Exception as e:
+            print(f"下载失败 {file_name}（第 {attempt + 1} 次）: {e}")
+    return 'failed'
+
+
 # 下载Binance数据
-def download_binance_data(symbol='ETCUSDT', interval='15m', years=[2020], months=range(1, 13), save_dir='./data'):
+def download_binance_data(symbol='ETCUSDT', interval='15m', years=[2020], months=range(1, 13), save_dir='./data',
+                          base_url=BINANCE_DATA_URL, max_workers=8, retries=5, backoff=1.0,
+                          chunk_size=1 << 20, timeout=30, verify_checksum=True):
+    """
+    并发下载 Binance 月度K线压缩包，支持断点续传、.CHECKSUM 校验和失败重试。
+
+    参数:
+    - symbol / interval / years / months: 要下载的交易对、周期和年月
+    - save_dir: 保存目录，文件存放在 '{save_dir}/{symbol}_{interval}/'
+    - base_url: 数据站点根地址，测试时可指向本地服务
+    - max_workers: 并发下载线程数
+    - retries: 每个文件失败后的最大重试次数，间隔按 backoff 指数增长
+    - chunk_size: 写盘块大小（字节）
+    - timeout: 单次请求超时（秒）
+    - verify_checksum: 是否用 .CHECKSUM 校验新下载和已存在的文件
 
+    返回:
+    - results: {文件名: 'downloaded' | 'exists' | 'missing' | 'failed'}
+    """
     save_dir = f"{save_dir}/{symbol}_{interval}"
     os.makedirs(save_dir, exist_ok=True)
     
-    base_url = f"https://data.binance.vision/data/futures/um/monthly/klines/{symbol}/{interval}/"
-    
-    for year in years:
-        for month in months:
-            file_name = f"{symbol}-{interval}-{year}-{month:02d}.zip"
-            url = base_url + file_name
-            save_path = os.path.join(save_dir, file_name)
-            
-            if os.path.exists(save_path):
+    url_dir = f"{base_url}/data/futures/um/monthly/klines/{symbol}/{interval}/"
+    file_names = [f"{symbol}-{interval}-{year}-{month:02d}.zip" for year in years for month in months]
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_download_file, url_dir + file_name, os.path.join(save_dir, file_name),
+                            retries, backoff, chunk_size, timeout, verify_checksum): file_name
+            for file_name in file_names
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc='下载', ncols=100):
+            file_name = futures[future]
+            results[file_name] = future.result()
+            if results[file_name] == 'downloaded':
+                print(f"✅ 下载完成: {file_name}")
+            elif results[file_name] == 'exists':
                 print(f"已存在：{file_name}")
-                continue
-            
-            try:
-                print(f"开始下载 {file_name} ...")
-                response = requests.get(url, stream=True)
-                if response.status_code == 200:
-                    total = int(response.headers.get('content-length', 0))
-                    with open(save_path, 'wb') as file, tqdm(
-                        desc=file_name, total=total, unit='B', unit_scale=True, ncols=100
-                    ) as bar:
-                        for chunk in response.iter_content(chunk_size=1024):
-                            file.write(chunk)
-                            bar.update(len(chunk))
-                    print(f"✅ 下载完成: {file_name}")
-                else:
-                    print(f"❌ 无法访问 {file_name} (状态码: {response.status_code})")
-            except Exception as e:
-                print(f"下载失败 {file_name}: {e}")
+
+    failed = [name for name, status in results.items() if status == 'failed']
+    if failed:
+        print(f"以下文件下载失败: {failed}")
+    return results
 
 # 解压Binance数据
 def unzip_binance_data(symbol='ETCUSDT', interval='15m', save_dir='./data'):
@@ -190,7 +390,7 @@ def unzip_binance_data(symbol='ETCUSDT', interval='15m', save_dir='./data'):
         except Exception as e:
             print(f"解压失败 {zip_path}: {e}")
 
-# 发送邮件提醒
+# 发送邮件提醒（后台发送，不阻塞调用方）
 def send_email_notification(
     subject,
     body,
@@ -199,7 +399,8 @@ def send_email_notification(
     smtp_server='smtp.qq.com',
     smtp_port=587,
     smtp_user=None,
-    smtp_password=None
+    smtp_password=None,
+    use_tls=True
 ):
     # 从环境变量读取敏感信息
     if to_email is None:
@@ -213,23 +414,16 @@ def send_email_notification(
         if smtp_password is None:
             raise ValueError("SMTP_PASSWORD 环境变量未设置，无法发送邮件。")
     
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = from_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        text = msg.as_string()
-        server.sendmail(from_email, to_email, text)
-        server.quit()
-        print("邮件发送成功。")
-    except Exception as e:
-        print(f"邮件发送失败：{e}")
+    # 放入后台队列立即返回；同一配置共用一个 SMTP 连接，短时间内的多条通知合并发送
+    get_notifier(
+        smtp_server=smtp_server,
+        smtp_port=smtp_port,
+        smtp_user=smtp_user,
+        smtp_password=smtp_password,
+        from_email=from_email,
+        to_email=to_email,
+        use_tls=use_tls,
+    ).notify(subject, body)
 
 def create_3d_heatmap_cube(aggregated, batch_folder, title='3D Heatmap Cube: EMA Period vs ATR Period vs Multiplier'):
     """
@@ -0,0 +1,170 @@
+import time
+import queue
+import atexit
+import smtplib
+import threading
+
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+
+class EmailNotifier:
+    """
+    后台发送邮件：notify 只把消息放入队列立即返回，由后台线程复用同一个 SMTP 连接发送。
+    batch_window 秒内到达的多条消息合并为一封汇总邮件。
+
+    参数:
+    - smtp_server / smtp_port: SMTP 服务器
+    - smtp_user / smtp_password: 登录信息，smtp_user 为None时不登录
+    - from_email / to_email: 发件人和收件人
+    - use_tls: 是否 STARTTLS
+    - batch_window: 收到第一条消息后等待合并的秒数
+    - max_batch: 单封汇总邮件最多包含的消息数
+    - idle_timeout: 连接空闲多少秒后断开，下次发送时重连
+    """
+
+    def __init__(self, smtp_server='smtp.qq.com', smtp_port=587, smtp_user=None, smtp_password=None,
+                 from_email=None, to_email=None, use_tls=True, batch_window=2.0, max_batch=50, idle_timeout=60):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.smtp_user = smtp_user
+        self.smtp_password = smtp_password
+        self.from_email = from_email
+        self.to_email = to_email
+        self.use_tls = use_tls
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+
+        self.sent_emails = 0
+        self._queue = queue.Queue()
+        self._server = None
+        self._worker = None
+        self._lock = threading.Lock()
+
+    # 放入队列后立即返回，不阻塞调用方
+    def notify(self, subject, body):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='email-notifier', daemon=True)
+                self._worker.start()
+        self._queue.put((datetime.now(), subject, body))
+
+    # 等待队列中的消息全部处理完
+    def flush(self):
+        self._queue.join()
+
+    # 发送剩余消息后停止后台线程并断开连接
+    def close(self, timeout=30):
+        with self._lock:
+            worker = self._worker
+            if worker is None or not worker.is_alive():
+                self._disconnect()
+                return
+            self._queue.put(None)  # 排在所有消息之后，后台线程取到即退出
+        worker.join(timeout)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if first is None:
+                self._queue.task_done()
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._send(*self._compose(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        self._disconnect()
+
+    # 单条消息原样发送；多条合并为汇总邮件
+    def _compose(self, batch):
+        if len(batch) == 1:
+            return batch[0][1], batch[0][2]
+        parts = [f"[{created:%Y-%m-%d %H:%M:%S}] {subject}\n{body}" for created, subject, body in batch]
+        return f"通知汇总（{len(batch)} 条）：{batch[0][1]}", f"\n\n{'-' * 40}\n\n".join(parts)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+        if self.use_tls:
+            server.starttls()
+        if self.smtp_user:
+            server.login(self.smtp_user, self.smtp_password)
+        return server
+
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def _send(self, subject, body):
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = self.to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        # 复用已有连接；连接已被服务器断开时重连一次
+        for attempt in range(2):
+            try:
+                if self._server is None:
+                    self._server = self._connect()
+                self._server.sendmail(self.from_email, self.to_email, msg.as_string())
+                self.sent_emails += 1
+                print("邮件发送成功。")
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self._server = None
+                if attempt == 1:
+                    print(f"邮件发送失败：{e}")
+            except Exception as e:
+                self._disconnect()
+                print(f"邮件发送失败：{e}")
+                return
+
+
+_notifiers = {}
+_notifiers_lock = threading.Lock()
+
+
+# 按配置取共享的通知器，同一配置在进程内只有一个后台线程和一个连接
+def get_notifier(**config):
+    key = tuple(sorted(config.items()))
+    with _notifiers_lock:
+        notifier = _notifiers.get(key)
+        if notifier is None:
+            notifier = _notifiers[key] = EmailNotifier(**config)
+        return notifier
+
+
+# 进程退出前把队列中的邮件发完
+@atexit.register
+def close_notifiers():
+    for notifier in list(_notifiers.values()):
+        notifier.close()
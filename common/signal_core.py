@@ -0,0 +1,78 @@
+import numpy as np
+
+# 开仓信号的公共实现，回测（bt/strategy.py、bt/engine.py）和实盘（rt/mark.py、rt/orders.py）共用，
+# 保证两边的突破判断、波动率过滤、顺势/逆势时段和止损止盈价格完全一致。
+# 价格和指标参数既可以是标量（逐根K线），也可以是等长 numpy 数组（向量化回测）。
+
+# 开仓方向与实盘信号名称的对应关系
+SIGNAL_NAMES = {1: 'long_entry', -1: 'short_entry'}
+
+
+# 上下轨：EMA ± ATR * multiplier
+def bands(ema, atr, multiplier):
+    return ema + atr * multiplier, ema - atr * multiplier
+
+
+# a 上穿 b：前一根 a < b 且当前 a > b，与 backtesting.lib.crossover 一致（含 NaN 时为False）
+def crossover(previous_a, a, previous_b, b):
+    return (previous_a < previous_b) & (a > b)
+
+
+# 收盘价突破上轨 / 跌破下轨，前一根K线与前一根的轨道比较
+def breakouts(previous_close, close, previous_ema, previous_atr, ema, atr, multiplier):
+    """
+    返回:
+    - upper_breakout: 收盘价上穿上轨
+    - lower_breakout: 收盘价下穿下轨
+    """
+    previous_upper, previous_lower = bands(previous_ema, previous_atr, multiplier)
+    upper, lower = bands(ema, atr, multiplier)
+    return crossover(previous_close, close, previous_upper, upper), crossover(previous_lower, lower, previous_close, close)
+
+
+# 波动率过滤：ATR 占收盘价的比例低于阈值时不开仓
+def is_low_volatility(atr, close, atr_threshold_pct):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return atr / close < atr_threshold_pct
+
+
+# 逆势时段的 24 小时查找表：[counter_start, counter_end] 含两端，起点大于终点时跨零点；任一端为 -1 时不启用
+def counter_hour_table(counter_start, counter_end):
+    hours = np.arange(24)
+    if counter_start < 0 or counter_end < 0:
+        return np.zeros(24, dtype=bool)
+    if counter_start <= counter_end:
+        return (hours >= counter_start) & (hours <= counter_end)
+    return (hours >= counter_start) | (hours <= counter_end)
+
+
+# 小时（UTC，标量或数组）是否处于逆势时段
+def is_counter_hour(hour, counter_start, counter_end):
+    return counter_hour_table(counter_start, counter_end)[hour]
+
+
+# 开仓方向：顺势时上轨突破做多、下轨突破做空，逆势时段相反；两者同时成立时上轨优先
+def entry_direction(upper_breakout, lower_breakout, is_counter=False):
+    direction = np.where(upper_breakout, 1, np.where(lower_breakout, -1, 0)).astype(np.int8)
+    return np.where(is_counter, -direction, direction).astype(np.int8)
+
+
+# 单根K线收盘时的开仓方向：1 做多，-1 做空，0 不开仓（不含持仓判断）
+def evaluate_bar(previous_close, close, previous_ema, previous_atr, ema, atr, hour,
+                 multiplier, atr_threshold_pct, counter_start=-1, counter_end=-1):
+    if is_low_volatility(atr, close, atr_threshold_pct):
+        return 0
+    upper_breakout, lower_breakout = breakouts(previous_close, close, previous_ema, previous_atr, ema, atr, multiplier)
+    if not (upper_breakout or lower_breakout):
+        return 0
+    return int(entry_direction(upper_breakout, lower_breakout, is_counter_hour(hour, counter_start, counter_end)))
+
+
+# 止损止盈价格：止损距离为 ATR，止盈距离为 ATR * rr；回测以信号K线收盘价为基准，实盘以成交均价为基准
+def protective_prices(price, direction, atr, rr):
+    """
+    返回:
+    - sl: 止损价
+    - tp: 止盈价（实盘为移动止盈止损的激活价）
+    """
+    return price - direction * atr, price + direction * atr * rr
@@ -0,0 +1,88 @@
+import threading
+import socketserver
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    # 只实现 smtplib 发信用到的命令，不做 TLS
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        if server.delay:
+            threading.Event().wait(server.delay)
+        self._reply('220 smtp-stub ready')
+        mail_from, rcpt_to = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-smtp-stub\r\n250 AUTH PLAIN LOGIN\r\n')
+            elif verb == 'HELO':
+                self._reply('250 smtp-stub')
+            elif verb == 'AUTH':
+                with server.lock:
+                    server.logins += 1
+                self._reply('235 authenticated')
+            elif verb == 'MAIL':
+                mail_from, rcpt_to = command[10:].strip('<> '), []
+                self._reply('250 ok')
+            elif verb == 'RCPT':
+                rcpt_to.append(command[8:].strip('<> '))
+                self._reply('250 ok')
+            elif verb == 'DATA':
+                self._reply('354 end with <CRLF>.<CRLF>')
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line == b'.\r\n':
+                        break
+                    data.append(data_line)
+                with server.lock:
+                    server.messages.append((mail_from, rcpt_to, b''.join(data).decode(errors='replace')))
+                self._reply('250 queued')
+            elif verb in ('RSET', 'NOOP'):
+                self._reply('250 ok')
+            elif verb == 'QUIT':
+                self._reply('221 bye')
+                return
+            else:
+                self._reply('502 not implemented')
+
+    def _reply(self, text):
+        self.wfile.write(f'{text}\r\n'.encode())
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """
+    本地 SMTP 替身服务，用于测试邮件通知：接受任意登录，收到的邮件保存在 messages 中。
+
+    参数:
+    - host / port: 监听地址，port 为0时自动分配
+    - delay: 每个新连接应答前等待的秒数，模拟远程服务器握手耗时
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.delay = delay
+        self.connections = 0
+        self.logins = 0
+        self.messages = []
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
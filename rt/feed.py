@@ -0,0 +1,180 @@
+import time
+import hmac
+import json
+import base64
+import asyncio
+import aiohttp
+
+OKX_PUBLIC_WS = 'wss://ws.okx.com:8443/ws/v5/business'
+OKX_PRIVATE_WS = 'wss://ws.okx.com:8443/ws/v5/private'
+
+# OKX 要求 30 秒内有消息往来，否则断开
+PING_INTERVAL = 20
+
+# 本地最多保留的订单推送条数
+MAX_ORDERS = 500
+
+
+# ccxt 交易对转 OKX instId，如 'BTC/USDT:USDT' -> 'BTC-USDT-SWAP'
+def to_inst_id(symbol):
+    base, rest = symbol.split('/')
+    quote, _, settle = rest.partition(':')
+    return f'{base}-{quote}-SWAP' if settle else f'{base}-{quote}'
+
+
+# WebSocket 登录签名：base64(hmac_sha256(secret, timestamp + 'GET' + '/users/self/verify'))
+def login_args(api_key, api_secret, passphrase):
+    timestamp = str(int(time.time()))
+    digest = hmac.new(api_secret.encode(), f'{timestamp}GET/users/self/verify'.encode(), 'sha256').digest()
+    return {
+        'apiKey': api_key,
+        'passphrase': passphrase,
+        'timestamp': timestamp,
+        'sign': base64.b64encode(digest).decode(),
+    }
+
+
+class OkxFeed:
+    """
+    订阅 OKX K线、持仓和订单推送，K线收盘时立即回调，持仓和订单状态保存在本地。
+    多个交易对共用一条公共连接和一条私有连接。
+
+    参数:
+    - symbols: ccxt 交易对列表，如 ['BTC/USDT:USDT', 'ETH/USDT:USDT']
+    - timeframe: K线周期，如 '1m'
+    - on_bar_close: 协程函数，K线收盘时以 (symbol, [ts, open, high, low, close, volume]) 调用
+    - api_key / api_secret / passphrase: 私有频道登录信息，为None时只订阅K线
+    - public_url / private_url: WebSocket 地址，测试时指向本地替身服务
+    - proxy: HTTP 代理地址
+    """
+
+    def __init__(self, symbols, timeframe, on_bar_close, api_key=None, api_secret=None, passphrase=None,
+                 public_url=OKX_PUBLIC_WS, private_url=OKX_PRIVATE_WS, proxy=None):
+        self.symbols = {to_inst_id(symbol): symbol for symbol in symbols}
+        self.timeframe = timeframe
+        self.on_bar_close = on_bar_close
+        self.credentials = (api_key, api_secret, passphrase) if api_key else None
+        self.public_url = public_url
+        self.private_url = private_url
+        self.proxy = proxy
+
+        self.positions = {}  # (instId, posSide) -> 持仓张数（有符号）
+        self.orders = {}  # ordId -> 最新订单推送
+        self.last_closed_ts = {}  # instId -> 最近收盘K线时间戳
+        self.private_ready = asyncio.Event()
+        self._order_waiters = {}
+        self._callbacks = set()
+
+    def has_position(self, symbol):
+        inst_id = to_inst_id(symbol)
+        return any(contracts != 0 for (pos_inst, _), contracts in self.positions.items() if pos_inst == inst_id)
+
+    # 当前仍在挂单中的订单ID
+    def open_order_ids(self, symbol):
+        inst_id = to_inst_id(symbol)
+        return [order_id for order_id, order in self.orders.items()
+                if order.get('instId') == inst_id and order.get('state') in ('live', 'partially_filled')]
+
+    # 等待订单进入指定状态，返回该订单的推送数据
+    async def wait_order(self, order_id, states=('filled',), timeout=5):
+        order = self.orders.get(order_id)
+        if order and order.get('state') in states:
+            return order
+        future = asyncio.get_running_loop().create_future()
+        self._order_waiters[order_id] = (states, future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._order_waiters.pop(order_id, None)
+
+    async def run(self):
+        tasks = [self._run_channel(self.public_url, self._subscribe_public, self._handle_public)]
+        if self.credentials:
+            tasks.append(self._run_channel(self.private_url, self._subscribe_private, self._handle_private))
+        await asyncio.gather(*tasks)
+
+    # 连接并保持订阅，断线后按指数退避重连
+    async def _run_channel(self, url, subscribe, handle):
+        delay = 1
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(url, proxy=self.proxy, heartbeat=None) as ws:
+                        await subscribe(ws)
+                        delay = 1
+                        pinger = asyncio.create_task(self._ping(ws))
+                        try:
+                            async for msg in ws:
+                                if msg.type != aiohttp.WSMsgType.TEXT or msg.data == 'pong':
+                                    continue
+                                await handle(ws, json.loads(msg.data))
+                        finally:
+                            pinger.cancel()
+                print(f"WebSocket 连接已关闭: {url}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WebSocket 连接出错：{e}")
+            if url == self.private_url:
+                self.private_ready.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def _ping(self, ws):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await ws.send_str('ping')
+
+    async def _subscribe_public(self, ws):
+        await ws.send_json({'op': 'subscribe',
+                            'args': [{'channel': f'candle{self.timeframe}', 'instId': inst_id} for inst_id in self.symbols]})
+
+    async def _subscribe_private(self, ws):
+        await ws.send_json({'op': 'login', 'args': [login_args(*self.credentials)]})
+
+    async def _handle_public(self, ws, message):
+        if message.get('event') == 'error':
+            print(f"K线订阅失败: {message.get('msg')}")
+            return
+        inst_id = message.get('arg', {}).get('instId')
+        for candle in message.get('data', []):
+            # [ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm]，confirm 为 '1' 表示已收盘
+            ts = int(candle[0])
+            if candle[8] != '1' or ts <= self.last_closed_ts.get(inst_id, -1):
+                continue
+            self.last_closed_ts[inst_id] = ts
+            # 回调放到独立任务中，各交易对并发处理，执行期间仍能继续接收订单和持仓推送
+            bar = [ts] + [float(value) for value in candle[1:6]]
+            task = asyncio.create_task(self.on_bar_close(self.symbols[inst_id], bar))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+
+    async def _handle_private(self, ws, message):
+        event = message.get('event')
+        if event == 'login':
+            await ws.send_json({'op': 'subscribe', 'args': [
+                {'channel': 'positions', 'instType': 'SWAP'},
+                {'channel': 'orders', 'instType': 'SWAP'},
+            ]})
+            return
+        if event == 'error':
+            print(f"私有频道出错: {message.get('msg')}")
+            return
+
+        channel = message.get('arg', {}).get('channel')
+        if channel == 'positions' and 'data' in message:
+            # 订阅后首条持仓推送为全量快照，之后本地持仓才可信
+            self.private_ready.set()
+        for item in message.get('data', []):
+            if channel == 'positions':
+                contracts = float(item.get('pos') or 0)
+                self.positions[(item.get('instId'), item.get('posSide', 'net'))] = contracts
+            elif channel == 'orders':
+                order_id = item['ordId']
+                self.orders.pop(order_id, None)
+                self.orders[order_id] = item
+                if len(self.orders) > MAX_ORDERS:
+                    self.orders.pop(next(iter(self.orders)))
+                waiter = self._order_waiters.get(order_id)
+                if waiter and item.get('state') in waiter[0] and not waiter[1].done():
+                    waiter[1].set_result(item)
@@ -0,0 +1,62 @@
+import numpy as np
+import talib
+
+
+class IncrementalEmaAtr:
+    """
+    增量维护 EMA 和 ATR（Wilder 平滑），每根新收盘K线 O(1) 更新。
+
+    用一段历史K线通过 talib 初始化一次，之后的更新公式与 talib 逐位一致，
+    因此结果等同于在完整历史上重新计算 talib.EMA / talib.ATR。
+    """
+
+    def __init__(self, ema_period, atr_period):
+        self.ema_period = ema_period
+        self.atr_period = atr_period
+        self.k = 2 / (ema_period + 1)
+        self.ema = None
+        self.atr = None
+        self.previous_ema = None  # 上一根收盘K线的指标，用于判断轨道穿越
+        self.previous_atr = None
+        self.last_close = None
+        self.previous_close = None
+        self.last_timestamp = None
+
+    @property
+    def is_ready(self):
+        return self.ema is not None
+
+    # 用已收盘的历史K线初始化
+    def seed(self, timestamps, high, low, close):
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        ema = talib.EMA(close, timeperiod=self.ema_period)
+        atr = talib.ATR(high, low, close, timeperiod=self.atr_period)
+        if np.isnan(ema[-1]) or np.isnan(atr[-1]):
+            raise ValueError(f"历史K线不足（{len(close)} 根），无法初始化 EMA({self.ema_period})/ATR({self.atr_period})")
+        self.ema = float(ema[-1])
+        self.atr = float(atr[-1])
+        self.previous_ema = float(ema[-2]) if len(close) > 1 else None
+        self.previous_atr = float(atr[-2]) if len(close) > 1 else None
+        self.last_close = float(close[-1])
+        self.previous_close = float(close[-2]) if len(close) > 1 else None
+        self.last_timestamp = timestamps[-1]
+
+    def _next_values(self, high, low, close):
+        true_range = max(high - low, abs(high - self.last_close), abs(low - self.last_close))
+        ema = ((close - self.ema) * self.k) + self.ema
+        atr = (self.atr * (self.atr_period - 1) + true_range) / self.atr_period
+        return ema, atr
+
+    # 新K线收盘后更新状态
+    def update(self, timestamp, high, low, close):
+        self.previous_ema, self.previous_atr = self.ema, self.atr
+        self.ema, self.atr = self._next_values(high, low, close)
+        self.previous_close = self.last_close
+        self.last_close = close
+        self.last_timestamp = timestamp
+
+    # 假设当前未收盘K线以当前价格收盘时的指标值，不修改状态
+    def preview(self, high, low, close):
+        return self._next_values(high, low, close)
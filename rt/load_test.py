@@ -0,0 +1,129 @@
+import io
+import time
+import asyncio
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+
+from orders import open_position
+from sim_exchange import OKX_RATE_LIMITS, SimExchange
+
+LATENCY_STAGES = ('submit', 'fill', 'protect', 'total')
+
+
+# 随机游走生成 1m K线，每个交易对使用不同的种子
+def synthetic_bars(n_bars=500, start_price=60_000.0, volatility=0.001, seed=0, start_ms=1_735_689_600_000):
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    open_ = np.r_[start_price, close[:-1]]
+    wick = np.abs(rng.normal(0, volatility, n_bars)) * close
+    high = np.maximum(open_, close) + wick
+    low = np.minimum(open_, close) - wick
+    timestamps = start_ms + np.arange(n_bars) * 60_000
+    return [[int(ts), o, h, l, c, 1.0] for ts, o, h, l, c in zip(timestamps, open_, high, low, close)]
+
+
+async def burst_test(exchange, bursts=5, atr_pct=0.002, rr=1, risk_usdt=1, burst_interval=0.0, verbose=False):
+    """
+    突发下单压测：每轮推进一根K线，所有交易对在同一时刻收到信号并发调用 orders.open_position，
+    与多个交易对在同一根K线收盘时同时触发的情况一致。
+
+    参数:
+    - exchange: SimExchange 实例，延迟、限频和部分成交在其中配置
+    - bursts: 突发轮数
+    - atr_pct: ATR 占收盘价的比例，作为止损距离
+    - rr: 风险回报比
+    - risk_usdt: 单笔止损金额
+    - burst_interval: 两轮之间的间隔（秒），0 为连续发出，用于检验限频
+    - verbose: 是否输出下单过程的打印信息
+
+    返回:
+    - records: 每笔开仓一行，包含是否成功、是否受保护、是否部分成交和各阶段耗时（秒）
+    - bursts_df: 每轮的交易对数、耗时和吞吐量
+    """
+    records, rounds = [], []
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+    async def enter(symbol, signal, atr_value, signal_time):
+        entry = await open_position(exchange, symbol, signal, atr_value, rr, risk_usdt,
+                                    exchange.open_order_ids(symbol), signal_time=signal_time)
+        return symbol, signal, entry
+
+    with output:
+        for burst in range(bursts):
+            closed = exchange.step()
+            signal_time = time.perf_counter()
+            results = await asyncio.gather(*(
+                enter(symbol, 'long_entry' if (k + burst) % 2 == 0 else 'short_entry', bar[4] * atr_pct, signal_time)
+                for k, (symbol, bar) in enumerate(closed.items())))
+            elapsed = time.perf_counter() - signal_time
+
+            protected = 0
+            for symbol, signal, entry in results:
+                record = {'burst': burst, 'symbol': symbol, 'signal': signal, 'ok': entry is not None,
+                          'protected': False, 'partial': False}
+                if entry is not None:
+                    record['protected'] = bool(entry['sl_order_id'] and entry['trailing_order_id'])
+                    record['partial'] = entry['size'] < exchange.orders[entry['order_id']]['amount']
+                    record.update(entry['latency'])
+                protected += record['protected']
+                records.append(record)
+            rounds.append({'burst': burst, 'orders': len(results), 'protected': protected, 'elapsed': elapsed,
+                           'throughput': protected / elapsed if elapsed else np.inf})
+            if burst_interval:
+                await asyncio.sleep(burst_interval)
+
+    records = pd.DataFrame(records).reindex(
+        columns=['burst', 'symbol', 'signal', 'ok', 'protected', 'partial', *LATENCY_STAGES])
+    return records, pd.DataFrame(rounds)
+
+
+# 打印成功率、吞吐量、各阶段延迟分位数和请求统计
+def report(exchange, records, rounds):
+    print(f"{len(rounds)} 轮突发，每轮 {len(exchange.symbols)} 个交易对同时开仓")
+    print(f"开仓成功 {int(records['ok'].sum())}/{len(records)}，受保护 {int(records['protected'].sum())}，"
+          f"成功但未受保护 {int((records['ok'] & ~records['protected']).sum())}，部分成交 {int(records['partial'].sum())}")
+    print(f"吞吐量（受保护笔数/秒）: 平均 {rounds['throughput'].mean():.1f}，最低 {rounds['throughput'].min():.1f}；"
+          f"每轮耗时最长 {rounds['elapsed'].max() * 1000:.0f} ms")
+    ok = records[records['ok']]
+    if len(ok):
+        print("阶段延迟（ms）:      p50      p90      p99      max")
+        for stage in LATENCY_STAGES:
+            p50, p90, p99, p100 = np.percentile(ok[stage] * 1000, [50, 90, 99, 100])
+            print(f"  {stage:<10} {p50:>9.0f} {p90:>8.0f} {p99:>8.0f} {p100:>8.0f}")
+    print("请求统计:")
+    for (method, outcome), count in sorted(exchange.stats.items()):
+        print(f"  {method:<24} {outcome:<20} {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在本地模拟交易所上压测下单路径')
+    parser.add_argument('--symbols', type=int, default=20, help='同时触发信号的交易对数量')
+    parser.add_argument('--bursts', type=int, default=5)
+    parser.add_argument('--burst-interval', type=float, default=0.0, help='两轮之间的间隔（秒）')
+    parser.add_argument('--latency', type=float, default=0.05, help='请求往返延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--spike-probability', type=float, default=0.01)
+    parser.add_argument('--spike-latency', type=float, default=1.0)
+    parser.add_argument('--fill-delay', type=float, default=0.1, help='市价单成交确认延迟（秒）')
+    parser.add_argument('--partial-fill-probability', type=float, default=0.1)
+    parser.add_argument('--no-rate-limit', action='store_true', help='不模拟 OKX 限频')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    bars = {f'SIM{k}/USDT:USDT': synthetic_bars(n_bars=args.bursts + 10, seed=args.seed + k)
+            for k in range(args.symbols)}
+    exchange = SimExchange(bars, start=1, latency=args.latency, jitter=args.jitter,
+                           spike_probability=args.spike_probability, spike_latency=args.spike_latency,
+                           rate_limits=None if args.no_rate_limit else OKX_RATE_LIMITS,
+                           fill_delay=args.fill_delay, partial_fill_probability=args.partial_fill_probability,
+                           seed=args.seed)
+    records, rounds = asyncio.run(burst_test(exchange, bursts=args.bursts, burst_interval=args.burst_interval,
+                                             verbose=args.verbose))
+    report(exchange, records, rounds)
+
+
+if __name__ == '__main__':
+    main()
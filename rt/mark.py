@@ -1,53 +1,128 @@
-import talib
+import os
+import sys
 
-from utils import get_ohlcv_data
+from incremental import IncrementalEmaAtr
 
-def ema_atr_filter(exchange, symbol, ema_period, atr_period, multiplier, atr_threshold_pct):
+# 仓库根目录，bt 和 rt 共用的模块放在 common/ 下
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.signal_core import breakouts, is_counter_hour, is_low_volatility
+
+# 初始化时拉取的历史K线根数，EMA 充分收敛
+SEED_LIMIT = 300
+
+# 每个 (交易对, 周期, EMA周期, ATR周期) 一份指标状态，跨调用保留
+_indicator_states = {}
+
+# 添加一个时间段决定顺势逆势交易的函数
+# 逆势时段 [counter_start, counter_end]（UTC，含两端）与回测 EmaAtrStrategy 的同名参数一致，
+# 起点大于终点时跨零点，任一端为 -1 时全天顺势
+def time_checker(hour, counter_start=4, counter_end=11):
+    return 'counter_trend' if is_counter_hour(hour, counter_start, counter_end) else 'trend_following'
+
+# 根据策略类型把突破标记转为开仓信号
+def mark_to_signal(mark, strategy_type):
+    if strategy_type == 'counter_trend':
+        if mark == 'upper_breakout':
+            return 'short_entry'  # 逆势：上突破做空
+        elif mark == 'lower_breakout':
+            return 'long_entry'   # 逆势：下突破做多
+    elif strategy_type == 'trend_following':
+        if mark == 'upper_breakout':
+            return 'long_entry'  # 顺势：上突破做多
+        elif mark == 'lower_breakout':
+            return 'short_entry'  # 顺势：下突破做空
+    return None
+
+# 用历史K线（只取已收盘的）初始化指标状态
+def seed_indicator_state(symbol, timeframe, ema_period, atr_period, bars, now, timeframe_ms):
+    closed = [bar for bar in bars if bar[0] + timeframe_ms <= now]
+    state = IncrementalEmaAtr(ema_period, atr_period)
+    state.seed([bar[0] for bar in closed], [bar[2] for bar in closed],
+               [bar[3] for bar in closed], [bar[4] for bar in closed])
+    _indicator_states[(symbol, timeframe, ema_period, atr_period)] = state
+    return state
+
+# 把推送的收盘K线写入指标状态；尚未初始化或K线断档时返回None，需要先重新初始化
+def apply_closed_bar(symbol, timeframe, ema_period, atr_period, bar, timeframe_ms):
+    state = _indicator_states.get((symbol, timeframe, ema_period, atr_period))
+    if state is None or bar[0] - state.last_timestamp > timeframe_ms:
+        return None
+    if bar[0] > state.last_timestamp:
+        state.update(bar[0], bar[2], bar[3], bar[4])
+    return state
+
+# 同步指标状态到最新收盘K线，返回状态和当前未收盘K线
+def sync_indicator_state(exchange, symbol, ema_period, atr_period, timeframe='1m', seed_limit=SEED_LIMIT):
+    key = (symbol, timeframe, ema_period, atr_period)
+    state = _indicator_states.get(key)
+    timeframe_ms = exchange.parse_timeframe(timeframe) * 1000
+    now = exchange.milliseconds()
+
+    if state is not None:
+        # 只取最近几根K线，收盘的逐根增量更新
+        bars = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=5)
+        closed = [bar for bar in bars if bar[0] > state.last_timestamp and bar[0] + timeframe_ms <= now]
+        if closed and closed[0][0] - state.last_timestamp > timeframe_ms:
+            print("K线不连续，重新初始化指标状态。")
+            state = None
+        else:
+            for bar in closed:
+                state.update(bar[0], bar[2], bar[3], bar[4])
+
+    if state is None:
+        # 首次运行（或断档后）用较长历史初始化一次，EMA 充分收敛
+        bars = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=seed_limit)
+        state = seed_indicator_state(symbol, timeframe, ema_period, atr_period, bars, now, timeframe_ms)
+
+    forming = bars[-1] if bars and bars[-1][0] + timeframe_ms > now else None
+    return state, forming
+
+# 根据最新价格和指标判断是否突破上下轨，判断条件与回测共用 common/signal_core.py：
+# 前一根收盘价与前一根的轨道比较，当前收盘价与当前轨道比较
+def breakout_mark(previous_close, current_close, previous_ema, previous_atr, ema_value, atr_value,
+                  multiplier, atr_threshold_pct, has_position):
+    if has_position:
+        print("已有持仓，跳过开仓信号。")
+        return None, atr_value
+    
+    # 波动率过滤器
+    if is_low_volatility(atr_value, current_close, atr_threshold_pct):
+        print(f"波动率过低 ({atr_value / current_close:.4f} < {atr_threshold_pct})，跳过交易。")
+        return None, atr_value
+    
+    upper_breakout, lower_breakout = breakouts(previous_close, current_close, previous_ema, previous_atr,
+                                               ema_value, atr_value, multiplier)
+    
+    if upper_breakout:
+        return 'upper_breakout', atr_value
+    
+    elif lower_breakout:
+        return 'lower_breakout', atr_value
+    
+    return None, atr_value  # 无信号时也返回 atr_value
+
+def ema_atr_filter(exchange, symbol, ema_period, atr_period, multiplier, atr_threshold_pct, timeframe='1m'):
     try:
-        # 获取K线数据
-        df = get_ohlcv_data(exchange, symbol)
-        
-        # 计算技术指标
-        df['ema'] = talib.EMA(df['close'], timeperiod=ema_period)
-        df['atr'] = talib.ATR(df['high'], df['low'], df['close'], timeperiod=atr_period)
-        df['upper_band'] = df['ema'] + (multiplier * df['atr'])
-        df['lower_band'] = df['ema'] - (multiplier * df['atr'])
-        
-        atr_value = df['atr'].iloc[-1] # 获取ATR值
+        # 同步K线并增量更新技术指标
+        state, forming = sync_indicator_state(exchange, symbol, ema_period, atr_period, timeframe)
+
+        if forming is not None:
+            # 以未收盘K线的当前价格计算最新指标（不写入状态）
+            ema_value, atr_value = state.preview(forming[2], forming[3], forming[4])
+            current_close = forming[4]
+            previous_close, previous_ema, previous_atr = state.last_close, state.ema, state.atr
+        else:
+            ema_value, atr_value = state.ema, state.atr
+            current_close = state.last_close
+            previous_close, previous_ema, previous_atr = state.previous_close, state.previous_ema, state.previous_atr
 
-        # 获取最新价格数据
-        current_close = df['close'].iloc[-1]
-        previous_close = df['close'].iloc[-2]
-        upper_band = df['upper_band'].iloc[-1]
-        lower_band = df['lower_band'].iloc[-1]
-        
         # 检查是否已有持仓
         positions = exchange.fetch_positions()
         has_position = any(pos['symbol'] == symbol and pos['contracts'] != 0 for pos in positions)
-        if has_position:
-            print("已有持仓，跳过开仓信号。")
-            return None, atr_value
-        
-        # 波动率过滤器
-        atr_pct = atr_value / current_close
-        if atr_pct < atr_threshold_pct:
-            print(f"波动率过低 ({atr_pct:.4f} < {atr_threshold_pct})，跳过交易。")
-            return None, atr_value
-        
-        # 上轨突破条件
-        upper_breakout = previous_close <= upper_band and current_close > upper_band
-        
-        # 下轨突破条件
-        lower_breakout = previous_close >= lower_band and current_close < lower_band
-        
-        if upper_breakout:
-            return 'upper_breakout', atr_value
-        
-        elif lower_breakout:
-            return 'lower_breakout', atr_value
-        
-        return None, atr_value  # 无信号时也返回 atr_value
+
+        return breakout_mark(previous_close, current_close, previous_ema, previous_atr, ema_value, atr_value,
+                             multiplier, atr_threshold_pct, has_position)
         
     except Exception as e:
         print(f"策略信号生成失败: {e}")
-        return None, None
\ No newline at end of file
+        return None, None
@@ -0,0 +1,166 @@
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+
+from aiohttp import web, WSMsgType
+
+
+# 生成随机游走K线，用于本地测试
+def random_bars(count=100, start_price=60000.0, timeframe_ms=60_000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = start_price + np.cumsum(rng.normal(0, start_price * 0.0005, count))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, start_price * 0.0002, count))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, start_price * 0.0002, count))
+    start_ts = (int(time.time() * 1000) // timeframe_ms - count) * timeframe_ms
+    return [[start_ts + i * timeframe_ms, open_[i], high[i], low[i], close[i], 1.0] for i in range(count)]
+
+
+class MockOkxServer:
+    """
+    本地 OKX WebSocket 替身服务：按固定间隔回放K线，并可主动推送持仓和订单。
+
+    参数:
+    - bars: [[ts, open, high, low, close, volume], ...]，按顺序回放；
+      也可以是 {instId: bars} 字典，各交易对的K线条数和时间戳需一致
+    - bar_interval: 每根K线回放用时（秒），期间先推送未收盘更新，再推送收盘
+    - ticks_per_bar: 每根K线收盘前推送的未收盘更新次数
+    - host / port: 监听地址，port 为0时自动分配
+    """
+
+    def __init__(self, bars, bar_interval=1.0, ticks_per_bar=2, host='127.0.0.1', port=0):
+        self.bars = bars
+        self.bar_interval = bar_interval
+        self.ticks_per_bar = ticks_per_bar
+        self.host = host
+        self.port = port
+        self.close_sent_at = {}  # 收盘推送时间（time.perf_counter），用于统计延迟
+        self.logins = 0
+        self.positions = []  # 订阅持仓频道时推送的快照
+        self._candle_clients = set()
+        self._private_clients = set()
+        self._runner = None
+        self._replay_task = None
+
+    @property
+    def public_url(self):
+        return f'ws://{self.host}:{self.port}/ws/v5/business'
+
+    @property
+    def private_url(self):
+        return f'ws://{self.host}:{self.port}/ws/v5/private'
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/ws/v5/business', self._public_handler)
+        app.router.add_get('/ws/v5/private', self._private_handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._replay_task = asyncio.create_task(self._replay())
+
+    async def stop(self):
+        if self._replay_task:
+            self._replay_task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    # 向已订阅的私有频道客户端推送数据，channel 为 'orders' 或 'positions'
+    async def push_private(self, channel, items):
+        message = json.dumps({'arg': {'channel': channel, 'instType': 'SWAP'}, 'data': items})
+        for ws in list(self._private_clients):
+            await ws.send_str(message)
+
+    def _bars_for(self, inst_id):
+        return self.bars[inst_id] if isinstance(self.bars, dict) else self.bars
+
+    async def _broadcast_candle(self, index, confirm):
+        for ws, arg in list(self._candle_clients):
+            arg = json.loads(arg)
+            bar = self._bars_for(arg['instId'])[index]
+            message = {
+                'arg': arg,
+                'data': [[str(bar[0]), str(bar[1]), str(bar[2]), str(bar[3]), str(bar[4]), str(bar[5]),
+                          '0', '0', '1' if confirm else '0']],
+            }
+            await ws.send_str(json.dumps(message))
+
+    async def _replay(self):
+        # 等待第一个订阅者，避免K线在客户端连上之前就播完
+        while not self._candle_clients:
+            await asyncio.sleep(0.01)
+        timestamps = [bar[0] for bar in next(iter(self.bars.values()))] if isinstance(self.bars, dict) \
+            else [bar[0] for bar in self.bars]
+        for index, ts in enumerate(timestamps):
+            for _ in range(self.ticks_per_bar):
+                await asyncio.sleep(self.bar_interval / (self.ticks_per_bar + 1))
+                await self._broadcast_candle(index, confirm=False)
+            await asyncio.sleep(self.bar_interval / (self.ticks_per_bar + 1))
+            self.close_sent_at[ts] = time.perf_counter()
+            await self._broadcast_candle(index, confirm=True)
+
+    async def _public_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                if msg.data == 'ping':
+                    await ws.send_str('pong')
+                    continue
+                message = json.loads(msg.data)
+                if message.get('op') == 'subscribe':
+                    for arg in message['args']:
+                        self._candle_clients.add((ws, json.dumps(arg)))
+                        await ws.send_json({'event': 'subscribe', 'arg': arg})
+        finally:
+            self._candle_clients = {(client, arg) for client, arg in self._candle_clients if client is not ws}
+        return ws
+
+    async def _private_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                if msg.data == 'ping':
+                    await ws.send_str('pong')
+                    continue
+                message = json.loads(msg.data)
+                if message.get('op') == 'login':
+                    self.logins += 1
+                    await ws.send_json({'event': 'login', 'code': '0', 'msg': ''})
+                elif message.get('op') == 'subscribe':
+                    self._private_clients.add(ws)
+                    for arg in message['args']:
+                        await ws.send_json({'event': 'subscribe', 'arg': arg})
+                        if arg.get('channel') == 'positions':
+                            await ws.send_json({'arg': arg, 'data': self.positions})
+        finally:
+            self._private_clients.discard(ws)
+        return ws
+
+
+async def _serve(bars, bar_interval, port):
+    server = MockOkxServer(bars, bar_interval=bar_interval, port=port)
+    await server.start()
+    print(f"替身服务已启动: {server.public_url}  {server.private_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地 OKX WebSocket 替身服务')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--bars', type=int, default=100)
+    parser.add_argument('--bar-interval', type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(_serve(random_bars(args.bars), args.bar_interval, args.port))
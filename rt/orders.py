@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import asyncio
+
+# 仓库根目录，bt 和 rt 共用的模块放在 common/ 下
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.signal_core import protective_prices
+
+# 开仓方向对应的下单参数
+SIDES = {
+    'long_entry': {'side': 'buy', 'close_side': 'sell', 'pos_side': 'long', 'direction': 1},
+    'short_entry': {'side': 'sell', 'close_side': 'buy', 'pos_side': 'short', 'direction': -1},
+}
+
+
+# 按风险金额计算张数：触发止损时亏损 risk_usdt
+def position_size(exchange, symbol, risk_usdt, sl_distance):
+    contract_size = exchange.market(symbol).get('contractSize') or 1
+    return risk_usdt / (sl_distance * contract_size)
+
+
+# 取消当前所有委托；open_order_ids 为None时先查询
+async def cancel_open_orders(exchange, symbol, open_order_ids=None):
+    try:
+        if open_order_ids is None:
+            open_order_ids = [order['id'] for order in await exchange.fetch_open_orders(symbol)]
+        if open_order_ids:
+            await exchange.cancel_orders(list(open_order_ids), symbol)
+            print(f"[{symbol}] 已取消当前所有委托。")
+        else:
+            print(f"[{symbol}] 无开放委托。")
+    except Exception as e:
+        print(f"[{symbol}] 取消委托失败: {e}")
+
+
+# 等待市价单成交：优先使用订单推送，未收到推送时短间隔轮询 REST
+async def wait_filled(exchange, symbol, order_id, feed=None, timeout=5, poll_interval=0.2):
+    if feed is not None and feed.private_ready.is_set():
+        try:
+            order = await feed.wait_order(order_id, ('filled', 'canceled'), timeout)
+            filled = float(order.get('accFillSz') or 0)
+            average = float(order.get('avgPx') or 0)
+            return (average, filled) if filled > 0 and average else (None, 0)
+        except asyncio.TimeoutError:
+            print(f"[{symbol}] 未收到订单 {order_id} 的成交推送，改为查询。")
+
+    deadline = time.perf_counter() + timeout
+    while True:
+        order = await exchange.fetch_order(order_id, symbol)
+        if order and order['status'] in ('closed', 'canceled'):
+            filled = float(order.get('filled') or 0)
+            return (order['average'], filled) if filled > 0 and order['average'] else (None, 0)
+        if time.perf_counter() >= deadline:
+            return None, 0
+        await asyncio.sleep(poll_interval)
+
+
+async def open_position(exchange, symbol, signal, atr_value, rr, risk_usdt, open_order_ids=None,
+                        feed=None, signal_time=None):
+    """
+    市价开仓，成交后同时提交止损单和移动止盈止损单。
+
+    参数:
+    - exchange: ccxt.async_support 交易所实例
+    - symbol: 交易对，如 'BTC/USDT:USDT'
+    - signal: 'long_entry' 或 'short_entry'
+    - atr_value: 当前 ATR，作为止损距离
+    - rr: 风险回报比，止盈距离 = 止损距离 * rr
+    - risk_usdt: 单笔止损金额
+    - open_order_ids: 本地维护的挂单ID，为None时通过 REST 查询
+    - feed: OkxFeed 实例，用订单推送确认成交；为None时轮询 fetch_order
+    - signal_time: 信号产生时的 time.perf_counter()，用于统计延迟，默认为调用时刻
+
+    返回:
+    - entry: 包含订单ID、入场价、止损价、止盈价和各阶段耗时的字典；失败时返回None
+    """
+    params = SIDES[signal]
+    sl_distance = atr_value
+    tp_distance = sl_distance * rr
+    signal_time = signal_time or time.perf_counter()
+
+    try:
+        size = position_size(exchange, symbol, risk_usdt, sl_distance)
+        print(f"[{symbol}] 计算得张数: {size:.6f}")
+
+        # 撤销旧委托与市价开仓互不依赖，同时发出
+        _, order = await asyncio.gather(
+            cancel_open_orders(exchange, symbol, open_order_ids),
+            exchange.create_order(symbol, 'market', params['side'], size, params={'posSide': params['pos_side']}))
+        order_id = order['id']
+        submitted_time = time.perf_counter()
+        print(f"\033[92m[{symbol}] 市价{'买入' if params['side'] == 'buy' else '卖出'}订单已提交，订单ID: {order_id}\033[0m")
+
+        entry_price, actual_size = await wait_filled(exchange, symbol, order_id, feed)
+        filled_time = time.perf_counter()
+        if not entry_price:
+            print(f"[{symbol}] 错误：无法获取订单成交价，取消设置止盈止损。")
+            return None
+        if actual_size <= 0:
+            print(f"[{symbol}] 错误：成交张数为0，取消止损止盈设置。")
+            return None
+        print(f"\033[92m[{symbol}] 订单已成交，实际入场价: {entry_price}\033[0m")
+
+        # 止盈止损：两张保护单同时提交，价格计算与回测共用
+        sl_price, tp_price = protective_prices(entry_price, params['direction'], sl_distance, rr)
+        print(f"[{symbol}] 止损价格: {sl_price}, 止盈价格: {tp_price}")
+        sl_order, trailing_order = await asyncio.gather(
+            exchange.create_stop_loss_order(
+                symbol, 'market', params['close_side'], actual_size, stopLossPrice=sl_price,
+                params={'reduceOnly': True, 'posSide': params['pos_side']}),
+            exchange.create_order(
+                symbol, 'trailing_stop', params['close_side'], actual_size,
+                params={
+                    'callbackSpread': str(tp_distance),  # 回调幅度的价距
+                    'activePx': str(tp_price),  # 激活价格为 tp_price
+                    'reduceOnly': True,
+                    'posSide': params['pos_side'],
+                }),
+            return_exceptions=True)
+        protected_time = time.perf_counter()
+
+        for name, leg in (('止损', sl_order), ('移动止盈止损', trailing_order)):
+            if isinstance(leg, Exception):
+                print(f"\033[91m[{symbol}] {name}订单设置失败: {leg}\033[0m")
+            else:
+                print(f"[{symbol}] {name}订单已设置，订单ID: {leg['id']}")
+
+        latency = {
+            'submit': submitted_time - signal_time,
+            'fill': filled_time - submitted_time,
+            'protect': protected_time - filled_time,
+            'total': protected_time - signal_time,
+        }
+        print(f"[{symbol}] 信号到持仓受保护耗时 {latency['total'] * 1000:.0f} ms"
+              f"（下单 {latency['submit'] * 1000:.0f} ms，成交确认 {latency['fill'] * 1000:.0f} ms，"
+              f"保护单 {latency['protect'] * 1000:.0f} ms）")
+
+        return {
+            'order_id': order_id,
+            'entry_price': entry_price,
+            'size': actual_size,
+            'sl_price': sl_price,
+            'tp_price': tp_price,
+            'sl_order_id': None if isinstance(sl_order, Exception) else sl_order['id'],
+            'trailing_order_id': None if isinstance(trailing_order, Exception) else trailing_order['id'],
+            'latency': latency,
+        }
+    except Exception as e:
+        print(f"[{symbol}] 下单失败: {e}")
+        return None
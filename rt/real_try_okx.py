@@ -3,11 +3,14 @@ import ccxt
 import talib
 import pandas as pd
 import time
+import asyncio
 from datetime import datetime, timezone
 
 from dotenv import load_dotenv
 from utils import send_email_notification
-from mark import ema_atr_filter
+from mark import ema_atr_filter, time_checker, mark_to_signal
+from runner import run
+from common.signal_core import protective_prices  # utils 已将仓库根目录加入 sys.path
 
 load_dotenv()
 
@@ -31,6 +34,9 @@ RR = 1
 FIXED_LEVERAGE = 10
 RISK_USDT = 1
 
+PROXY = 'http://127.0.0.1:7897'
+USE_WEBSOCKET = True  # True: K线收盘推送触发策略；False: 每60秒 REST 轮询
+
 exchange = ccxt.okx({
     'apiKey': API_KEY,
     'secret': API_SECRET,
@@ -42,20 +48,11 @@ exchange = ccxt.okx({
         'marginMode': 'isolated',
     },
     'proxies': {
-        'http': 'http://127.0.0.1:7897',  
-        'https': 'http://127.0.0.1:7897',  
+        'http': PROXY,  
+        'https': PROXY,  
     }
 })
 
-# 添加一个时间段决定顺势逆势交易的函数
-def time_checker(hour):
-    if 4 <= hour <= 11:
-        return 'counter_trend'
-    elif 12 <= hour <= 23 or 0 <= hour <= 3:
-        return 'trend_following'
-    else:
-        return 'trend_following'
-
 def strategy():
     try:
         now = datetime.now(timezone.utc)
@@ -72,16 +69,7 @@ def strategy():
             print(f"当前UTC小时: {hour}, 策略类型: {strategy_type}")
             
             # 根据策略类型调整信号
-            if strategy_type == 'counter_trend':
-                if mark == 'upper_breakout':
-                    signal = 'short_entry'  # 逆势：上突破做空
-                elif mark == 'lower_breakout':
-                    signal = 'long_entry'   # 逆势：下突破做多
-            elif strategy_type == 'trend_following':
-                if mark == 'upper_breakout':
-                    signal = 'long_entry'  # 顺势：上突破做多
-                elif mark == 'lower_breakout':
-                    signal = 'short_entry'  # 顺势：下突破做空
+            signal = mark_to_signal(mark, strategy_type)
         
         if not signal:
             print("无交易信号。")
@@ -135,8 +123,7 @@ def strategy():
                 return
 
             # 止盈止损
-            sl_price = entry_price - sl_distance
-            tp_price = entry_price + tp_distance
+            sl_price, tp_price = protective_prices(entry_price, 1, sl_distance, RR)
             print(f"止损价格: {sl_price}, 止盈价格: {tp_price}")
             # 设置止损订单
             sl_order = exchange.create_stop_loss_order(
@@ -189,8 +176,7 @@ def strategy():
                 return
             
             # 止盈止损
-            sl_price = entry_price + sl_distance
-            tp_price = entry_price - tp_distance
+            sl_price, tp_price = protective_prices(entry_price, -1, sl_distance, RR)
             print(f"止损价格: {sl_price}, 止盈价格: {tp_price}")
             # 设置止损订单
             sl_order = exchange.create_stop_loss_order(
@@ -226,7 +212,7 @@ def strategy():
     except Exception as e:
         print(f"策略执行失败: {e}")
 
-def main():
+def setup_account():
     try:
         balance = exchange.fetch_balance()
         print("API连接成功，余额:", balance['total']['USDT'])
@@ -239,7 +225,29 @@ def main():
 
     except Exception as e:
         print(f"API连接失败: {e}")
-    
+
+# 订阅K线和持仓/订单推送，K线收盘即运行策略，下单走异步流水线
+async def main_ws():
+    configs = {SYMBOL: {
+        'ema_period': EMA_PERIOD,
+        'atr_period': ATR_PERIOD,
+        'multiplier': MULTIPLIER,
+        'atr_threshold_pct': ATR_THRESHOLD_PCT,
+        'rr': RR,
+        'leverage': FIXED_LEVERAGE,
+        'risk_usdt': RISK_USDT,
+    }}
+    await run(configs, timeframe=TIMEFRAME, proxy=PROXY)
+
+def main():
+    if USE_WEBSOCKET:
+        try:
+            asyncio.run(main_ws())
+        except KeyboardInterrupt:
+            print("用户中断，停止运行。")
+        return
+
+    setup_account()
     while True:
         try: 
             strategy()  # 调用策略
@@ -0,0 +1,204 @@
+import io
+import os
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from mark import SEED_LIMIT
+from runner import DEFAULT_PARAMS, setup_symbols, evaluate_symbol
+from orders import open_position
+from sim_exchange import SimExchange, frame_to_bars
+
+# 回测引擎和数据存储在 bt/ 下
+BT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bt')
+sys.path.append(BT_DIR)
+from engine import bar_hours, compute_signals, counter_hour_table, run_vectorized, warmup_start
+from indicators import cached_ema, cached_atr
+from store import load_klines
+
+SIGNAL_DIRECTIONS = {'long_entry': 1, 'short_entry': -1}
+
+
+class ReplayFeed:
+    """
+    回放时替代 OkxFeed：持仓和挂单直接读取模拟交易所。
+    private_ready 保持未就绪，成交确认走 fetch_order 轮询路径。
+    """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.private_ready = asyncio.Event()
+
+    def has_position(self, symbol):
+        return self.exchange.positions[symbol]['contracts'] != 0
+
+    def open_order_ids(self, symbol):
+        return self.exchange.open_order_ids(symbol)
+
+
+async def replay(data, config=None, symbol='BTC/USDT:USDT', timeframe='1m', seed_bars=SEED_LIMIT,
+                 speed=None, verbose=False, **exchange_kwargs):
+    """
+    把历史K线逐根送入实盘代码路径（runner.setup_symbols → evaluate_symbol → orders.open_position），
+    下单由 SimExchange 本地撮合。
+
+    参数:
+    - data: load_klines 返回的 DataFrame，周期与 timeframe 一致
+    - config: 策略参数，缺省项取 runner.DEFAULT_PARAMS
+    - symbol: 交给实盘代码的交易对名称
+    - timeframe: K线周期
+    - seed_bars: 用于初始化指标的历史K线数量，从第 seed_bars 根开始回放
+    - speed: 相对真实时间的倍速，None 为不等待、尽快回放
+    - verbose: 是否输出实盘代码的打印信息
+    - exchange_kwargs: 传给 SimExchange 的其他参数，如 contract_size、balance
+
+    返回:
+    - result: 字典，signals 为每根回放K线的判断结果，entries 为开仓记录，trades 为已平仓记录，
+      exchange 为模拟交易所，elapsed 为耗时（秒）
+    """
+    config = {**DEFAULT_PARAMS, **(config or {})}
+    bars = frame_to_bars(data)
+    exchange = SimExchange({symbol: bars}, timeframe=timeframe, start=seed_bars, **exchange_kwargs)
+    feed = ReplayFeed(exchange)
+    bar_seconds = exchange.parse_timeframe(timeframe)
+    signals, entries = [], []
+
+    started = time.perf_counter()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        await setup_symbols(exchange, {symbol: config}, timeframe)
+        for i in range(seed_bars, len(bars)):
+            bar = exchange.step()[symbol]
+            has_position = feed.has_position(symbol)
+            signal, atr_value = await evaluate_symbol(exchange, feed, symbol, config, bar, timeframe)
+            signals.append({'bar': i, 'time': bar[0], 'has_position': has_position, 'signal': signal,
+                            'atr': atr_value})
+            # 最后一根K线之后没有可成交的价格，与回测一致不再开仓
+            if signal and exchange.has_next_bar:
+                entry = await open_position(exchange, symbol, signal, atr_value, config['rr'], config['risk_usdt'],
+                                            feed.open_order_ids(symbol), feed=feed)
+                if entry:
+                    entry.pop('latency')
+                    entries.append({'EntryBar': i + 1, 'direction': SIGNAL_DIRECTIONS[signal], **entry})
+            if speed:
+                await asyncio.sleep(bar_seconds / speed)
+
+    signals = pd.DataFrame(signals, columns=['bar', 'time', 'has_position', 'signal', 'atr'])
+    signals['time'] = pd.to_datetime(signals['time'], unit='ms')
+    return {
+        'signals': signals,
+        'entries': pd.DataFrame(entries),
+        'trades': pd.DataFrame(exchange.trades),
+        'exchange': exchange,
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+def compare_replay(data, result, config=None, seed_bars=SEED_LIMIT):
+    """
+    对比回放结果与回测：
+    - 信号：空仓时实盘每根K线的判断与 compute_signals 逐根比较，应完全一致
+    - 成交：实盘开仓按入场K线与 run_vectorized 的交易列表对齐。实盘止盈为移动止盈止损，
+      止损价以成交价为基准，出场不要求一致，仅作参考
+
+    返回:
+    - summary: 统计字典
+    - mismatches: 信号不一致的K线
+    - merged: 按入场K线对齐后的交易对比表
+    """
+    config = {**DEFAULT_PARAMS, **(config or {})}
+    close = data['Close'].to_numpy(dtype=float)
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+    ema = cached_ema(close, config['ema_period'])
+    atr = cached_atr(high, low, close, config['atr_period'])
+    counter = counter_hour_table(config['counter_start'], config['counter_end'])[bar_hours(data.index)]
+    expected = compute_signals(close, ema, atr, config['multiplier'], config['atr_threshold_pct'],
+                               warmup_start(ema, atr), counter)
+
+    signals = result['signals']
+    flat = signals[~signals['has_position'].astype(bool)].copy()
+    flat['live'] = flat['signal'].map(SIGNAL_DIRECTIONS).fillna(0).astype(np.int8)
+    flat['backtest'] = expected[flat['bar'].to_numpy()]
+    mismatches = flat[flat['live'] != flat['backtest']]
+
+    stats = run_vectorized(data, **{name: config[name] for name in (
+        'ema_period', 'atr_period', 'multiplier', 'atr_threshold_pct', 'rr', 'counter_start', 'counter_end')})
+    backtest_trades = stats['_trades']
+    backtest_trades = backtest_trades[backtest_trades['EntryBar'] > seed_bars]
+    backtest_trades = backtest_trades.assign(direction=np.sign(backtest_trades['Size']).astype(int))[
+        ['EntryBar', 'direction', 'EntryPrice', 'SL', 'TP', 'ExitBar', 'ExitPrice', 'PnL']]
+
+    live_trades = result['entries']
+    if len(live_trades):
+        live_trades = live_trades.rename(columns={'entry_price': 'EntryPrice', 'sl_price': 'SL', 'tp_price': 'TP'})
+        live_trades = live_trades[['EntryBar', 'direction', 'EntryPrice', 'SL', 'TP']]
+        if len(result['trades']):
+            live_trades = live_trades.merge(result['trades'][['EntryBar', 'ExitBar', 'ExitPrice', 'PnL', 'ExitType']],
+                                            on='EntryBar', how='left')
+    else:
+        live_trades = pd.DataFrame(columns=['EntryBar', 'direction', 'EntryPrice', 'SL', 'TP'])
+
+    merged = backtest_trades.merge(live_trades, on='EntryBar', how='outer', suffixes=(' bt', ' live'),
+                                   indicator=True).sort_values('EntryBar')
+    both = merged[merged['_merge'] == 'both']
+    summary = {
+        'bars': len(signals),
+        'flat_bars': len(flat),
+        'signal_mismatches': len(mismatches),
+        'backtest_trades': len(backtest_trades),
+        'live_trades': len(live_trades),
+        'matched_entries': len(both),
+        'same_direction': int((both['direction bt'] == both['direction live']).sum()),
+        'same_entry_price': int(np.isclose(both['EntryPrice bt'], both['EntryPrice live']).sum()),
+        'same_exit_bar': int((both['ExitBar bt'] == both['ExitBar live']).sum()) if 'ExitBar live' in both else 0,
+        'backtest_only': int((merged['_merge'] == 'left_only').sum()),
+        'live_only': int((merged['_merge'] == 'right_only').sum()),
+    }
+    return summary, mismatches, merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用历史K线回放实盘代码路径，并与回测结果对比')
+    parser.add_argument('--symbol', default='BTCUSDT', help='数据存储中的交易对')
+    parser.add_argument('--live-symbol', default='BTC/USDT:USDT', help='交给实盘代码的交易对名称')
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--years', type=int, nargs='*')
+    parser.add_argument('--months', type=int, nargs='*')
+    parser.add_argument('--store-dir', default=os.path.join(BT_DIR, 'data/store'))
+    parser.add_argument('--speed', type=float, default=None, help='相对真实时间的倍速，默认不等待')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    data = load_klines(symbol=args.symbol, interval=args.interval, years=args.years, months=args.months,
+                       store_dir=args.store_dir)
+    if data is None:
+        return
+    print(f"回放 {len(data)} 根K线: {data.index[0]} ~ {data.index[-1]}")
+    result = asyncio.run(replay(data, symbol=args.live_symbol, timeframe=args.interval, speed=args.speed,
+                                verbose=args.verbose))
+    replayed = len(result['signals'])
+    print(f"回放耗时 {result['elapsed']:.1f} 秒，约为真实时间的 "
+          f"{replayed * SimExchange.parse_timeframe(args.interval) / result['elapsed']:.0f} 倍")
+
+    summary, mismatches, merged = compare_replay(data, result)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    if len(mismatches):
+        print("信号不一致的K线:")
+        print(mismatches.head(20))
+
+    output_dir = f"result/replay_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    os.makedirs(output_dir, exist_ok=True)
+    result['signals'].to_csv(f'{output_dir}/signals.csv', index=False)
+    merged.to_csv(f'{output_dir}/trades.csv', index=False)
+    print(f"结果已保存到 {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
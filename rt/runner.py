@@ -0,0 +1,181 @@
+import os
+import time
+import asyncio
+import ccxt.async_support as ccxt
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from utils import send_email_notification
+from mark import SEED_LIMIT, apply_closed_bar, seed_indicator_state, breakout_mark, time_checker, mark_to_signal
+from feed import OkxFeed
+from orders import open_position
+
+load_dotenv()
+
+API_KEY = os.getenv('OKX_API_KEY')
+API_SECRET = os.getenv('OKX_API_SECRET')
+API_PASSPHRASE = os.getenv('OKX_API_PASSPHRASE')
+
+PROXY = 'http://127.0.0.1:7897'
+TIMEFRAME = '1m'
+
+# 所有交易对的默认参数，SYMBOL_PARAMS 中按交易对覆盖
+DEFAULT_PARAMS = {
+    'ema_period': 21,
+    'atr_period': 10,
+    'multiplier': 4,
+    'atr_threshold_pct': 0.0007,
+    'rr': 1,
+    'counter_start': 4,  # 逆势时段（UTC，含两端），可用回测扫描的结果替换
+    'counter_end': 11,
+    'leverage': 10,
+    'risk_usdt': 1,
+}
+
+SYMBOL_PARAMS = {
+    'BTC/USDT:USDT': {},
+    'ETH/USDT:USDT': {'atr_threshold_pct': 0.0009},
+}
+
+
+def create_exchange(proxy=PROXY):
+    # 所有交易对共用一个客户端：同一个连接池和限频预算
+    return ccxt.okx({
+        'apiKey': API_KEY,
+        'secret': API_SECRET,
+        'password': API_PASSPHRASE,
+        'enableRateLimit': True,
+        'options': {
+            'defaultType': 'swap',
+            'marginMode': 'isolated',
+        },
+        'httpsProxy': proxy,
+    })
+
+
+def build_configs(symbol_params=SYMBOL_PARAMS, default_params=DEFAULT_PARAMS):
+    return {symbol: {**default_params, **params} for symbol, params in symbol_params.items()}
+
+
+# 并发设置各交易对杠杆并初始化指标，第一根收盘K线到来时无需再请求历史；仅信号模式不设置杠杆
+async def setup_symbols(exchange, configs, timeframe=TIMEFRAME, set_leverage=True):
+    await exchange.load_markets()
+    timeframe_ms = exchange.parse_timeframe(timeframe) * 1000
+
+    async def setup(symbol, config):
+        if set_leverage:
+            try:
+                for pos_side in ('long', 'short'):
+                    await exchange.set_leverage(int(config['leverage']), symbol,
+                                                {'mgnMode': 'isolated', 'posSide': pos_side})
+                print(f"[{symbol}] 杠杆为：{int(config['leverage'])}（多头和空头均设置）")
+            except Exception as e:
+                print(f"[{symbol}] 设置杠杆失败: {e}")
+        bars = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=SEED_LIMIT)
+        seed_indicator_state(symbol, timeframe, config['ema_period'], config['atr_period'],
+                             bars, exchange.milliseconds(), timeframe_ms)
+
+    await asyncio.gather(*(setup(symbol, config) for symbol, config in configs.items()))
+
+
+# 单个交易对在K线收盘时更新指标并判断信号，返回 (signal, atr_value)
+async def evaluate_symbol(exchange, feed, symbol, config, bar, timeframe=TIMEFRAME):
+    timeframe_ms = exchange.parse_timeframe(timeframe) * 1000
+    ema_period, atr_period = config['ema_period'], config['atr_period']
+    state = apply_closed_bar(symbol, timeframe, ema_period, atr_period, bar, timeframe_ms)
+    if state is None:
+        # 推送断档，重新初始化
+        bars = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=SEED_LIMIT)
+        seed_indicator_state(symbol, timeframe, ema_period, atr_period, bars, exchange.milliseconds(), timeframe_ms)
+        state = apply_closed_bar(symbol, timeframe, ema_period, atr_period, bar, timeframe_ms)
+
+    mark, atr_value = breakout_mark(state.previous_close, state.last_close, state.previous_ema, state.previous_atr,
+                                    state.ema, state.atr, config['multiplier'], config['atr_threshold_pct'],
+                                    feed.has_position(symbol))
+    hour = datetime.fromtimestamp(bar[0] / 1000, timezone.utc).hour
+    strategy_type = time_checker(hour, config.get('counter_start', 4), config.get('counter_end', 11))
+    signal = mark_to_signal(mark, strategy_type) if mark else None
+    if signal:
+        print(f"[{symbol}] 当前UTC小时: {hour}, 策略类型: {strategy_type}, 信号: {signal}")
+    return signal, atr_value
+
+
+# 发送信号邮件
+def notify_signal(symbol, signal, atr_value):
+    body = f"交易对: {symbol}\n时间: {datetime.now(timezone.utc)}\n信号: {signal}\nATR值: {atr_value}"
+    try:
+        send_email_notification(f"交易信号触发 {symbol}", body)  # 只入队，不等待发送
+    except Exception as e:
+        print(f"[{symbol}] 邮件通知失败: {e}")
+
+
+# 发送信号邮件并开仓
+async def enter_position(exchange, feed, symbol, config, signal, atr_value, signal_time=None):
+    notify_signal(symbol, signal, atr_value)
+    return await open_position(exchange, symbol, signal, atr_value, config['rr'], config['risk_usdt'],
+                               feed.open_order_ids(symbol), feed=feed, signal_time=signal_time)
+
+
+async def run(configs, exchange=None, timeframe=TIMEFRAME, **feed_kwargs):
+    """
+    在一个进程中同时运行多个交易对：共用交易所客户端和一条 WebSocket 连接，
+    各交易对在同一根K线收盘时并发计算。
+
+    参数:
+    - configs: {symbol: 参数字典}，见 build_configs
+    - exchange: ccxt.async_support 交易所实例，默认 create_exchange()
+    - timeframe: K线周期
+    - feed_kwargs: 传给 OkxFeed 的其他参数，如 public_url、private_url、proxy
+
+    未配置 OKX_API_KEY / OKX_API_SECRET / OKX_API_PASSPHRASE 时以仅信号模式运行：
+    只订阅K线、计算并通知信号，不查询持仓也不下单。
+    """
+    signal_only = not (API_KEY and API_SECRET and API_PASSPHRASE)
+    if signal_only:
+        print("\033[93m警告：未配置 OKX API 密钥，私有频道无法登录，以仅信号模式运行（不下单）。\033[0m")
+    exchange = exchange or create_exchange()
+    feed = None
+    busy = set()  # 正在下单的交易对，下单完成前不再处理新信号
+
+    async def on_bar_close(symbol, bar):
+        started = time.perf_counter()
+        if signal_only:
+            try:
+                signal, atr_value = await evaluate_symbol(exchange, feed, symbol, configs[symbol], bar, timeframe)
+                if signal:
+                    notify_signal(symbol, signal, atr_value)
+            except Exception as e:
+                print(f"[{symbol}] 策略执行失败: {e}")
+            return
+        if not feed.private_ready.is_set():
+            print(f"[{symbol}] 私有频道未就绪，持仓状态未知，跳过本根K线。")
+            return
+        try:
+            signal, atr_value = await evaluate_symbol(exchange, feed, symbol, configs[symbol], bar, timeframe)
+            if signal and symbol in busy:
+                print(f"[{symbol}] 上一笔下单尚未完成，忽略本次信号。")
+            elif signal:
+                busy.add(symbol)
+                try:
+                    await enter_position(exchange, feed, symbol, configs[symbol], signal, atr_value, started)
+                finally:
+                    busy.discard(symbol)
+        except Exception as e:
+            print(f"[{symbol}] 策略执行失败: {e}")
+        print(f"[{symbol}] K线 {datetime.fromtimestamp(bar[0] / 1000, timezone.utc)} 收盘，"
+              f"处理耗时 {time.perf_counter() - started:.3f} 秒")
+
+    try:
+        await setup_symbols(exchange, configs, timeframe, set_leverage=not signal_only)
+        feed_kwargs.setdefault('proxy', PROXY)
+        feed = OkxFeed(list(configs), timeframe, on_bar_close, API_KEY, API_SECRET, API_PASSPHRASE, **feed_kwargs)
+        await feed.run()
+    finally:
+        await exchange.close()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(run(build_configs()))
+    except KeyboardInterrupt:
+        print("用户中断，停止运行。")
@@ -0,0 +1,428 @@
+import time
+import random
+import asyncio
+import itertools
+import collections
+import ccxt
+import numpy as np
+
+# 近似 OKX v5 文档的限频：分组 -> (次数, 秒)。下单、策略委托、撤单和查单按交易对分别计数
+OKX_RATE_LIMITS = {
+    'order': (60, 2),
+    'algo_order': (20, 2),
+    'cancel': (60, 2),
+    'query_order': (60, 2),
+    'positions': (10, 2),
+    'balance': (10, 2),
+    'leverage': (20, 2),
+    'ohlcv': (40, 2),
+}
+
+# 按交易对分别计数的限频分组
+PER_SYMBOL_GROUPS = {'order', 'algo_order', 'cancel', 'query_order'}
+
+
+# bt 回测用的 DataFrame（Open/High/Low/Close/Volume，以开盘时间为索引）转为 ccxt 格式的K线列表
+def frame_to_bars(data):
+    timestamps = data.index.values.astype('datetime64[ms]').astype(np.int64)
+    values = data[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy(dtype=np.float64)
+    return [[int(ts), *row] for ts, row in zip(timestamps.tolist(), values.tolist())]
+
+
+class SimExchange:
+    """
+    本地撮合的交易所替身，实现实盘代码用到的 ccxt.async_support 接口子集，时间按历史K线推进。
+
+    撮合规则:
+    - 市价单按当前K线（刚开盘）的开盘价成交；可设置成交确认延迟和部分成交（未成交部分撤销）
+    - 止损单：K线最低价（平空为最高价）触及触发价时成交，跳空穿过时按开盘价成交
+    - 移动止盈止损单：价格达到激活价后按回调价距跟踪最高（最低）价，激活所在K线不触发
+    - 同一根K线上止损单先于移动止盈止损单处理；持仓归零时撤销该交易对剩余的只减仓委托
+
+    参数:
+    - bars: {symbol: [[ts, open, high, low, close, volume], ...]}，各交易对的时间戳需一致
+    - timeframe: K线周期
+    - start: 起始K线序号，之前的K线视为已收盘的历史
+    - contract_size: 每张合约对应的币数量
+    - balance: 初始 USDT 余额
+    - latency: 每次请求的往返延迟（秒），请求在去程结束时被处理
+    - jitter: 在 latency 上额外加的均匀随机延迟上限（秒）
+    - spike_probability / spike_latency: 以该概率额外增加 spike_latency 秒，模拟偶发的慢请求
+    - rate_limits: {分组: (次数, 秒)} 滑动窗口限频，超出时抛出 ccxt.RateLimitExceeded；None 为不限频，
+      OKX_RATE_LIMITS 为 OKX 的近似值
+    - fill_delay: 市价单从受理到成交的时间（秒），之前查询到的状态为 open
+    - partial_fill_probability: 市价单部分成交的概率，成交比例在 [min_fill_ratio, 1) 均匀分布，剩余部分撤销
+    - seed: 随机数种子
+    """
+
+    def __init__(self, bars, timeframe='1m', start=0, contract_size=0.01, balance=10_000.0,
+                 latency=0.0, jitter=0.0, spike_probability=0.0, spike_latency=0.0, rate_limits=None,
+                 fill_delay=0.0, partial_fill_probability=0.0, min_fill_ratio=0.5, seed=None):
+        self.symbols = list(bars)
+        self.timeframe = timeframe
+        self.timeframe_ms = self.parse_timeframe(timeframe) * 1000
+        self.bars = {symbol: np.asarray(rows, dtype=np.float64).reshape(-1, 6) for symbol, rows in bars.items()}
+        self.timestamps = self.bars[self.symbols[0]][:, 0].astype(np.int64)
+        self.cursor = start  # 当前正在进行的K线
+        self.contract_size = contract_size
+        self.balance = balance
+        self.leverage = {}
+        self.positions = {symbol: {'contracts': 0.0, 'entryPrice': None, 'entryBar': None, 'entryTime': None}
+                          for symbol in self.symbols}
+        self.orders = {}
+        self.trades = []  # 已平仓的持仓记录
+        self._ids = itertools.count(1)
+
+        self.latency = latency
+        self.jitter = jitter
+        self.spike_probability = spike_probability
+        self.spike_latency = spike_latency
+        self.rate_limits = rate_limits
+        self.fill_delay = fill_delay
+        self.partial_fill_probability = partial_fill_probability
+        self.min_fill_ratio = min_fill_ratio
+        self.rng = random.Random(seed)
+        self.stats = collections.Counter()  # (方法, 'ok' 或异常类名) -> 次数
+        self._calls = collections.defaultdict(collections.deque)  # (分组, 交易对) -> 窗口内的请求时刻
+        self._pending = []  # 等待成交的市价单
+
+    @staticmethod
+    def parse_timeframe(timeframe):
+        return ccxt.Exchange.parse_timeframe(timeframe)
+
+    # 当前模拟时间：正在进行的K线的开盘时间
+    def milliseconds(self):
+        if self.cursor < len(self.timestamps):
+            return int(self.timestamps[self.cursor])
+        return int(self.timestamps[-1]) + self.timeframe_ms
+
+    @property
+    def has_next_bar(self):
+        return self.cursor < len(self.timestamps)
+
+    # 当前K线走完：按其高低价撮合挂单，时间推进到下一根K线开盘，返回 {symbol: 刚收盘的K线}
+    def step(self):
+        if not self.has_next_bar:
+            raise ccxt.ExchangeError("K线已全部回放完毕")
+        self._settle_fills(force=True)
+        closed = {}
+        for symbol in self.symbols:
+            bar = self.bars[symbol][self.cursor]
+            self._match_bar(symbol, bar)
+            closed[symbol] = [int(bar[0])] + bar[1:].tolist()
+        self.cursor += 1
+        return closed
+
+    def _match_bar(self, symbol, bar):
+        _, open_, high, low, _, _ = bar
+        live = [order for order in self.orders.values() if order['symbol'] == symbol and order['status'] == 'open']
+        for order in sorted(live, key=lambda order: order['type'] != 'stop_loss'):
+            if order['status'] != 'open':
+                continue  # 前一张单成交后持仓归零，已被撤销
+            is_sell = order['side'] == 'sell'
+            if order['type'] == 'stop_loss':
+                trigger = order['stopLossPrice']
+                if (low <= trigger) if is_sell else (high >= trigger):
+                    self._fill(order, min(open_, trigger) if is_sell else max(open_, trigger))
+            elif order['type'] == 'trailing_stop':
+                if order['active']:
+                    trigger = order['extreme'] - order['callbackSpread'] if is_sell else \
+                        order['extreme'] + order['callbackSpread']
+                    if (low <= trigger) if is_sell else (high >= trigger):
+                        self._fill(order, min(open_, trigger) if is_sell else max(open_, trigger))
+                        continue
+                    order['extreme'] = max(order['extreme'], high) if is_sell else min(order['extreme'], low)
+                elif (high >= order['activePx']) if is_sell else (low <= order['activePx']):
+                    order['active'] = True
+                    order['extreme'] = high if is_sell else low
+
+    # 成交并更新持仓；只减仓委托最多减到零，ratio < 1 时为部分成交，剩余部分撤销
+    def _fill(self, order, price, ratio=1.0):
+        symbol = order['symbol']
+        position = self.positions[symbol]
+        sign = 1 if order['side'] == 'buy' else -1
+        amount = order['amount'] * ratio
+        if order['reduceOnly']:
+            if position['contracts'] * sign >= 0:
+                self._cancel(order)
+                return
+            amount = min(amount, abs(position['contracts']))
+
+        contracts = position['contracts']
+        closing = min(amount, abs(contracts)) if contracts * sign < 0 else 0.0
+        if closing:
+            direction = 1 if contracts > 0 else -1
+            pnl = direction * closing * (price - position['entryPrice']) * self.contract_size
+            self.balance += pnl
+            position['contracts'] = contracts + sign * closing
+            if position['contracts'] == 0:
+                self.trades.append({
+                    'symbol': symbol,
+                    'Size': direction * abs(contracts),
+                    'EntryBar': position['entryBar'],
+                    'ExitBar': self.cursor,
+                    'EntryPrice': position['entryPrice'],
+                    'ExitPrice': price,
+                    'PnL': pnl,
+                    'EntryTime': position['entryTime'],
+                    'ExitTime': int(self.timestamps[min(self.cursor, len(self.timestamps) - 1)]),
+                    'ExitType': order['type'],
+                })
+                position.update(entryPrice=None, entryBar=None, entryTime=None)
+        opening = amount - closing
+        if opening:
+            contracts = position['contracts']
+            if contracts == 0:
+                position.update(entryPrice=price, entryBar=self.cursor, entryTime=self.milliseconds())
+            else:
+                position['entryPrice'] = (abs(contracts) * position['entryPrice'] + opening * price) / (abs(contracts) + opening)
+            position['contracts'] = contracts + sign * opening
+
+        order.update(status='closed' if ratio == 1 else 'canceled', filled=amount,
+                     remaining=order['amount'] - amount, average=price, lastTradeTimestamp=self.milliseconds())
+        if position['contracts'] == 0:
+            for other in self.orders.values():
+                if other['symbol'] == symbol and other['status'] == 'open' and other['reduceOnly']:
+                    self._cancel(other)
+
+    # 市价单成交：按当前K线开盘价，可能部分成交
+    def _execute_market(self, order):
+        if order['status'] != 'open':
+            return  # 成交前已被撤销
+        if not self.has_next_bar:
+            self._cancel(order)
+            return
+        ratio = 1.0
+        if self.partial_fill_probability and self.rng.random() < self.partial_fill_probability:
+            ratio = self.rng.uniform(self.min_fill_ratio, 1.0)
+        self._fill(order, float(self.bars[order['symbol']][self.cursor][1]), ratio)
+
+    # 成交确认延迟已到的市价单成交；force 为True时全部成交（K线收盘前）
+    def _settle_fills(self, force=False):
+        if not self._pending:
+            return
+        now = time.perf_counter()
+        due = [order for order in self._pending if force or order['settleAt'] <= now]
+        self._pending = [order for order in self._pending if not (force or order['settleAt'] <= now)]
+        for order in due:
+            self._execute_market(order)
+
+    def _cancel(self, order):
+        order.update(status='canceled', remaining=order['amount'] - order['filled'])
+
+    def _new_order(self, symbol, type, side, amount, params, **fields):
+        if symbol not in self.positions:
+            raise ccxt.BadSymbol(f"未知交易对: {symbol}")
+        if side not in ('buy', 'sell') or not amount or amount <= 0:
+            raise ccxt.InvalidOrder(f"无效委托: {side} {amount}")
+        order = {
+            'id': str(next(self._ids)),
+            'symbol': symbol,
+            'type': type,
+            'side': side,
+            'amount': float(amount),
+            'filled': 0.0,
+            'remaining': float(amount),
+            'average': None,
+            'status': 'open',
+            'timestamp': self.milliseconds(),
+            'reduceOnly': bool(params.get('reduceOnly', False)),
+            'posSide': params.get('posSide'),
+            **fields,
+        }
+        self.orders[order['id']] = order
+        return order
+
+    # 返回订单副本，调用方修改不影响撮合状态
+    @staticmethod
+    def _view(order):
+        return dict(order)
+
+    def open_order_ids(self, symbol):
+        return [order['id'] for order in self.orders.values() if order['symbol'] == symbol and order['status'] == 'open']
+
+    def _sample_latency(self):
+        latency = self.latency
+        if self.jitter:
+            latency += self.rng.uniform(0, self.jitter)
+        if self.spike_probability and self.rng.random() < self.spike_probability:
+            latency += self.spike_latency
+        return latency
+
+    # 滑动窗口限频
+    def _acquire(self, group, symbol=None, cost=1):
+        if not self.rate_limits or group not in self.rate_limits:
+            return
+        limit, window = self.rate_limits[group]
+        now = time.perf_counter()
+        calls = self._calls[(group, symbol if group in PER_SYMBOL_GROUPS else None)]
+        while calls and calls[0] <= now - window:
+            calls.popleft()
+        if len(calls) + cost > limit:
+            raise ccxt.RateLimitExceeded(f"{group} 请求超出限频: {limit} 次 / {window} 秒")
+        calls.extend([now] * cost)
+
+    # 模拟一次请求：去程延迟、限频、处理、回程延迟，并按方法统计结果
+    async def _call(self, method, group, symbol, handler, *args, cost=1):
+        latency = self._sample_latency()
+        if latency:
+            await asyncio.sleep(latency / 2)
+        try:
+            self._settle_fills()
+            self._acquire(group, symbol, cost)
+            result = handler(*args)
+            self.stats[(method, 'ok')] += 1
+            return result
+        except ccxt.BaseError as e:
+            self.stats[(method, type(e).__name__)] += 1
+            raise
+        finally:
+            if latency:
+                await asyncio.sleep(latency / 2)
+
+    async def load_markets(self, reload=False):
+        return {symbol: self.market(symbol) for symbol in self.symbols}
+
+    def market(self, symbol):
+        return {'symbol': symbol, 'id': symbol, 'contractSize': self.contract_size, 'swap': True}
+
+    def _set_leverage(self, leverage, symbol, params):
+        self.leverage[(symbol, params.get('posSide'))] = leverage
+        return {'leverage': leverage}
+
+    async def set_leverage(self, leverage, symbol=None, params={}):
+        return await self._call('set_leverage', 'leverage', symbol, self._set_leverage, leverage, symbol, params)
+
+    async def fetch_balance(self, params={}):
+        return await self._call('fetch_balance', 'balance', None,
+                                lambda: {'total': {'USDT': self.balance}, 'free': {'USDT': self.balance}})
+
+    # 最近 limit 根K线：已收盘的K线加上刚开盘的一根（只有开盘价，不泄露未来的高低收）
+    def _fetch_ohlcv(self, symbol, since, limit):
+        rows = self.bars[symbol]
+        end = min(self.cursor, len(rows))
+        result = [[int(row[0])] + row[1:].tolist() for row in rows[:end][-limit:]]
+        if self.has_next_bar:
+            ts, open_ = int(rows[self.cursor][0]), float(rows[self.cursor][1])
+            result = (result + [[ts, open_, open_, open_, open_, 0.0]])[-limit:]
+        if since is not None:
+            result = [bar for bar in result if bar[0] >= since]
+        return result
+
+    async def fetch_ohlcv(self, symbol, timeframe=None, since=None, limit=100, params={}):
+        return await self._call('fetch_ohlcv', 'ohlcv', symbol, self._fetch_ohlcv, symbol, since, limit)
+
+    def _fetch_positions(self, symbols):
+        positions = []
+        for symbol, position in self.positions.items():
+            if position['contracts'] == 0 or (symbols and symbol not in symbols):
+                continue
+            positions.append({
+                'symbol': symbol,
+                'contracts': abs(position['contracts']),
+                'side': 'long' if position['contracts'] > 0 else 'short',
+                'entryPrice': position['entryPrice'],
+                'contractSize': self.contract_size,
+            })
+        return positions
+
+    async def fetch_positions(self, symbols=None, params={}):
+        return await self._call('fetch_positions', 'positions', None, self._fetch_positions, symbols)
+
+    def _create_order(self, symbol, type, side, amount, params):
+        if type == 'market':
+            if not self.has_next_bar:
+                raise ccxt.InvalidOrder("没有可成交的价格")
+            order = self._new_order(symbol, type, side, amount, params)
+            if self.fill_delay:
+                order['settleAt'] = time.perf_counter() + self.fill_delay
+                self._pending.append(order)
+            else:
+                self._execute_market(order)
+        elif type == 'trailing_stop':
+            order = self._new_order(symbol, type, side, amount, params, active=False, extreme=None,
+                                    callbackSpread=float(params['callbackSpread']),
+                                    activePx=float(params['activePx']))
+        else:
+            raise ccxt.NotSupported(f"不支持的委托类型: {type}")
+        return self._view(order)
+
+    async def create_order(self, symbol, type, side, amount, price=None, params={}):
+        group = 'order' if type == 'market' else 'algo_order'
+        return await self._call('create_order', group, symbol, self._create_order, symbol, type, side, amount, params)
+
+    async def create_market_buy_order(self, symbol, amount, params={}):
+        return await self.create_order(symbol, 'market', 'buy', amount, params=params)
+
+    async def create_market_sell_order(self, symbol, amount, params={}):
+        return await self.create_order(symbol, 'market', 'sell', amount, params=params)
+
+    def _create_stop_loss_order(self, symbol, side, amount, stop_loss_price, params):
+        if stop_loss_price is None:
+            raise ccxt.ArgumentsRequired("需要 stopLossPrice")
+        order = self._new_order(symbol, 'stop_loss', side, amount, params, stopLossPrice=float(stop_loss_price))
+        return self._view(order)
+
+    async def create_stop_loss_order(self, symbol, type, side, amount, price=None, stopLossPrice=None, params={}):
+        return await self._call('create_stop_loss_order', 'algo_order', symbol, self._create_stop_loss_order,
+                                symbol, side, amount, stopLossPrice, params)
+
+    def _fetch_order(self, id):
+        if id not in self.orders:
+            raise ccxt.OrderNotFound(f"订单不存在: {id}")
+        return self._view(self.orders[id])
+
+    async def fetch_order(self, id, symbol=None, params={}):
+        return await self._call('fetch_order', 'query_order', symbol, self._fetch_order, id)
+
+    def _fetch_open_orders(self, symbol):
+        return [self._view(order) for order in self.orders.values()
+                if order['status'] == 'open' and (symbol is None or order['symbol'] == symbol)]
+
+    async def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        return await self._call('fetch_open_orders', 'query_order', symbol, self._fetch_open_orders, symbol)
+
+    def _cancel_order(self, id):
+        order = self.orders.get(id)
+        if order is None or order['status'] != 'open':
+            raise ccxt.OrderNotFound(f"订单不存在或已结束: {id}")
+        self._cancel(order)
+        return self._view(order)
+
+    async def cancel_order(self, id, symbol=None, params={}):
+        return await self._call('cancel_order', 'cancel', symbol, self._cancel_order, id)
+
+    # 批量撤单按订单数计入限频；已成交或已撤销的订单跳过，不影响其他订单
+    def _cancel_orders(self, ids):
+        canceled = []
+        for id in ids:
+            order = self.orders.get(id)
+            if order is not None and order['status'] == 'open':
+                self._cancel(order)
+                canceled.append(self._view(order))
+        return canceled
+
+    async def cancel_orders(self, ids, symbol=None, params={}):
+        return await self._call('cancel_orders', 'cancel', symbol, self._cancel_orders, ids, cost=len(ids))
+
+    cancelOrders = cancel_orders
+
+    async def close(self):
+        pass
+
+
+class SyncSimExchange:
+    """
+    SimExchange 的同步外观，对应 ccxt 同步客户端（real_try_okx.py 的轮询模式、mark.ema_atr_filter）。
+    协程方法在私有事件循环中执行完再返回，其他属性直接转发。
+    """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self._loop = asyncio.new_event_loop()
+
+    def __getattr__(self, name):
+        attr = getattr(self.exchange, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+        return lambda *args, **kwargs: self._loop.run_until_complete(attr(*args, **kwargs))
@@ -1,11 +1,13 @@
 import pandas as pd
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import sys
 
 from datetime import datetime, timezone, timedelta
 
+# 仓库根目录，bt 和 rt 共用的模块放在 common/ 下
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.notifier import get_notifier
+
 def get_ohlcv_data(exchange, symbol='BTC/USDT:USDT', timeframe='1m', limit=100):
     bars = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
     df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
@@ -13,7 +15,7 @@ def get_ohlcv_data(exchange, symbol='BTC/USDT:USDT', timeframe='1m', limit=100):
     df.set_index('timestamp', inplace=True)
     return df
 
-# 发送邮件提醒
+# 发送邮件提醒（后台发送，不阻塞调用方）
 def send_email_notification(
     subject,
     body,
@@ -22,7 +24,8 @@ def send_email_notification(
     smtp_server='smtp.qq.com',
     smtp_port=587,
     smtp_user=None,
-    smtp_password=None
+    smtp_password=None,
+    use_tls=True
 ):
     # 从环境变量读取敏感信息
     if to_email is None:
@@ -36,20 +39,13 @@ def send_email_notification(
         if smtp_password is None:
             raise ValueError("SMTP_PASSWORD 环境变量未设置，无法发送邮件。")
     
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = from_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        text = msg.as_string()
-        server.sendmail(from_email, to_email, text)
-        server.quit()
-        print("邮件发送成功。")
-    except Exception as e:
-        print(f"邮件发送失败：{e}")
\ No newline at end of file
+    # 放入后台队列立即返回；同一配置共用一个 SMTP 连接，短时间内的多条通知合并发送
+    get_notifier(
+        smtp_server=smtp_server,
+        smtp_port=smtp_port,
+        smtp_user=smtp_user,
+        smtp_password=smtp_password,
+        from_email=from_email,
+        to_email=to_email,
+        use_tls=use_tls,
+    ).notify(subject, body)
\ No newline at end of file